@@ -1,11 +1,17 @@
 """JOKER CLEF 2025 Task 1 utilities."""
 
 __all__ = [
+    "cache",
     "data",
     "retriever",
+    "sparse",
     "dense",
     "fusion",
     "features",
+    "evaluation",
+    "pipeline",
     "rerank",
     "humor_classifier",
+    "tuning",
+    "bench",
 ]
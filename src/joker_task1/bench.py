@@ -0,0 +1,521 @@
+from __future__ import annotations
+
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import zlib
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, Iterator, Sequence
+
+import numpy as np
+
+from .data import docs_by_id
+from .evaluation import Evaluator
+from .fusion import weighted_fuse
+from .pipeline import DEFAULT_FUSION_WEIGHTS, seed_candidates
+from .retriever import HybridTask1Retriever, RankedList
+
+ProgressFn = Callable[[str, float], None]
+
+BENCH_SCHEMA = 1
+# Query stages in run order; each is timed one query at a time (latency) and as one batch (throughput).
+BENCH_STAGES = ("lexical", "sparse", "dense", "rerank", "fusion")
+# Compared against a baseline: lower is better for all but ``qps``.
+COMPARED_FIELDS = ("seconds", "p50_ms", "p95_ms", "p99_ms", "qps", "peak_rss_mb")
+# Config fields two runs must share to be compared.
+RUN_KEY = ("n_docs", "n_queries", "top_k", "dense_top_k", "rerank_top_n", "seed", "dim", "dense_model", "reranker_model", "lexical_params")
+STAND_IN_ENCODER = "bench/hashing-encoder"
+STAND_IN_RERANKER = "bench/overlap-reranker"
+
+_CHUNK_DOCS = 10_000
+_VOCAB_SIZE = 50_000
+_ZIPF_EXPONENT = 1.07
+_JOKE_WORDS = (
+    "joke", "pun", "chicken", "road", "bar", "doctor", "cat", "dog", "fish", "cow", "teacher", "pirate",
+    "ghost", "skeleton", "banana", "bread", "bird", "horse", "computer", "math", "book", "music", "tree", "bear",
+)
+_TEMPLATES = (
+    "Why did the {0} cross the {1}? To get to the {2} side!",
+    "I told my {0} a joke about {1}. It was {2}!",
+    "What do you call a {0} with no {1}? A {2}.",
+    "Knock, knock. Who's there? {0}. {0} who? {1} {2}!",
+    'My {0} said "{1}" and I said "{2}".',
+    "I used to be a {0}, but then I lost my {1} to a {2}.",
+    "A {0} walks into a {1} and orders a {2}.",
+    "Why don't {0}s ever {1}? They're too {2}.",
+)
+
+
+@dataclass
+class BenchConfig:
+    """One benchmark run: a synthetic corpus of ``n_docs`` documents and ``n_queries`` queries.
+
+    ``dense_model`` and ``reranker_model`` default to the built-in stand-ins
+    (``STAND_IN_ENCODER``, ``STAND_IN_RERANKER``), which need no downloads;
+    naming real models benchmarks those instead.
+    """
+
+    n_docs: int = 10_000
+    n_queries: int = 200
+    top_k: int = 1000
+    dense_top_k: int = 700
+    rerank_top_n: int = 50
+    stages: tuple[str, ...] = BENCH_STAGES
+    warmup: int = 5
+    seed: int = 13
+    dim: int = 64
+    dense_model: str = STAND_IN_ENCODER
+    reranker_model: str = STAND_IN_RERANKER
+    lexical_params: dict = field(default_factory=dict)
+
+
+class HashingEncoder:
+    """Sentence-transformer stand-in: signed feature hashing of lowercased tokens into ``dim`` buckets.
+
+    Deterministic and numpy-only, so the dense stages can be benchmarked
+    offline; it has no tokenizer, so batching uses the chars/4 length estimate.
+    """
+
+    max_seq_length = 128
+
+    def __init__(self, dim: int = 64):
+        self.dim = dim
+        self._buckets: dict[str, tuple[int, float]] = {}
+
+    def _bucket(self, token: str) -> tuple[int, float]:
+        found = self._buckets.get(token)
+        if found is None:
+            h = zlib.crc32(token.encode("utf-8"))
+            found = self._buckets[token] = (h % self.dim, 1.0 if h & 0x80000000 else -1.0)
+        return found
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False):
+        out = np.zeros((len(sentences), self.dim), dtype=np.float32)
+        for i, text in enumerate(sentences):
+            for token in HybridTask1Retriever.tokenize(text):
+                j, sign = self._bucket(token)
+                out[i, j] += sign
+        if normalize_embeddings:
+            norms = np.linalg.norm(out, axis=1, keepdims=True)
+            out /= np.where(norms > 0, norms, 1.0)
+        return out
+
+
+class OverlapCrossEncoder:
+    """Cross-encoder stand-in: query/document token overlap, normalized by document length."""
+
+    def predict(self, pairs, batch_size=8, show_progress_bar=False):
+        scores = []
+        for query, doc in pairs:
+            q_tokens = set(HybridTask1Retriever.tokenize(query))
+            d_tokens = HybridTask1Retriever.tokenize(doc)
+            hits = sum(1 for token in d_tokens if token in q_tokens)
+            scores.append(hits / np.sqrt(len(d_tokens) + 1.0))
+        return np.asarray(scores, dtype=np.float32)
+
+
+def _vocabulary(seed: int) -> tuple[list[str], np.ndarray]:
+    """Joke words followed by pseudo-words, with Zipf sampling probabilities by rank."""
+    syllables = [c + v for c in "bdfgklmnprstvz" for v in "aeiou"]
+    rng = np.random.default_rng([seed, 0])
+    n = _VOCAB_SIZE - len(_JOKE_WORDS)
+    first, second, third = (rng.integers(0, len(syllables), size=n) for _ in range(3))
+    three = rng.random(n) < 0.5
+    words = list(_JOKE_WORDS)
+    seen = set(words)
+    for a, b, c, long in zip(first.tolist(), second.tolist(), third.tolist(), three.tolist()):
+        word = syllables[a] + syllables[b] + (syllables[c] if long else "")
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    weights = 1.0 / np.arange(1, len(words) + 1, dtype=np.float64) ** _ZIPF_EXPONENT
+    return words, weights / weights.sum()
+
+
+def _chunk_draws(seed: int, chunk: int, n: int, probs: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Template, slot word and tail word ids of ``n`` documents of one chunk; chunks are drawn independently."""
+    rng = np.random.default_rng([seed, 1, chunk])
+    templates = rng.integers(0, len(_TEMPLATES), size=n)
+    slots = rng.choice(len(probs), size=(n, 3), p=probs)
+    tail_lens = rng.integers(0, 24, size=n)
+    tails = rng.choice(len(probs), size=int(tail_lens.sum()), p=probs)
+    return templates, slots, tail_lens, tails
+
+
+def _chunk_texts(seed: int, chunk: int, n: int, vocab: list[str], probs: np.ndarray) -> list[str]:
+    templates, slots, tail_lens, tails = _chunk_draws(seed, chunk, n, probs)
+    bounds = np.concatenate(([0], np.cumsum(tail_lens)))
+    texts = []
+    for i in range(n):
+        text = _TEMPLATES[templates[i]].format(*(vocab[w] for w in slots[i]))
+        if tail_lens[i]:
+            text += " " + " ".join(vocab[w] for w in tails[bounds[i] : bounds[i + 1]]) + "."
+        texts.append(text)
+    return texts
+
+
+def synthetic_corpus(n_docs: int, seed: int = 13) -> Iterator[dict]:
+    """``n_docs`` joke-like documents (template jokes with Zipf-distributed words), the same for a given seed."""
+    vocab, probs = _vocabulary(seed)
+    for chunk, start in enumerate(range(0, n_docs, _CHUNK_DOCS)):
+        for i, text in enumerate(_chunk_texts(seed, chunk, min(_CHUNK_DOCS, n_docs - start), vocab, probs)):
+            yield {"docid": f"bench_{start + i:08d}", "text": text}
+
+
+def synthetic_queries(n_docs: int, n_queries: int, seed: int = 13) -> tuple[list[dict], list[dict]]:
+    """Queries made of two slot words of a random ``synthetic_corpus`` document, with that document as qrel."""
+    vocab, probs = _vocabulary(seed)
+    rng = np.random.default_rng([seed, 2])
+    targets = rng.choice(n_docs, size=min(n_queries, n_docs), replace=False)
+    picks = np.argsort(rng.random((len(targets), 3)), axis=1)[:, :2]
+    queries, qrels = [], []
+    chunks: dict[int, np.ndarray] = {}
+    for q, target in enumerate(targets.tolist()):
+        chunk = target // _CHUNK_DOCS
+        if chunk not in chunks:
+            start = chunk * _CHUNK_DOCS
+            chunks[chunk] = _chunk_draws(seed, chunk, min(_CHUNK_DOCS, n_docs - start), probs)[1]
+        words = [vocab[w] for w in chunks[chunk][target % _CHUNK_DOCS][picks[q]]]
+        qid = f"bench_q{q:05d}"
+        queries.append({"qid": qid, "query": " ".join(words)})
+        qrels.append({"qid": qid, "docid": f"bench_{target:08d}", "qrel": 1})
+    return queries, qrels
+
+
+class PeakMemory:
+    """Peak resident set size of this process, per stage where the OS allows it.
+
+    On Linux the high-water mark is reset before each stage (``clear_refs``),
+    so each stage reports its own peak; elsewhere the peak is the process
+    maximum so far and ``resettable`` is False.
+    """
+
+    def __init__(self):
+        self.resettable = self.reset()
+
+    @staticmethod
+    def reset() -> bool:
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def peak_mb() -> float:
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) / 1024.0
+        except OSError:
+            pass
+        try:
+            import resource
+        except ImportError:
+            return 0.0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS.
+        return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+
+def latency_stats(latencies_ms: Sequence[float]) -> dict[str, float]:
+    values = np.asarray(latencies_ms, dtype=np.float64)
+    if not len(values):
+        return {"mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "mean_ms": round(float(values.mean()), 4),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "max_ms": round(float(values.max()), 4),
+    }
+
+
+def _timed_build(memory: PeakMemory, build: Callable[[], object], n_docs: int) -> tuple[dict, object]:
+    memory.reset()
+    start = perf_counter()
+    out = build()
+    seconds = perf_counter() - start
+    return {
+        "seconds": round(seconds, 4),
+        "docs_per_second": round(n_docs / seconds, 1) if seconds > 0 else 0.0,
+        "peak_rss_mb": round(memory.peak_mb(), 1),
+    }, out
+
+
+def _timed_queries(
+    memory: PeakMemory, one: Callable[[int], object], batch: Callable[[list[int]], list], n_queries: int, warmup: int
+) -> tuple[dict, list]:
+    """Throughput of ``batch`` over every query, then the latency of ``one`` per query (after ``warmup`` calls)."""
+    memory.reset()
+    for i in range(min(warmup, n_queries)):
+        one(i)
+    start = perf_counter()
+    out = batch(list(range(n_queries)))
+    seconds = perf_counter() - start
+    latencies = []
+    for i in range(n_queries):
+        t0 = perf_counter()
+        one(i)
+        latencies.append(1000.0 * (perf_counter() - t0))
+    row = {
+        "queries": n_queries,
+        "seconds": round(seconds, 4),
+        "qps": round(n_queries / seconds, 2) if seconds > 0 else 0.0,
+        **latency_stats(latencies),
+        "peak_rss_mb": round(memory.peak_mb(), 1),
+    }
+    return row, out
+
+
+def environment() -> dict:
+    """What the numbers depend on besides the code: interpreter, numpy, CPU count and git revision."""
+    root = Path(__file__).resolve().parent
+    revision = dirty = None
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True, timeout=10, check=True
+        ).stdout.strip()
+        dirty = bool(
+            subprocess.run(
+                ["git", "status", "--porcelain", "--untracked-files=no"], cwd=root, capture_output=True, text=True, timeout=30, check=True
+            ).stdout.strip()
+        )
+    except (OSError, subprocess.SubprocessError):
+        pass
+    try:
+        import faiss  # noqa: F401
+
+        has_faiss = True
+    except Exception:
+        has_faiss = False
+    return {
+        "git_commit": revision,
+        "git_dirty": dirty,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "faiss": has_faiss,
+    }
+
+
+def run_benchmark(config: BenchConfig, progress: ProgressFn | None = None) -> dict:
+    """Fit the lexical index (and dense index) on a synthetic corpus and time each query stage.
+
+    Stages later in ``BENCH_STAGES`` take their input from earlier ones
+    (rerank pools are the top lexical candidates; fusion needs the lexical
+    and dense runs), which are computed untimed when not benchmarked. The
+    fused run is evaluated against the synthetic qrels, so a change that
+    alters rankings shows up next to the timings.
+    """
+    unknown = set(config.stages) - set(BENCH_STAGES)
+    if unknown:
+        raise ValueError(f"Unknown bench stages: {sorted(unknown)}")
+    stages = set(config.stages)
+    if "fusion" in stages:
+        stages |= {"dense", "rerank"}
+    memory = PeakMemory()
+    result: dict = {"config": asdict(config), "stages": {}, "quality": {}}
+
+    if progress:
+        progress(f"Generating {config.n_docs} synthetic documents...", 0.02)
+    start = perf_counter()
+    docs = list(synthetic_corpus(config.n_docs, seed=config.seed))
+    queries, qrels = synthetic_queries(config.n_docs, config.n_queries, seed=config.seed)
+    texts = [str(q["query"]) for q in queries]
+    result["corpus"] = {
+        "docs": len(docs),
+        "queries": len(queries),
+        "generate_seconds": round(perf_counter() - start, 4),
+        "avg_doc_chars": round(float(np.mean([len(d["text"]) for d in docs])), 1) if docs else 0.0,
+    }
+    evaluator = Evaluator({q["qid"]: {q["docid"]} for q in qrels}, k=config.top_k)
+    n = len(queries)
+    timed = result["stages"]
+
+    if progress:
+        progress("Fitting lexical index...", 0.08)
+    lexical = HybridTask1Retriever(**config.lexical_params)
+    timed["lexical_fit"], _ = _timed_build(memory, lambda: lexical.fit(docs), len(docs))
+
+    if progress:
+        progress("Lexical ranking...", 0.3)
+    timed["lexical"], lexical_runs = _timed_queries(
+        memory,
+        lambda i: lexical.rank(texts[i], top_k=config.top_k),
+        lambda ids: lexical.rank_many([texts[i] for i in ids], top_k=config.top_k),
+        n,
+        config.warmup,
+    )
+    result["quality"]["lexical"] = _quality(evaluator, queries, lexical_runs)
+
+    if "sparse" in stages:
+        if progress:
+            progress("Sparse lexical ranking...", 0.4)
+        timed["sparse"], sparse_runs = _timed_queries(
+            memory,
+            lambda i: lexical.rank_many([texts[i]], top_k=config.top_k, backend="sparse"),
+            lambda ids: lexical.rank_many([texts[i] for i in ids], top_k=config.top_k, backend="sparse"),
+            n,
+            config.warmup,
+        )
+        result["quality"]["sparse"] = _quality(evaluator, queries, sparse_runs)
+
+    with tempfile.TemporaryDirectory(prefix="joker_bench_") as tmp:
+        dense_runs: list[RankedList] = []
+        if "dense" in stages:
+            dense = _dense_retriever(config, Path(tmp) / "dense_index")
+            if progress:
+                progress(f"Building dense index ({config.dense_model})...", 0.5)
+            timed["dense_build"], _ = _timed_build(memory, lambda: dense.build(docs, incremental=False), len(docs))
+            dense_k = min(config.top_k, config.dense_top_k)
+            if progress:
+                progress("Dense ranking...", 0.65)
+            timed["dense"], dense_runs = _timed_queries(
+                memory,
+                lambda i: dense.rank(texts[i], top_k=dense_k),
+                lambda ids: dense.rank_many([texts[i] for i in ids], top_k=dense_k),
+                n,
+                config.warmup,
+            )
+            result["quality"]["dense"] = _quality(evaluator, queries, dense_runs)
+
+        doc_map = docs_by_id(docs)
+        reranked: list[RankedList] = []
+        if "rerank" in stages:
+            reranker = _reranker(config)
+            if dense_runs:
+                pools = [
+                    seed_candidates(text, lexical_rows, dense_rows, doc_map, config.rerank_top_n, lexical)[1]
+                    for text, lexical_rows, dense_rows in zip(texts, lexical_runs, dense_runs)
+                ]
+            else:
+                pools = [[(docid, str(doc_map[docid]["text"])) for docid in rows[: config.rerank_top_n].docid_list()] for rows in lexical_runs]
+            if progress:
+                progress(f"Reranking ({config.reranker_model})...", 0.75)
+            timed["rerank"], reranked = _timed_queries(
+                memory,
+                lambda i: reranker.rerank(texts[i], pools[i]),
+                lambda ids: reranker.rerank_many([texts[i] for i in ids], [pools[i] for i in ids]),
+                n,
+                config.warmup,
+            )
+            timed["rerank"]["pairs_per_query"] = round(sum(len(pool) for pool in pools) / max(1, n), 1)
+
+        if "fusion" in stages:
+
+            def fuse(i: int) -> RankedList:
+                candidates, _ = seed_candidates(texts[i], lexical_runs[i], dense_runs[i], doc_map, config.rerank_top_n, lexical)
+                candidates.set_scores("rerank", reranked[i])
+                return weighted_fuse(candidates, DEFAULT_FUSION_WEIGHTS, top_k=config.top_k)
+
+            if progress:
+                progress("Fusion...", 0.88)
+            timed["fusion"], fused_runs = _timed_queries(memory, fuse, lambda ids: [fuse(i) for i in ids], n, config.warmup)
+            result["quality"]["fusion"] = _quality(evaluator, queries, fused_runs)
+
+    result["peak_rss_resettable"] = memory.resettable
+    if progress:
+        progress("Benchmark finished.", 1.0)
+    return result
+
+
+def _quality(evaluator: Evaluator, queries: list[dict], runs: list[RankedList]) -> dict[str, float]:
+    summary = evaluator.evaluate({q["qid"]: ranked for q, ranked in zip(queries, runs)}).summary()
+    return {metric: round(summary[metric], 6) for metric in ("map", "mrr", "recall@100")}
+
+
+def _dense_retriever(config: BenchConfig, index_dir: Path):
+    from .dense import DenseRetriever
+
+    dense = DenseRetriever(config.dense_model, index_dir)
+    if config.dense_model == STAND_IN_ENCODER:
+        dense.encoder._model = HashingEncoder(config.dim)
+    return dense
+
+
+def _reranker(config: BenchConfig):
+    from .rerank import CrossEncoderReranker
+
+    reranker = CrossEncoderReranker(config.reranker_model)
+    if config.reranker_model == STAND_IN_RERANKER:
+        reranker._model = OverlapCrossEncoder()
+    return reranker
+
+
+def run_suite(sizes: Sequence[int], config: BenchConfig, progress: ProgressFn | None = None) -> dict:
+    """``run_benchmark`` for each corpus size, with the environment the runs share."""
+    runs = []
+    for i, n_docs in enumerate(sizes):
+        if progress:
+            progress(f"Benchmark {i + 1}/{len(sizes)}: {n_docs} documents", i / max(1, len(sizes)))
+        runs.append(run_benchmark(BenchConfig(**{**asdict(config), "n_docs": int(n_docs)}), progress=progress))
+    return {"schema": BENCH_SCHEMA, "environment": environment(), "runs": runs}
+
+
+def _run_key(run: dict) -> tuple:
+    return tuple(str(run["config"].get(name)) for name in RUN_KEY)
+
+
+def compare_suites(current: dict, baseline: dict) -> list[dict]:
+    """Per (corpus size, stage, field) change of ``current`` against ``baseline``, for the stages both ran.
+
+    Runs are matched on everything that shapes the workload (``RUN_KEY``), so
+    only like-for-like runs are compared.
+
+    ``change`` is the relative difference; ``regression`` is its sign-adjusted
+    form, positive when ``current`` is worse (slower, fewer queries per
+    second or more memory).
+    """
+    base_runs = {_run_key(run): run for run in baseline.get("runs", [])}
+    rows = []
+    for run in current.get("runs", []):
+        base = base_runs.get(_run_key(run))
+        if base is None:
+            continue
+        for stage, values in run["stages"].items():
+            base_values = base["stages"].get(stage)
+            if base_values is None:
+                continue
+            for name in COMPARED_FIELDS:
+                if name not in values or not base_values.get(name):
+                    continue
+                change = (values[name] - base_values[name]) / base_values[name]
+                rows.append(
+                    {
+                        "n_docs": run["config"]["n_docs"],
+                        "stage": stage,
+                        "field": name,
+                        "baseline": base_values[name],
+                        "current": values[name],
+                        "change": round(change, 4),
+                        "regression": round(-change if name == "qps" else change, 4),
+                    }
+                )
+    return rows
+
+
+def format_suite(suite: dict) -> str:
+    lines = []
+    for run in suite["runs"]:
+        lines.append(f"{run['corpus']['docs']} docs, {run['corpus']['queries']} queries:")
+        for stage, row in run["stages"].items():
+            if "qps" in row:
+                line = (
+                    f"  {stage}: {row['qps']:.1f} q/s, p50 {row['p50_ms']:.2f} ms, p95 {row['p95_ms']:.2f} ms, "
+                    f"p99 {row['p99_ms']:.2f} ms"
+                )
+            else:
+                line = f"  {stage}: {row['seconds']:.2f} s ({row['docs_per_second']:.0f} docs/s)"
+            lines.append(f"{line}, peak RSS {row['peak_rss_mb']:.0f} MB")
+        for stage, metrics in run["quality"].items():
+            lines.append(f"  {stage} MAP {metrics['map']:.4f}, recall@100 {metrics['recall@100']:.4f}")
+    return "\n".join(lines)
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Iterable
+
+
+def content_hash(*parts: Any) -> str:
+    """Stable SHA-1 of JSON-serializable parts (dict keys sorted)."""
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+def corpus_fingerprint(docs: Iterable[dict]) -> str:
+    """SHA-1 over every (docid, text) in corpus order."""
+    h = hashlib.sha1()
+    for doc in docs:
+        h.update(str(doc["docid"]).encode("utf-8"))
+        h.update(b"\0")
+        h.update(str(doc["text"]).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class StageCache:
+    """On-disk SQLite cache of per-query pipeline stage outputs.
+
+    Values are JSON-serializable and stored under keys built by ``key`` from a
+    stage name, a qid and everything the stage output depends on (corpus hash,
+    model name, parameters, query text). The database is kept below
+    ``max_bytes`` of stored values by evicting the least recently used rows.
+    """
+
+    def __init__(self, path: str | Path, max_bytes: int = 1 << 30):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS stage_cache ("
+            "key TEXT PRIMARY KEY, stage TEXT NOT NULL, qid TEXT NOT NULL, "
+            "value BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS stage_cache_last_used ON stage_cache (last_used)")
+        self._conn.commit()
+        # Running byte total; rows replaced in place are counted again, so it can only run high.
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM stage_cache").fetchone()[0]
+
+    @staticmethod
+    def key(stage: str, qid: str, **parts: Any) -> str:
+        return f"{stage}:{qid}:{content_hash(stage, qid, parts)}"
+
+    def get_many(self, keys: list[str]) -> dict[str, Any]:
+        found: dict[str, Any] = {}
+        for start in range(0, len(keys), 500):
+            chunk = keys[start : start + 500]
+            marks = ",".join("?" * len(chunk))
+            for key, value in self._conn.execute(f"SELECT key, value FROM stage_cache WHERE key IN ({marks})", chunk):
+                found[key] = json.loads(value)
+        if found:
+            now = time.time()
+            self._conn.executemany("UPDATE stage_cache SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+            self._conn.commit()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, stage: str, items: dict[str, tuple[str, Any]]) -> None:
+        """Store ``{key: (qid, value)}`` for one stage, then evict down to ``max_bytes``."""
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, (qid, value) in items.items():
+            blob = json.dumps(value, ensure_ascii=False).encode("utf-8")
+            rows.append((key, stage, str(qid), blob, len(blob), now))
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO stage_cache (key, stage, qid, value, size, last_used) VALUES (?, ?, ?, ?, ?, ?)", rows
+        )
+        self._conn.commit()
+        self._bytes += sum(row[4] for row in rows)
+        self._evict()
+
+    def _evict(self) -> None:
+        if self._bytes <= self.max_bytes:
+            return
+        drop: list[tuple[str]] = []
+        for key, size in self._conn.execute("SELECT key, size FROM stage_cache ORDER BY last_used ASC"):
+            if self._bytes <= self.max_bytes:
+                break
+            drop.append((key,))
+            self._bytes -= size
+        else:
+            self._bytes = 0
+        self._conn.executemany("DELETE FROM stage_cache WHERE key = ?", drop)
+        self._conn.commit()
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": self.hits / lookups if lookups else 0.0}
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class PairScoreCache:
+    """Cross-encoder pair scores keyed by (model name, query hash, docid).
+
+    Lookups go through an in-memory LRU of ``memory_items`` entries first and
+    then, when ``path`` is given, a persistent SQLite tier bounded to
+    ``max_rows`` (least recently used rows are evicted). The doc text hash is
+    part of the key, so the same docid in another corpus never matches.
+    """
+
+    def __init__(self, path: str | Path | None = None, memory_items: int = 200_000, max_rows: int = 5_000_000):
+        self.memory_items = memory_items
+        self.max_rows = max_rows
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[tuple[str, str, str, str], float] = OrderedDict()
+        self._conn = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(path))
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pair_scores ("
+                "model TEXT NOT NULL, query_hash TEXT NOT NULL, docid TEXT NOT NULL, doc_hash TEXT NOT NULL, "
+                "score REAL NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (model, query_hash, docid, doc_hash))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS pair_scores_last_used ON pair_scores (last_used)")
+            self._conn.commit()
+            # Running row count; rows replaced in place are counted again, so it can only run high.
+            self._rows = self._conn.execute("SELECT COUNT(*) FROM pair_scores").fetchone()[0]
+
+    @staticmethod
+    def pair_key(model: str, query: str, docid: str, doc_text: str) -> tuple[str, str, str, str]:
+        return (
+            model,
+            hashlib.sha1(query.encode("utf-8")).hexdigest(),
+            str(docid),
+            hashlib.sha1(doc_text.encode("utf-8")).hexdigest()[:16],
+        )
+
+    def _remember(self, key: tuple[str, str, str, str], score: float) -> None:
+        self._memory[key] = score
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: list[tuple[str, str, str, str]]) -> dict[int, float]:
+        """Cached scores by position in ``keys``."""
+        found: dict[int, float] = {}
+        pending: list[int] = []
+        for i, key in enumerate(keys):
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                found[i] = self._memory[key]
+            else:
+                pending.append(i)
+        self.memory_hits += len(found)
+        if self._conn is not None and pending:
+            groups: dict[tuple[str, str], dict[tuple[str, str], list[int]]] = {}
+            for i in pending:
+                model, query_hash, docid, doc_hash = keys[i]
+                groups.setdefault((model, query_hash), {}).setdefault((docid, doc_hash), []).append(i)
+            now = time.time()
+            touched = []
+            for (model, query_hash), by_doc in groups.items():
+                docids = list(dict.fromkeys(docid for docid, _ in by_doc))
+                for start in range(0, len(docids), 500):
+                    chunk = docids[start : start + 500]
+                    marks = ",".join("?" * len(chunk))
+                    rows = self._conn.execute(
+                        f"SELECT docid, doc_hash, score FROM pair_scores WHERE model = ? AND query_hash = ? AND docid IN ({marks})",
+                        [model, query_hash, *chunk],
+                    ).fetchall()
+                    for docid, doc_hash, score in rows:
+                        positions = by_doc.get((docid, doc_hash))
+                        if positions is None:
+                            continue
+                        key = (model, query_hash, docid, doc_hash)
+                        self._remember(key, float(score))
+                        for i in positions:
+                            found[i] = float(score)
+                        self.disk_hits += len(positions)
+                        touched.append((now, *key))
+            if touched:
+                self._conn.executemany(
+                    "UPDATE pair_scores SET last_used = ? WHERE model = ? AND query_hash = ? AND docid = ? AND doc_hash = ?",
+                    touched,
+                )
+                self._conn.commit()
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, keys: list[tuple[str, str, str, str]], scores: list[float]) -> None:
+        for key, score in zip(keys, scores):
+            self._remember(key, float(score))
+        if self._conn is None or not keys:
+            return
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO pair_scores (model, query_hash, docid, doc_hash, score, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+            [(*key, float(score), now) for key, score in zip(keys, scores)],
+        )
+        self._rows += len(keys)
+        excess = self._rows - self.max_rows
+        if excess > 0:
+            deleted = self._conn.execute(
+                "DELETE FROM pair_scores WHERE rowid IN (SELECT rowid FROM pair_scores ORDER BY last_used ASC LIMIT ?)", (excess,)
+            ).rowcount
+            self._rows = self._rows - deleted if deleted == excess else 0
+        self._conn.commit()
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Iterator
+
+import numpy as np
+
+from .fusion import CandidatePool
+
+
+@dataclass(frozen=True)
+class CascadeConfig:
+    """Pruning stages run on the rerank pool before the expensive models.
+
+    The ``fast`` stage scores the pool with the linear part of the fusion
+    model (lexical, dense and feature weights; ``fast_weights`` or the fusion
+    config) and keeps at most ``fast_top_n`` candidates. When ``model`` is
+    set, that (small, distilled) cross-encoder scores the survivors and keeps
+    at most ``model_top_n`` for the final reranker and humor scorer. A
+    stage's ``*_top_n`` of 0 disables it.
+
+    Each cut-off adapts to the score margins: after min-max normalizing a
+    stage's scores per query, candidates more than ``margin`` below the best
+    one are dropped (1.0 keeps everything up to the cap), but never fewer
+    than ``min_keep``.
+    """
+
+    fast_top_n: int = 0
+    fast_margin: float = 1.0
+    fast_weights: dict | None = None
+    model: str | None = None
+    model_top_n: int = 0
+    model_margin: float = 1.0
+    min_keep: int = 20
+
+    @property
+    def enabled(self) -> bool:
+        return self.fast_top_n > 0 or bool(self.model and self.model_top_n > 0)
+
+
+def adaptive_cutoff(scores: np.ndarray, top_n: int, margin: float, min_keep: int) -> int:
+    """How many of the best ``scores`` to keep: at most ``top_n``, fewer when the rest trail by more than ``margin``."""
+    n = len(scores)
+    limit = min(top_n, n)
+    if limit <= min_keep or margin >= 1.0:
+        return limit
+    ordered = np.sort(np.asarray(scores, dtype=np.float64))[::-1]
+    spread = ordered[0] - ordered[-1]
+    if spread <= 0.0:
+        return limit
+    within = int(np.count_nonzero(ordered >= ordered[0] - margin * spread))
+    return max(min(limit, within), min_keep)
+
+
+def prune(docs: list[tuple[str, str]], scores: list[float] | np.ndarray, top_n: int, margin: float, min_keep: int) -> list[tuple[str, str]]:
+    """The best-scored (docid, text) pairs surviving ``adaptive_cutoff``, best first (ties keep pool order)."""
+    if not docs:
+        return []
+    scores = np.asarray(scores, dtype=np.float64)
+    order = np.argsort(-scores, kind="stable")
+    keep = adaptive_cutoff(scores, top_n, margin, min_keep)
+    return [docs[i] for i in order[:keep]]
+
+
+def linear_scores(candidates: CandidatePool, docids: list[str], weights: dict) -> np.ndarray:
+    """Fusion score without the reranker and humor terms, for the fast cascade stage."""
+    return candidates.fused_scores(weights, signals=("lexical", "dense"), rows=candidates.positions(docids))
+
+
+class StageReport:
+    """Per-stage latency, candidate counts and recall over a hybrid run.
+
+    ``rel_by_qid`` (qid -> relevant docids) enables recall: for each stage the
+    share of a query's relevant documents still among its candidates after
+    that stage, summed over the queries that have any.
+    """
+
+    def __init__(self, rel_by_qid: dict[str, set[str]] | None = None):
+        self.rel_by_qid = rel_by_qid or {}
+        self.seconds: dict[str, float] = defaultdict(float)
+        self.queries: dict[str, int] = defaultdict(int)
+        self.candidates_in: dict[str, int] = defaultdict(int)
+        self.candidates_out: dict[str, int] = defaultdict(int)
+        self.relevant: dict[str, int] = defaultdict(int)
+        self.relevant_kept: dict[str, int] = defaultdict(int)
+
+    @contextmanager
+    def timed(self, stage: str, n_queries: int) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] += perf_counter() - start
+            self.queries[stage] += n_queries
+
+    def record(self, stage: str, qid: str, n_in: int, kept: list[str]) -> None:
+        self.candidates_in[stage] += n_in
+        self.candidates_out[stage] += len(kept)
+        rel = self.rel_by_qid.get(str(qid))
+        if rel:
+            self.relevant[stage] += len(rel)
+            self.relevant_kept[stage] += len(rel.intersection(kept))
+
+    def summary(self) -> dict[str, dict]:
+        out: dict[str, dict] = {}
+        for stage in self.seconds:
+            queries = max(1, self.queries[stage])
+            row = {
+                "queries": self.queries[stage],
+                "seconds": round(self.seconds[stage], 4),
+                "ms_per_query": round(1000.0 * self.seconds[stage] / queries, 3),
+            }
+            if stage in self.candidates_out:
+                row["candidates_in"] = round(self.candidates_in[stage] / queries, 1)
+                row["candidates_out"] = round(self.candidates_out[stage] / queries, 1)
+            if self.relevant.get(stage):
+                row["recall"] = round(self.relevant_kept[stage] / self.relevant[stage], 4)
+            out[stage] = row
+        return out
+
+    def format(self) -> str:
+        lines = []
+        for stage, row in self.summary().items():
+            line = f"{stage}: {row['ms_per_query']:.1f} ms/query"
+            if "candidates_out" in row:
+                line += f", {row['candidates_in']:g} -> {row['candidates_out']:g} candidates"
+            if "recall" in row:
+                line += f", recall {row['recall']:.3f}"
+            lines.append(line)
+        return "\n".join(lines)
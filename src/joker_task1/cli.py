@@ -1,284 +1,27 @@
 from __future__ import annotations
 
 import argparse
-import copy
-import itertools
 import json
 from pathlib import Path
-from random import Random
-from typing import Callable
-
-from .data import docs_by_id, load_json, save_json, to_qrel_map, zip_single_file
-from .features import humor_features
-from .fusion import build_candidates, rrf_fuse, weighted_fuse
-from .retriever import HybridTask1Retriever, RetrievedDoc
-
-ProgressFn = Callable[[str, float], None]
-DEFAULT_FUSION_WEIGHTS = {
-    "lexical": 1.0,
-    "dense": 0.8,
-    "rerank": 1.2,
-    "humor": 1.0,
-    "feature_weights": {
-        "exact_match": 0.1,
-        "token_overlap": 0.12,
-        "char_overlap": 0.1,
-        "doc_len_norm": 0.04,
-        "punct_norm": 0.04,
-        "exclaim_norm": 0.03,
-        "quote_norm": 0.03,
-        "repeated_words_norm": 0.04,
-    },
-}
-
-
-def map_at_k(pred_by_qid: dict[str, list[str]], rel_by_qid: dict[str, set[str]], k: int = 1000) -> float:
-    aps: list[float] = []
-    for qid, rel_set in rel_by_qid.items():
-        preds = pred_by_qid.get(qid, [])[:k]
-        if not rel_set:
-            continue
-        hit_count = 0
-        precision_sum = 0.0
-        for i, docid in enumerate(preds, start=1):
-            if docid in rel_set:
-                hit_count += 1
-                precision_sum += hit_count / i
-        aps.append(precision_sum / len(rel_set))
-    return sum(aps) / len(aps) if aps else 0.0
-
-
-def split_qrels_by_query(qrels: list[dict], valid_ratio: float = 0.2, seed: int = 13) -> tuple[list[dict], list[dict]]:
-    qids = sorted({str(r["qid"]) for r in qrels})
-    rnd = Random(seed)
-    rnd.shuffle(qids)
-    cut = max(1, int(len(qids) * valid_ratio))
-    valid_qids = set(qids[:cut])
-    train = [r for r in qrels if str(r["qid"]) not in valid_qids]
-    valid = [r for r in qrels if str(r["qid"]) in valid_qids]
-    return train, valid
-
-
-def predictions_from_rankings(run_id: str, manual: int, query_rows: list[dict], rankings: dict[str, list]) -> list[dict]:
-    out: list[dict] = []
-    for q in query_rows:
-        qid = str(q["qid"])
-        ranked = rankings.get(qid, [])
-        for rank, r in enumerate(HybridTask1Retriever.normalize_scores(ranked), start=1):
-            out.append(
-                {
-                    "run_id": run_id,
-                    "manual": int(manual),
-                    "qid": qid,
-                    "docid": r.docid,
-                    "rank": rank,
-                    "score": round(r.score, 6),
-                }
-            )
-    return out
-
-
-def build_predictions(
-    docs_path: str,
-    queries_path: str,
-    output_path: str,
-    run_id: str,
-    manual: int,
-    qrels_path: str | None = None,
-    top_k: int = 1000,
-    params: dict | None = None,
-    progress: ProgressFn | None = None,
-) -> list[dict]:
-    if progress:
-        progress("Loading input files...", 0.02)
-    docs = load_json(docs_path)
-    queries = load_json(queries_path)
-    qrels = load_json(qrels_path) if qrels_path else None
-
-    retriever = HybridTask1Retriever(**(params or {}))
-    retriever.fit(docs=docs, qrels=qrels, progress=progress)
-
-    rankings = {}
-    total_queries = max(1, len(queries))
-    for idx, q in enumerate(queries, start=1):
-        qid = str(q["qid"])
-        rankings[qid] = retriever.rank(str(q["query"]), top_k=top_k)
-        if progress and (idx % 5 == 0 or idx == total_queries):
-            progress(f"Ranking queries: {idx}/{total_queries}", 0.6 + 0.3 * (idx / total_queries))
-
-    rows = predictions_from_rankings(run_id, manual, queries, rankings)
-    save_json(rows, output_path)
-    if progress:
-        progress(f"Saved predictions to {output_path}", 0.96)
-    return rows
-
-
-def load_fusion_config(path: str | None) -> dict:
-    if not path:
-        return json.loads(json.dumps(DEFAULT_FUSION_WEIGHTS))
-    data = load_json(path)
-    merged = json.loads(json.dumps(DEFAULT_FUSION_WEIGHTS))
-    for key, value in data.items():
-        if key == "feature_weights" and isinstance(value, dict):
-            merged.setdefault("feature_weights", {}).update(value)
-        else:
-            merged[key] = value
-    return merged
-
-
-def build_hybrid_predictions(
-    docs_path: str,
-    queries_path: str,
-    output_path: str,
-    run_id: str,
-    manual: int,
-    qrels_path: str | None = None,
-    top_k: int = 1000,
-    lexical_params: dict | None = None,
-    dense_model: str = "BAAI/bge-small-en-v1.5",
-    dense_index_dir: str = "artifacts/dense_index",
-    dense_top_k: int = 700,
-    reranker_model: str | None = None,
-    rerank_top_n: int = 200,
-    humor_model_dir: str | None = None,
-    device: str | None = None,
-    batch_size: int = 32,
-    fusion_config_path: str | None = None,
-    progress: ProgressFn | None = None,
-) -> list[dict]:
-    from .dense import DenseRetriever
-
-    docs = load_json(docs_path)
-    queries = load_json(queries_path)
-    qrels = load_json(qrels_path) if qrels_path else None
-    doc_map = docs_by_id(docs)
-
-    if progress:
-        progress("Fitting lexical retriever...", 0.02)
-    lexical = HybridTask1Retriever(**(lexical_params or {}))
-    lexical.fit(docs=docs, qrels=qrels, progress=progress)
-
-    if progress:
-        progress(f"Loading dense retriever ({dense_model})...", 0.12)
-    dense = DenseRetriever(model_name=dense_model, index_dir=dense_index_dir, device=device, batch_size=batch_size)
-    dense.ensure_ready(docs=docs, progress=progress)
-
-    reranker = None
-    if reranker_model:
-        if progress:
-            progress(f"Loading reranker ({reranker_model})...", 0.18)
-        from .rerank import CrossEncoderReranker
-
-        reranker = CrossEncoderReranker(model_name=reranker_model, device=device, batch_size=max(4, batch_size // 2))
-
-    humor_scorer = None
-    if humor_model_dir:
-        if progress:
-            progress(f"Loading humor classifier ({humor_model_dir})...", 0.22)
-        from .humor_classifier import HumorPairScorer
 
-        humor_scorer = HumorPairScorer(model_dir=humor_model_dir, device=device)
-
-    fusion_weights = load_fusion_config(fusion_config_path)
-    rankings: dict[str, list] = {}
-    total_queries = max(1, len(queries))
-    for idx, query_row in enumerate(queries, start=1):
-        qid = str(query_row["qid"])
-        query_text = str(query_row["query"])
-        lexical_rows = lexical.rank(query_text, top_k=top_k)
-        dense_rows = dense.rank(query_text, top_k=min(top_k, dense_top_k))
-        fused_seed = rrf_fuse(lexical_rows, dense_rows)
-        candidates = build_candidates(lexical_rows, dense_rows)
-        ranked_seed = sorted(fused_seed.items(), key=lambda item: item[1], reverse=True)
-        candidate_ids = [docid for docid, _ in ranked_seed[: max(rerank_top_n, 100)]]
-
-        for docid in candidate_ids:
-            if docid not in candidates:
-                continue
-            doc_text = str(doc_map[docid]["text"])
-            candidates[docid].feature_scores = humor_features(query_text, doc_text)
-
-        rerank_ids = candidate_ids[:rerank_top_n]
-        rerank_docs = [(docid, str(doc_map[docid]["text"])) for docid in rerank_ids]
-        if reranker and rerank_docs:
-            reranked = reranker.rerank(query_text, rerank_docs)
-            rerank_map = {row.docid: row.score for row in HybridTask1Retriever.normalize_scores(reranked)}
-            for docid, score in rerank_map.items():
-                if docid in candidates:
-                    candidates[docid].rerank_score = score
-
-        if humor_scorer and rerank_docs:
-            humor_scores = humor_scorer.score_pairs(query_text, [text for _, text in rerank_docs], batch_size=max(4, batch_size // 2))
-            humor_rows = [RetrievedDoc(docid=docid, score=float(score)) for (docid, _), score in zip(rerank_docs, humor_scores)]
-            humor_map = {row.docid: row.score for row in HybridTask1Retriever.normalize_scores(humor_rows)}
-            for docid, score in humor_map.items():
-                if docid in candidates:
-                    candidates[docid].humor_score = score
-
-        rankings[qid] = weighted_fuse(candidates, fusion_weights, top_k=top_k)
-        if progress and (idx % 5 == 0 or idx == total_queries):
-            progress(f"Hybrid ranking queries: {idx}/{total_queries}", 0.25 + 0.7 * (idx / total_queries))
-
-    rows = predictions_from_rankings(run_id, manual, queries, rankings)
-    save_json(rows, output_path)
-    if progress:
-        progress(f"Saved hybrid predictions to {output_path}", 0.98)
-    return rows
-
-
-def tune_params(
-    docs: list[dict], queries: list[dict], qrels: list[dict], top_k: int = 1000, progress: ProgressFn | None = None
-) -> tuple[dict, float]:
-    train_qrels, valid_qrels = split_qrels_by_query(qrels)
-
-    qtext = {str(q["qid"]): str(q["query"]) for q in queries}
-    valid_qids = sorted({str(r["qid"]) for r in valid_qrels})
-    valid_rel = to_qrel_map(valid_qrels)
-
-    grid = {
-        "k1": [1.2, 1.5, 1.8],
-        "b": [0.6, 0.75, 0.9],
-        "char_weight": [0.2, 0.35, 0.5],
-        "humor_weight": [0.1, 0.2, 0.4],
-        "match_boost": [0.05, 0.1, 0.2],
-    }
-
-    best_params: dict = {}
-    best_map = -1.0
-
-    keys = list(grid.keys())
-    combos = list(itertools.product(*(grid[k] for k in keys)))
-    total = max(1, len(combos))
-
-    for i, vals in enumerate(combos, start=1):
-        params = dict(zip(keys, vals))
-        retriever = HybridTask1Retriever(**params)
-        retriever.fit(docs=docs, qrels=train_qrels)
-
-        pred_by_qid: dict[str, list[str]] = {}
-        for qid in valid_qids:
-            query = qtext.get(qid, "")
-            pred_by_qid[qid] = [x.docid for x in retriever.rank(query, top_k=top_k)]
-
-        score = map_at_k(pred_by_qid, valid_rel, k=top_k)
-        if score > best_map:
-            best_map = score
-            best_params = params
-
-        if progress and (i % 10 == 0 or i == total):
-            progress(f"Auto-tune grid search: {i}/{total}", 0.05 + 0.45 * (i / total))
-
-    return best_params, best_map
-
-
-def evaluate_predictions_file(predictions_path: str, qrels_path: str, k: int) -> float:
-    predictions = load_json(predictions_path)
-    qrels = load_json(qrels_path)
-    rel_by_qid = to_qrel_map(qrels)
-    pred_by_qid: dict[str, list[str]] = {}
-    for row in predictions:
-        pred_by_qid.setdefault(str(row["qid"]), []).append(str(row["docid"]))
-    return map_at_k(pred_by_qid, rel_by_qid, k=k)
+from .bench import BENCH_STAGES, STAND_IN_ENCODER, STAND_IN_RERANKER
+from .cache import PairScoreCache
+from .cascade import CascadeConfig
+from .data import PredictionWriter, docs_by_id, iter_json_rows, load_json, save_json, to_qrel_map, zip_single_file
+from .evaluation import DEFAULT_CUTOFFS, PAIRED_TESTS, Evaluator, load_run, paired_test
+from .fusion import weighted_fuse
+from .onnx_backend import INFERENCE_BACKENDS, InferenceBackend
+from .pipeline import (
+    QUERY_BATCH_SIZE,
+    build_hybrid_predictions,
+    build_predictions,
+    load_fusion_config,
+    load_lexical_retriever,
+    prediction_rows,
+    seed_candidates,
+    tune_params,
+)
+from .retriever import HybridTask1Retriever, RankedList
 
 
 def cmd_predict(args: argparse.Namespace) -> None:
@@ -293,7 +36,7 @@ def cmd_predict(args: argparse.Namespace) -> None:
         print(f"Selected params: {params}")
         print(f"Holdout MAP@{args.top_k}: {holdout_map:.6f}")
 
-    rows = build_predictions(
+    n_rows = build_predictions(
         docs_path=args.docs,
         queries_path=args.queries,
         output_path=args.output,
@@ -302,18 +45,31 @@ def cmd_predict(args: argparse.Namespace) -> None:
         qrels_path=args.qrels,
         top_k=args.top_k,
         params=params,
+        lexical_index_dir=args.lexical_index_dir,
+        lexical_backend=args.lexical_backend,
+        workers=args.workers,
+        stage_cache_path=args.stage_cache,
+        stage_cache_max_mb=args.stage_cache_max_mb,
     )
 
     if args.zip:
         zip_single_file(args.output, args.zip, arcname="prediction.json")
 
-    print(f"Wrote {len(rows)} rows to {args.output}")
+    print(f"Wrote {n_rows} rows to {args.output}")
     if args.zip:
         print(f"Created submission archive: {args.zip}")
 
 
+def format_rerank_cache_stats(stats: dict) -> str:
+    return (
+        f"Reranker score cache: {stats['memory_hits']} memory hits, {stats['disk_hits']} disk hits, "
+        f"{stats['misses']} misses ({stats['hit_ratio']:.1%} hit ratio)"
+    )
+
+
 def cmd_predict_hybrid(args: argparse.Namespace) -> None:
-    rows = build_hybrid_predictions(
+    rerank_cache = PairScoreCache(args.rerank_cache) if args.rerank_cache else None
+    n_rows = build_hybrid_predictions(
         docs_path=args.docs,
         queries_path=args.queries,
         output_path=args.output,
@@ -321,6 +77,9 @@ def cmd_predict_hybrid(args: argparse.Namespace) -> None:
         manual=args.manual,
         qrels_path=args.qrels,
         top_k=args.top_k,
+        lexical_index_dir=args.lexical_index_dir,
+        lexical_backend=args.lexical_backend,
+        workers=args.workers,
         dense_model=args.dense_model,
         dense_index_dir=args.dense_index_dir,
         dense_top_k=args.dense_top_k,
@@ -329,22 +88,185 @@ def cmd_predict_hybrid(args: argparse.Namespace) -> None:
         humor_model_dir=args.humor_model_dir,
         device=args.device,
         batch_size=args.batch_size,
+        backend=backend_from_args(args),
+        cascade=cascade_from_args(args),
         fusion_config_path=args.fusion_config,
+        stage_cache_path=args.stage_cache,
+        stage_cache_max_mb=args.stage_cache_max_mb,
+        rerank_cache=rerank_cache,
+        stage_report_path=args.stage_report,
     )
+    if rerank_cache is not None:
+        print(format_rerank_cache_stats(rerank_cache.stats()))
+        rerank_cache.close()
     if args.zip:
         zip_single_file(args.output, args.zip, arcname="prediction.json")
-    print(f"Wrote {len(rows)} rows to {args.output}")
+    print(f"Wrote {n_rows} rows to {args.output}")
     if args.zip:
         print(f"Created submission archive: {args.zip}")
 
 
 def cmd_build_dense_index(args: argparse.Namespace) -> None:
-    from .dense import DenseRetriever
+    from .dense import AnnIndexConfig, DenseRetriever
+
+    index_config = AnnIndexConfig(
+        index_type=args.index_type,
+        nlist=args.nlist,
+        nprobe=args.nprobe,
+        hnsw_m=args.hnsw_m,
+        ef_construction=args.ef_construction,
+        ef_search=args.ef_search,
+        pq_m=args.pq_m,
+        pq_bits=args.pq_bits,
+        train_size=args.train_size,
+    )
+    retriever = DenseRetriever(
+        model_name=args.model_name,
+        index_dir=args.index_dir,
+        device=args.device,
+        batch_size=args.batch_size,
+        index_config=index_config,
+        storage=args.storage,
+        max_batch_tokens=args.max_batch_tokens,
+        backend=backend_from_args(args),
+    )
+    retriever.build(iter_json_rows(args.docs), progress=lambda msg, _: print(msg), incremental=not args.rebuild)
+    print(f"Dense index written to {args.index_dir}")
+    if args.recall_k > 0:
+        query_embeddings = None
+        if args.recall_queries:
+            texts = [str(q["query"]) for q in load_json(args.recall_queries)]
+            query_embeddings = retriever.encoder.encode_texts(texts, is_query=True)
+        try:
+            report = retriever.ann_recall(k=args.recall_k, query_embeddings=query_embeddings, sample=args.recall_sample)
+        except RuntimeError as exc:
+            print(f"Skipping recall report: {exc}")
+        else:
+            print(json.dumps({"index_type": args.index_type, **report}, indent=2))
+
+
+def cmd_export_onnx(args: argparse.Namespace) -> None:
+    from .dense import DenseEncoder
+    from .humor_classifier import HumorPairScorer
+    from .rerank import CrossEncoderReranker
+
+    backend = backend_from_args(args)
+    if not backend.is_onnx:
+        raise ValueError("export-onnx needs --backend onnx or onnx-int8")
+    exports = {
+        "dense": (args.dense_model, lambda: DenseEncoder(model_name=args.dense_model, backend=backend)._load_model()),
+        "rerank": (args.reranker_model, lambda: CrossEncoderReranker(model_name=args.reranker_model, backend=backend)._load_model()),
+        "humor": (args.humor_model_dir, lambda: HumorPairScorer(model_dir=args.humor_model_dir, device="cpu", backend=backend)),
+    }
+    report: dict[str, dict] = {}
+    failed = False
+    for role, (model_name, load) in exports.items():
+        if not model_name:
+            continue
+        entry = report[role] = {"model": model_name, "dir": str(backend.artifact_dir(role, model_name))}
+        try:
+            load()
+        except ValueError as exc:
+            entry["error"] = str(exc)
+            failed = True
+        meta_path = Path(entry["dir"]) / "onnx_meta.json"
+        if meta_path.exists():
+            entry["parity"] = json.loads(meta_path.read_text(encoding="utf-8")).get("parity")
+    print(json.dumps(report, indent=2))
+    if failed:
+        raise SystemExit("Some ONNX exports failed the parity check.")
+
+
+def cmd_build_lexical_index(args: argparse.Namespace) -> None:
+    qrels = load_json(args.qrels) if args.qrels else None
+    retriever = HybridTask1Retriever()
+    retriever.fit(docs=iter_json_rows(args.docs), qrels=qrels)
+    retriever.save(args.index_dir)
+    print(f"Lexical index written to {args.index_dir}")
+
+
+def cmd_tune(args: argparse.Namespace) -> None:
+    from .tuning import search_fusion_weights, search_lexical_params
 
     docs = load_json(args.docs)
-    retriever = DenseRetriever(model_name=args.model_name, index_dir=args.index_dir, device=args.device, batch_size=args.batch_size)
-    retriever.build(docs)
-    print(f"Dense index written to {args.index_dir}")
+    queries = load_json(args.queries)
+    qrels = load_json(args.qrels)
+    search_kwargs = {
+        "strategy": args.strategy,
+        "n_trials": args.trials,
+        "workers": args.workers,
+        "top_k": args.top_k,
+        "seed": args.seed,
+        "eta": args.eta,
+        "min_queries": args.min_queries,
+        "log_path": args.trial_log,
+        "progress": lambda msg, p: print(msg),
+    }
+    if args.space == "lexical":
+        best, score = search_lexical_params(docs, queries, qrels, **search_kwargs)
+    else:
+        best, score = search_fusion_weights(
+            docs,
+            queries,
+            qrels,
+            fusion_config_path=args.fusion_config,
+            hybrid_kwargs={
+                "lexical_params": load_json(args.lexical_params) if args.lexical_params else None,
+                "dense_model": args.dense_model,
+                "dense_index_dir": args.dense_index_dir,
+                "dense_top_k": args.dense_top_k,
+                "reranker_model": args.reranker_model,
+                "rerank_top_n": args.rerank_top_n,
+                "humor_model_dir": args.humor_model_dir,
+                "device": args.device,
+                "batch_size": args.batch_size,
+                "backend": backend_from_args(args),
+                "cascade": cascade_from_args(args),
+            },
+            **search_kwargs,
+        )
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    save_json(best, args.output)
+    print(f"Selected {args.space} params: {best}")
+    print(f"Holdout MAP@{args.top_k}: {score:.6f}")
+    print(f"Wrote {args.output}")
+
+
+def cmd_tune_fusion(args: argparse.Namespace) -> None:
+    from .tuning import tune_fusion
+
+    docs = load_json(args.docs)
+    queries = load_json(args.queries)
+    qrels = load_json(args.qrels)
+    weights, score, base_score = tune_fusion(
+        docs,
+        queries,
+        qrels,
+        top_k=args.top_k,
+        fusion_config_path=args.fusion_config,
+        hybrid_kwargs={
+            "lexical_params": load_json(args.lexical_params) if args.lexical_params else None,
+            "dense_model": args.dense_model,
+            "dense_index_dir": args.dense_index_dir,
+            "dense_top_k": args.dense_top_k,
+            "reranker_model": args.reranker_model,
+            "rerank_top_n": args.rerank_top_n,
+            "humor_model_dir": args.humor_model_dir,
+            "device": args.device,
+            "batch_size": args.batch_size,
+            "backend": backend_from_args(args),
+            "cascade": cascade_from_args(args),
+        },
+        score_cache=args.score_cache,
+        n_samples=args.samples,
+        rounds=args.rounds,
+        seed=args.seed,
+        progress=lambda msg, p: print(msg),
+    )
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    save_json(weights, args.output)
+    print(f"Holdout MAP@{args.top_k}: {base_score:.6f} (base weights) -> {score:.6f} (tuned)")
+    print(f"Fusion config written to {args.output}")
 
 
 def cmd_train_humor(args: argparse.Namespace) -> None:
@@ -372,6 +294,11 @@ def cmd_train_humor(args: argparse.Namespace) -> None:
 def cmd_ablate(args: argparse.Namespace) -> None:
     if not args.qrels:
         raise ValueError("--qrels is required for ablation")
+    # Ablation variants share their lexical/dense runs and model scores through one stage cache.
+    stage_cache = args.stage_cache or str(Path(args.output_dir) / "stage_cache.sqlite")
+    rerank_cache = PairScoreCache(args.rerank_cache)
+    backend = backend_from_args(args)
+    cascade = cascade_from_args(args)
     run_specs = [
         {
             "name": "lexical",
@@ -383,6 +310,11 @@ def cmd_ablate(args: argparse.Namespace) -> None:
                 "manual": args.manual,
                 "qrels_path": args.qrels,
                 "top_k": args.top_k,
+                "lexical_index_dir": args.lexical_index_dir,
+                "lexical_backend": args.lexical_backend,
+                "workers": args.workers,
+                "stage_cache_path": stage_cache,
+                "stage_cache_max_mb": args.stage_cache_max_mb,
             },
             "hybrid": False,
         },
@@ -396,12 +328,20 @@ def cmd_ablate(args: argparse.Namespace) -> None:
                 "manual": args.manual,
                 "qrels_path": args.qrels,
                 "top_k": args.top_k,
+                "lexical_index_dir": args.lexical_index_dir,
+                "lexical_backend": args.lexical_backend,
+                "workers": args.workers,
+                "stage_cache_path": stage_cache,
+                "stage_cache_max_mb": args.stage_cache_max_mb,
                 "dense_model": args.dense_model,
                 "dense_index_dir": args.dense_index_dir,
                 "dense_top_k": args.dense_top_k,
                 "device": args.device,
                 "batch_size": args.batch_size,
+                "backend": backend,
+                "cascade": cascade,
                 "fusion_config_path": args.fusion_config,
+                "stage_report_path": str(Path(args.output_dir) / "lexical_dense_stages.json"),
             },
             "hybrid": True,
         },
@@ -418,14 +358,23 @@ def cmd_ablate(args: argparse.Namespace) -> None:
                     "manual": args.manual,
                     "qrels_path": args.qrels,
                     "top_k": args.top_k,
+                    "lexical_index_dir": args.lexical_index_dir,
+                    "lexical_backend": args.lexical_backend,
+                    "workers": args.workers,
+                    "stage_cache_path": stage_cache,
+                    "stage_cache_max_mb": args.stage_cache_max_mb,
                     "dense_model": args.dense_model,
                     "dense_index_dir": args.dense_index_dir,
                     "dense_top_k": args.dense_top_k,
                     "reranker_model": args.reranker_model,
                     "rerank_top_n": args.rerank_top_n,
+                    "rerank_cache": rerank_cache,
                     "device": args.device,
                     "batch_size": args.batch_size,
+                    "backend": backend,
+                    "cascade": cascade,
                     "fusion_config_path": args.fusion_config,
+                    "stage_report_path": str(Path(args.output_dir) / "lexical_dense_rerank_stages.json"),
                 },
                 "hybrid": True,
             }
@@ -442,35 +391,83 @@ def cmd_ablate(args: argparse.Namespace) -> None:
                     "manual": args.manual,
                     "qrels_path": args.qrels,
                     "top_k": args.top_k,
+                    "lexical_index_dir": args.lexical_index_dir,
+                    "lexical_backend": args.lexical_backend,
+                    "workers": args.workers,
+                    "stage_cache_path": stage_cache,
+                    "stage_cache_max_mb": args.stage_cache_max_mb,
                     "dense_model": args.dense_model,
                     "dense_index_dir": args.dense_index_dir,
                     "dense_top_k": args.dense_top_k,
                     "reranker_model": args.reranker_model,
                     "rerank_top_n": args.rerank_top_n,
+                    "rerank_cache": rerank_cache,
                     "humor_model_dir": args.humor_model_dir,
                     "device": args.device,
                     "batch_size": args.batch_size,
+                    "backend": backend,
+                    "cascade": cascade,
                     "fusion_config_path": args.fusion_config,
+                    "stage_report_path": str(Path(args.output_dir) / "full_hybrid_stages.json"),
                 },
                 "hybrid": True,
             }
         )
     Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+    # Runs are scored from their in-memory rankings; each is tested against the lexical baseline per query.
+    evaluator = Evaluator(to_qrel_map(load_json(args.qrels)), k=args.top_k)
+    baseline = None
     metrics: list[dict] = []
     for spec in run_specs:
+        rankings: dict[str, RankedList] = {}
         if spec["hybrid"]:
-            build_hybrid_predictions(**spec["kwargs"])
+            build_hybrid_predictions(**spec["kwargs"], rankings=rankings)
         else:
-            build_predictions(**spec["kwargs"])
-        score = evaluate_predictions_file(spec["kwargs"]["output_path"], args.qrels, args.top_k)
-        metrics.append({"name": spec["name"], "map_at_k": score, "output": spec["kwargs"]["output_path"]})
+            build_predictions(**spec["kwargs"], rankings=rankings)
+        result = evaluator.evaluate(rankings)
+        per_query_path = Path(args.output_dir) / f"{spec['name']}_per_query.json"
+        save_json(result.query_rows(), per_query_path)
+        score = result.mean("map")
+        row = {
+            "name": spec["name"],
+            "map_at_k": score,
+            "metrics": result.summary(),
+            "ci": result.confidence_intervals(),
+            "output": spec["kwargs"]["output_path"],
+            "per_query": str(per_query_path),
+        }
+        if baseline is not None:
+            row[f"vs_{run_specs[0]['name']}"] = paired_test(result, baseline)
+        baseline = baseline or result
+        if spec["hybrid"]:
+            row["stages"] = load_json(spec["kwargs"]["stage_report_path"])
+        metrics.append(row)
         print(f"{spec['name']}: MAP@{args.top_k}={score:.6f}")
+    if args.reranker_model:
+        print(format_rerank_cache_stats(rerank_cache.stats()))
+    rerank_cache.close()
     save_json(metrics, Path(args.output_dir) / "ablation_metrics.json")
 
 
 def cmd_eval(args: argparse.Namespace) -> None:
-    score = evaluate_predictions_file(args.predictions, args.qrels, args.k)
-    print(f"MAP@{args.k}: {score:.6f}")
+    evaluator = Evaluator(to_qrel_map(load_json(args.qrels)), k=args.k, cutoffs=args.cutoffs)
+    result = evaluator.evaluate(load_run(args.predictions))
+    ci = result.confidence_intervals(n_resamples=args.bootstrap)
+    print(f"MAP@{args.k}: {result.mean('map'):.6f}")
+    for metric in evaluator.metrics:
+        lo, hi = ci[metric]
+        print(f"  {metric}: {result.mean(metric):.6f} [{lo:.4f}, {hi:.4f}]")
+    report = {"queries": len(result.qids), "metrics": result.summary(), "ci": ci}
+    if args.baseline:
+        baseline = evaluator.evaluate(load_run(args.baseline))
+        report["vs_baseline"] = {
+            metric: paired_test(result, baseline, metric=metric, method=args.test) for metric in evaluator.metrics
+        }
+        for metric, test in report["vs_baseline"].items():
+            print(f"  vs baseline {metric}: {test['diff']:+.6f} (p={test['p_value']:.4f}, {args.test})")
+    if args.report:
+        report["per_query"] = result.query_rows()
+        save_json(report, args.report)
 
 
 def cmd_compare_models(args: argparse.Namespace) -> None:
@@ -486,21 +483,22 @@ def cmd_compare_models(args: argparse.Namespace) -> None:
     docs = load_json(args.docs)
     queries = load_json(args.queries)
     qrels = load_json(args.qrels)
-    rel_by_qid = to_qrel_map(qrels)
+    evaluator = Evaluator(to_qrel_map(qrels), k=args.top_k)
     doc_map = docs_by_id(docs)
 
     print("Preparing shared lexical and dense retrieval cache...")
-    lexical = HybridTask1Retriever()
-    lexical.fit(docs=docs, qrels=qrels)
+    lexical = load_lexical_retriever(args.docs, qrels=qrels, index_dir=args.lexical_index_dir, docs=docs)
 
     from .dense import DenseRetriever
     from .rerank import CrossEncoderReranker
 
+    backend = backend_from_args(args)
     dense = DenseRetriever(
         model_name=args.dense_model,
         index_dir=args.dense_index_dir,
         device=args.device,
         batch_size=args.batch_size,
+        backend=backend,
     )
     dense.ensure_ready(docs=docs)
 
@@ -508,37 +506,28 @@ def cmd_compare_models(args: argparse.Namespace) -> None:
     if args.humor_model_dir:
         from .humor_classifier import HumorPairScorer
 
-        humor_scorer = HumorPairScorer(model_dir=args.humor_model_dir, device=args.device)
+        humor_scorer = HumorPairScorer(model_dir=args.humor_model_dir, device=args.device, backend=backend)
 
     fusion_weights = load_fusion_config(args.fusion_config)
+    rerank_cache = PairScoreCache(args.rerank_cache)
     query_cache: dict[str, dict] = {}
-    for q in queries:
-        qid = str(q["qid"])
-        query_text = str(q["query"])
-        lexical_rows = lexical.rank(query_text, top_k=args.top_k)
-        dense_rows = dense.rank(query_text, top_k=min(args.top_k, args.dense_top_k))
-        fused_seed = rrf_fuse(lexical_rows, dense_rows)
-        ranked_seed = sorted(fused_seed.items(), key=lambda item: item[1], reverse=True)
-        candidate_ids = [docid for docid, _ in ranked_seed[: max(args.rerank_top_n, 100)]]
-
-        candidates = build_candidates(lexical_rows, dense_rows)
-        for docid in candidate_ids:
-            if docid not in candidates:
-                continue
-            doc_text = str(doc_map[docid]["text"])
-            candidates[docid].feature_scores = humor_features(query_text, doc_text)
-
-        rerank_ids = candidate_ids[: args.rerank_top_n]
-        rerank_docs = [(docid, str(doc_map[docid]["text"])) for docid in rerank_ids]
-        if humor_scorer and rerank_docs:
-            humor_scores = humor_scorer.score_pairs(query_text, [text for _, text in rerank_docs], batch_size=max(4, args.batch_size // 2))
-            humor_rows = [RetrievedDoc(docid=docid, score=float(score)) for (docid, _), score in zip(rerank_docs, humor_scores)]
-            humor_map = {row.docid: row.score for row in HybridTask1Retriever.normalize_scores(humor_rows)}
-            for docid, score in humor_map.items():
-                if docid in candidates:
-                    candidates[docid].humor_score = score
-
-        query_cache[qid] = {"query_text": query_text, "candidates": candidates, "rerank_docs": rerank_docs}
+    for start in range(0, len(queries), QUERY_BATCH_SIZE):
+        batch = queries[start : start + QUERY_BATCH_SIZE]
+        texts = [str(q["query"]) for q in batch]
+        lexical_batch = lexical.rank_many(texts, top_k=args.top_k, backend=args.lexical_backend)
+        dense_batch = dense.rank_many(texts, top_k=min(args.top_k, args.dense_top_k))
+        for q, query_text, lexical_rows, dense_rows in zip(batch, texts, lexical_batch, dense_batch):
+            candidates, rerank_docs = seed_candidates(query_text, lexical_rows, dense_rows, doc_map, args.rerank_top_n, lexical)
+            if humor_scorer and rerank_docs:
+                humor_scores = humor_scorer.score_pairs(
+                    query_text,
+                    [text for _, text in rerank_docs],
+                    batch_size=max(4, args.batch_size // 2),
+                    docids=[docid for docid, _ in rerank_docs],
+                )
+                humor_rows = RankedList.from_pairs([docid for docid, _ in rerank_docs], humor_scores)
+                candidates.set_scores("humor", humor_rows)
+            query_cache[str(q["qid"])] = {"query_text": query_text, "candidates": candidates, "rerank_docs": rerank_docs}
 
     metrics: list[dict] = []
     for idx, model_name in enumerate(model_names, start=1):
@@ -550,45 +539,139 @@ def cmd_compare_models(args: argparse.Namespace) -> None:
             model_name=model_name,
             device=args.device,
             batch_size=max(4, args.batch_size // 2),
+            score_cache=rerank_cache,
+            backend=backend,
         )
-
-        rankings: dict[str, list[RetrievedDoc]] = {}
-        for q in queries:
-            qid = str(q["qid"])
-            cached = query_cache[qid]
-            candidates = copy.deepcopy(cached["candidates"])
-            rerank_docs = cached["rerank_docs"]
-            if rerank_docs:
-                reranked = reranker.rerank(cached["query_text"], rerank_docs)
-                rerank_map = {row.docid: row.score for row in HybridTask1Retriever.normalize_scores(reranked)}
-                for docid, score in rerank_map.items():
-                    if docid in candidates:
-                        candidates[docid].rerank_score = score
-            rankings[qid] = weighted_fuse(candidates, fusion_weights, top_k=args.top_k)
-
-        rows = predictions_from_rankings(run_id, args.manual, queries, rankings)
-        save_json(rows, str(out_path))
-
-        pred_by_qid: dict[str, list[str]] = {}
-        for row in rows:
-            pred_by_qid.setdefault(str(row["qid"]), []).append(str(row["docid"]))
-        score = map_at_k(pred_by_qid, rel_by_qid, k=args.top_k)
+        stats_before = rerank_cache.stats()
+
+        pred_by_qid: dict[str, RankedList] = {}
+        with PredictionWriter(out_path) as writer:
+            for start in range(0, len(queries), QUERY_BATCH_SIZE):
+                cached_batch = [query_cache[str(q["qid"])] for q in queries[start : start + QUERY_BATCH_SIZE]]
+                reranked_batch = reranker.rerank_many(
+                    [cached["query_text"] for cached in cached_batch], [cached["rerank_docs"] for cached in cached_batch]
+                )
+                for q, cached, reranked in zip(queries[start : start + QUERY_BATCH_SIZE], cached_batch, reranked_batch):
+                    candidates = cached["candidates"].copy()
+                    candidates.set_scores("rerank", reranked)
+                    ranked = weighted_fuse(candidates, fusion_weights, top_k=args.top_k)
+                    writer.write(prediction_rows(run_id, args.manual, str(q["qid"]), ranked))
+                    pred_by_qid[str(q["qid"])] = ranked
+
+        result = evaluator.evaluate(pred_by_qid)
+        score = result.mean("map")
+        stats = {key: value - stats_before[key] for key, value in rerank_cache.stats().items() if key != "hit_ratio"}
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
         metrics.append(
             {
                 "model": model_name,
                 "map_at_k": score,
+                "metrics": result.summary(),
                 "predictions_file": str(out_path),
-                "rows_written": len(rows),
+                "rows_written": writer.count,
+                "rerank_cache": stats,
             }
         )
         print(f"{model_name}: MAP@{args.top_k}={score:.6f}")
+        print(format_rerank_cache_stats(stats))
 
+    rerank_cache.close()
     metrics.sort(key=lambda row: row["map_at_k"], reverse=True)
     Path(args.comparison_file).parent.mkdir(parents=True, exist_ok=True)
     save_json(metrics, args.comparison_file)
     print(f"Comparison file written to {args.comparison_file}")
 
 
+def cmd_bench(args: argparse.Namespace) -> None:
+    from .bench import BenchConfig, compare_suites, format_suite, run_suite
+
+    config = BenchConfig(
+        n_queries=args.queries,
+        top_k=args.top_k,
+        dense_top_k=args.dense_top_k,
+        rerank_top_n=args.rerank_top_n,
+        stages=tuple(args.stages),
+        warmup=args.warmup,
+        seed=args.seed,
+        dim=args.dim,
+        dense_model=args.dense_model,
+        reranker_model=args.reranker_model,
+    )
+    suite = run_suite(args.docs, config, progress=lambda message, _: print(message))
+    print(format_suite(suite))
+    regressions = []
+    if args.baseline:
+        suite["vs_baseline"] = compare_suites(suite, load_json(args.baseline))
+        for row in suite["vs_baseline"]:
+            if row["field"] in ("p50_ms", "p95_ms", "qps", "peak_rss_mb"):
+                print(f"  {row['n_docs']} docs {row['stage']} {row['field']}: {row['baseline']} -> {row['current']} ({row['change']:+.1%})")
+        if args.max_regression is not None:
+            regressions = [row for row in suite["vs_baseline"] if row["regression"] > args.max_regression]
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    save_json(suite, args.output)
+    print(f"Benchmark results written to {args.output}")
+    if regressions:
+        worst = max(regressions, key=lambda row: row["regression"])
+        raise SystemExit(
+            f"{len(regressions)} measurements regressed by more than {args.max_regression:.0%} "
+            f"(worst: {worst['stage']} {worst['field']} {worst['change']:+.1%} at {worst['n_docs']} docs)"
+        )
+
+
+def backend_from_args(args: argparse.Namespace) -> InferenceBackend:
+    return InferenceBackend(
+        kind=args.backend,
+        cache_dir=args.onnx_cache_dir,
+        threads=args.threads,
+        min_spearman=args.onnx_min_spearman,
+        max_abs_diff=args.onnx_max_abs_diff,
+    )
+
+
+def add_backend_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--backend",
+        choices=INFERENCE_BACKENDS,
+        default="torch",
+        help="Run the dense, reranker and humor models in PyTorch or as (int8-quantized) ONNX on CPU",
+    )
+    p.add_argument("--onnx-cache-dir", default="artifacts/onnx", help="Where ONNX exports are written and reused")
+    p.add_argument("--threads", type=int, default=0, help="onnxruntime intra-op threads (0: one per physical core)")
+    p.add_argument(
+        "--onnx-min-spearman",
+        type=float,
+        default=0.95,
+        help="Refuse an ONNX export whose probe scores rank-correlate with PyTorch below this",
+    )
+    p.add_argument("--onnx-max-abs-diff", type=float, help="Also refuse it when any probe score differs from PyTorch by more than this")
+
+
+def cascade_from_args(args: argparse.Namespace) -> CascadeConfig:
+    return CascadeConfig(
+        fast_top_n=args.cascade_fast_top_n,
+        fast_margin=args.cascade_fast_margin,
+        model=args.cascade_model,
+        model_top_n=args.cascade_model_top_n,
+        model_margin=args.cascade_model_margin,
+        min_keep=args.cascade_min_keep,
+    )
+
+
+def add_cascade_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--cascade-fast-top-n",
+        type=int,
+        default=0,
+        help="Prune the rerank pool to this many candidates with the lexical/dense/feature fusion score first (0: off)",
+    )
+    p.add_argument("--cascade-fast-margin", type=float, default=1.0, help="Also drop candidates this far (0-1) below the best fast score")
+    p.add_argument("--cascade-model", help="Small cross-encoder pruning the pool before --reranker-model")
+    p.add_argument("--cascade-model-top-n", type=int, default=0, help="Candidates kept by --cascade-model (0: off)")
+    p.add_argument("--cascade-model-margin", type=float, default=1.0, help="Also drop candidates this far (0-1) below its best score")
+    p.add_argument("--cascade-min-keep", type=int, default=20, help="Margins never prune a pool below this size")
+
+
 def parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(description="JOKER CLEF 2025 Task 1 pipeline")
     sub = p.add_subparsers(dest="cmd", required=True)
@@ -603,16 +686,65 @@ def parser() -> argparse.ArgumentParser:
     pp.add_argument("--run-id", required=True)
     pp.add_argument("--manual", type=int, choices=[0, 1], default=0)
     pp.add_argument("--top-k", type=int, default=1000)
+    pp.add_argument("--lexical-index-dir", help="Load the lexical index from this directory (built and saved there if missing)")
+    pp.add_argument(
+        "--lexical-backend",
+        choices=["postings", "sparse"],
+        default="postings",
+        help="Score queries one at a time over postings or in batches as sparse matrix products",
+    )
+    pp.add_argument("--workers", type=int, default=1, help="Processes sharing the lexical index for query ranking")
+    pp.add_argument("--stage-cache", help="SQLite file caching per-query stage outputs across runs")
+    pp.add_argument("--stage-cache-max-mb", type=int, default=1024, help="Evict least recently used cache entries above this size")
     pp.set_defaults(func=cmd_predict)
 
+    pl = sub.add_parser("build-lexical-index", help="Fit and store the lexical index for reuse across runs")
+    pl.add_argument("--docs", required=True)
+    pl.add_argument("--qrels", help="Optional train qrels to estimate humor prior")
+    pl.add_argument("--index-dir", default="artifacts/lexical_index")
+    pl.set_defaults(func=cmd_build_lexical_index)
+
     pd = sub.add_parser("build-dense-index", help="Build and store dense embeddings/index")
     pd.add_argument("--docs", required=True)
     pd.add_argument("--model-name", default="BAAI/bge-small-en-v1.5")
     pd.add_argument("--index-dir", default="artifacts/dense_index")
     pd.add_argument("--device", default=None)
     pd.add_argument("--batch-size", type=int, default=32)
+    pd.add_argument("--rebuild", action="store_true", help="Re-encode every document instead of updating an existing index")
+    pd.add_argument(
+        "--max-batch-tokens",
+        type=int,
+        default=None,
+        help="Padded tokens per encoding batch (texts are batched by length); default batch-size x model max length",
+    )
+    pd.add_argument(
+        "--storage",
+        choices=["float32", "float16", "int8"],
+        default=None,
+        help="Embedding storage type (int8 uses per-dimension scales); default keeps the existing index's",
+    )
+    pd.add_argument("--index-type", choices=["flat", "ivf", "hnsw", "ivfpq"], default="flat")
+    pd.add_argument("--nlist", type=int, default=1024, help="Inverted lists for ivf/ivfpq")
+    pd.add_argument("--nprobe", type=int, default=16, help="Lists visited per query for ivf/ivfpq")
+    pd.add_argument("--hnsw-m", type=int, default=32, help="Graph links per node for hnsw")
+    pd.add_argument("--ef-construction", type=int, default=200)
+    pd.add_argument("--ef-search", type=int, default=128, help="Candidate list size per query for hnsw")
+    pd.add_argument("--pq-m", type=int, default=16, help="Sub-quantizers for ivfpq (must divide the embedding dim)")
+    pd.add_argument("--pq-bits", type=int, default=8)
+    pd.add_argument("--train-size", type=int, default=100_000, help="Embeddings sampled to train ivf/ivfpq")
+    pd.add_argument("--recall-k", type=int, default=100, help="Report recall@k against exact search (0 to skip)")
+    pd.add_argument("--recall-sample", type=int, default=1000, help="Documents used as queries for the recall report")
+    pd.add_argument("--recall-queries", default=None, help="Queries JSON to use for the recall report instead")
+    add_backend_args(pd)
     pd.set_defaults(func=cmd_build_dense_index)
 
+    po = sub.add_parser("export-onnx", help="Export the dense, reranker and humor models to ONNX and report parity")
+    po.add_argument("--dense-model", default="BAAI/bge-small-en-v1.5")
+    po.add_argument("--reranker-model")
+    po.add_argument("--humor-model-dir")
+    add_backend_args(po)
+    po.set_defaults(func=cmd_export_onnx, backend="onnx-int8")
+
     ph = sub.add_parser("predict-hybrid", help="Run lexical+dense+rerank+humor hybrid prediction pipeline")
     ph.add_argument("--docs", required=True)
     ph.add_argument("--queries", required=True)
@@ -622,6 +754,9 @@ def parser() -> argparse.ArgumentParser:
     ph.add_argument("--run-id", required=True)
     ph.add_argument("--manual", type=int, choices=[0, 1], default=0)
     ph.add_argument("--top-k", type=int, default=1000)
+    ph.add_argument("--lexical-index-dir")
+    ph.add_argument("--lexical-backend", choices=["postings", "sparse"], default="postings")
+    ph.add_argument("--workers", type=int, default=1)
     ph.add_argument("--dense-model", default="BAAI/bge-small-en-v1.5")
     ph.add_argument("--dense-index-dir", default="artifacts/dense_index")
     ph.add_argument("--dense-top-k", type=int, default=700)
@@ -631,8 +766,66 @@ def parser() -> argparse.ArgumentParser:
     ph.add_argument("--device", default=None)
     ph.add_argument("--batch-size", type=int, default=32)
     ph.add_argument("--fusion-config")
+    ph.add_argument("--stage-cache", help="SQLite file caching per-query stage outputs across runs")
+    ph.add_argument("--stage-cache-max-mb", type=int, default=1024)
+    ph.add_argument("--rerank-cache", help="SQLite file persisting cross-encoder pair scores across runs")
+    ph.add_argument("--stage-report", help="Write per-stage latency, pool sizes and recall (with --qrels) to this JSON file")
+    add_cascade_args(ph)
+    add_backend_args(ph)
     ph.set_defaults(func=cmd_predict_hybrid)
 
+    ptn = sub.add_parser("tune", help="Random/TPE/successive-halving search over lexical params or fusion weights")
+    ptn.add_argument("--docs", required=True)
+    ptn.add_argument("--queries", required=True)
+    ptn.add_argument("--qrels", required=True)
+    ptn.add_argument("--space", choices=["lexical", "fusion"], default="lexical")
+    ptn.add_argument("--strategy", choices=["random", "tpe", "halving"], default="tpe")
+    ptn.add_argument("--trials", type=int, default=50)
+    ptn.add_argument("--workers", type=int, default=1, help="Processes evaluating trials in parallel")
+    ptn.add_argument("--eta", type=int, default=3, help="Query-subset growth factor and halving rate for early stopping")
+    ptn.add_argument("--min-queries", type=int, default=5, help="Validation queries in the smallest early-stopping subset")
+    ptn.add_argument("--seed", type=int, default=13)
+    ptn.add_argument("--top-k", type=int, default=1000)
+    ptn.add_argument("--trial-log", help="JSONL trial log; an interrupted search resumes from it")
+    ptn.add_argument("--output", default="artifacts/tuning/best_params.json")
+    ptn.add_argument("--lexical-params", help="Lexical params JSON used for the fusion search pipeline")
+    ptn.add_argument("--dense-model", default="BAAI/bge-small-en-v1.5")
+    ptn.add_argument("--dense-index-dir", default="artifacts/dense_index")
+    ptn.add_argument("--dense-top-k", type=int, default=700)
+    ptn.add_argument("--reranker-model")
+    ptn.add_argument("--rerank-top-n", type=int, default=200)
+    ptn.add_argument("--humor-model-dir")
+    ptn.add_argument("--device", default=None)
+    ptn.add_argument("--batch-size", type=int, default=32)
+    ptn.add_argument("--fusion-config", help="Base fusion config; searched weights are written over it")
+    add_cascade_args(ptn)
+    add_backend_args(ptn)
+    ptn.set_defaults(func=cmd_tune)
+
+    ptf = sub.add_parser("tune-fusion", help="Optimize fusion weights over cached hybrid candidate scores")
+    ptf.add_argument("--docs", required=True)
+    ptf.add_argument("--queries", required=True)
+    ptf.add_argument("--qrels", required=True)
+    ptf.add_argument("--output", default="artifacts/tuning/fusion_config.json")
+    ptf.add_argument("--score-cache", default="artifacts/tuning/fusion_scores.npz", help="Candidate score tensor reused across runs")
+    ptf.add_argument("--samples", type=int, default=2048, help="Weight vectors evaluated per round")
+    ptf.add_argument("--rounds", type=int, default=8)
+    ptf.add_argument("--seed", type=int, default=13)
+    ptf.add_argument("--top-k", type=int, default=1000)
+    ptf.add_argument("--lexical-params", help="Lexical params JSON used for the pipeline run")
+    ptf.add_argument("--dense-model", default="BAAI/bge-small-en-v1.5")
+    ptf.add_argument("--dense-index-dir", default="artifacts/dense_index")
+    ptf.add_argument("--dense-top-k", type=int, default=700)
+    ptf.add_argument("--reranker-model")
+    ptf.add_argument("--rerank-top-n", type=int, default=200)
+    ptf.add_argument("--humor-model-dir")
+    ptf.add_argument("--device", default=None)
+    ptf.add_argument("--batch-size", type=int, default=32)
+    ptf.add_argument("--fusion-config", help="Base fusion config; tuned weights are written over it")
+    add_cascade_args(ptf)
+    add_backend_args(ptf)
+    ptf.set_defaults(func=cmd_tune_fusion)
+
     pt = sub.add_parser("train-humor", help="Train a query-conditioned humor pair classifier")
     pt.add_argument("--docs", required=True)
     pt.add_argument("--queries", required=True)
@@ -655,6 +848,9 @@ def parser() -> argparse.ArgumentParser:
     pa.add_argument("--run-id", required=True)
     pa.add_argument("--manual", type=int, choices=[0, 1], default=0)
     pa.add_argument("--top-k", type=int, default=1000)
+    pa.add_argument("--lexical-index-dir")
+    pa.add_argument("--lexical-backend", choices=["postings", "sparse"], default="postings")
+    pa.add_argument("--workers", type=int, default=1)
     pa.add_argument("--dense-model", default="BAAI/bge-small-en-v1.5")
     pa.add_argument("--dense-index-dir", default="artifacts/dense_index")
     pa.add_argument("--dense-top-k", type=int, default=700)
@@ -664,12 +860,22 @@ def parser() -> argparse.ArgumentParser:
     pa.add_argument("--device", default=None)
     pa.add_argument("--batch-size", type=int, default=32)
     pa.add_argument("--fusion-config")
+    pa.add_argument("--stage-cache", help="Stage cache shared by the ablation runs (default: <output-dir>/stage_cache.sqlite)")
+    pa.add_argument("--stage-cache-max-mb", type=int, default=1024)
+    pa.add_argument("--rerank-cache", help="SQLite file persisting cross-encoder pair scores across runs")
+    add_cascade_args(pa)
+    add_backend_args(pa)
     pa.set_defaults(func=cmd_ablate)
 
-    pe = sub.add_parser("eval", help="Evaluate predictions against qrels (MAP@K)")
+    pe = sub.add_parser("eval", help="Evaluate predictions against qrels (MAP, MRR, nDCG, P and Recall)")
     pe.add_argument("--predictions", required=True)
     pe.add_argument("--qrels", required=True)
     pe.add_argument("-k", type=int, default=1000)
+    pe.add_argument("--cutoffs", type=int, nargs="+", default=list(DEFAULT_CUTOFFS), help="Cut-offs for nDCG, P and Recall")
+    pe.add_argument("--bootstrap", type=int, default=1000, help="Bootstrap resamples for the confidence intervals")
+    pe.add_argument("--baseline", help="Predictions of a baseline run to test against, query by query")
+    pe.add_argument("--test", choices=PAIRED_TESTS, default="randomization", help="Paired significance test")
+    pe.add_argument("--report", help="Write metrics, intervals, per-query values and tests to this JSON file")
     pe.set_defaults(func=cmd_eval)
 
     pcm = sub.add_parser("compare-models", help="Compare multiple reranker models and write a summary JSON")
@@ -681,6 +887,8 @@ def parser() -> argparse.ArgumentParser:
     pcm.add_argument("--run-id", required=True)
     pcm.add_argument("--manual", type=int, choices=[0, 1], default=0)
     pcm.add_argument("--top-k", type=int, default=1000)
+    pcm.add_argument("--lexical-index-dir")
+    pcm.add_argument("--lexical-backend", choices=["postings", "sparse"], default="postings")
     pcm.add_argument("--dense-model", default="BAAI/bge-small-en-v1.5")
     pcm.add_argument("--dense-index-dir", default="artifacts/dense_index")
     pcm.add_argument("--dense-top-k", type=int, default=700)
@@ -690,8 +898,31 @@ def parser() -> argparse.ArgumentParser:
     pcm.add_argument("--device", default="cuda")
     pcm.add_argument("--batch-size", type=int, default=32)
     pcm.add_argument("--fusion-config")
+    pcm.add_argument("--rerank-cache", help="SQLite file persisting cross-encoder pair scores across runs")
+    add_backend_args(pcm)
     pcm.set_defaults(func=cmd_compare_models)
 
+    pb = sub.add_parser("bench", help="Benchmark fit time, query latency, throughput and peak memory on synthetic corpora")
+    pb.add_argument("--docs", type=int, nargs="+", default=[10_000], help="Synthetic corpus sizes, one run each")
+    pb.add_argument("--queries", type=int, default=200)
+    pb.add_argument("--top-k", type=int, default=1000)
+    pb.add_argument("--dense-top-k", type=int, default=700)
+    pb.add_argument("--rerank-top-n", type=int, default=50)
+    pb.add_argument("--stages", nargs="+", choices=BENCH_STAGES, default=list(BENCH_STAGES), help="Query stages to time")
+    pb.add_argument("--warmup", type=int, default=5, help="Untimed queries run before each stage")
+    pb.add_argument("--seed", type=int, default=13, help="Seed of the synthetic corpus and queries")
+    pb.add_argument("--dim", type=int, default=64, help="Embedding size of the stand-in dense encoder")
+    pb.add_argument("--dense-model", default=STAND_IN_ENCODER, help="Dense model to time (default: offline stand-in)")
+    pb.add_argument("--reranker-model", default=STAND_IN_RERANKER, help="Reranker to time (default: offline stand-in)")
+    pb.add_argument("--output", default="artifacts/bench/bench.json")
+    pb.add_argument("--baseline", help="Results of an earlier bench run (e.g. another commit) to compare against")
+    pb.add_argument(
+        "--max-regression",
+        type=float,
+        help="Exit with an error if any timing, throughput or memory figure is worse than --baseline by more than this fraction",
+    )
+    pb.set_defaults(func=cmd_bench)
+
     return p
 
 
@@ -1,15 +1,137 @@
 from __future__ import annotations
 
 import json
+import os
+import re
 from pathlib import Path
-from typing import Iterable, Sequence
+from typing import IO, Iterable, Iterator, Sequence
+
+JSONL_SUFFIXES = (".jsonl", ".ndjson")
+READ_CHUNK_CHARS = 1 << 20
+_SEPARATORS = re.compile(r"[ \t\r\n,]*")
+
+
+def is_jsonl(path: str | Path) -> bool:
+    return Path(path).suffix.lower() in JSONL_SUFFIXES
 
 
 def load_json(path: str | Path):
+    """Whole JSON document at ``path``; a JSONL file is read as the list of its rows."""
+    if is_jsonl(path):
+        return list(iter_json_rows(path))
     with Path(path).open("r", encoding="utf-8") as f:
         return json.load(f)
 
 
+def iter_json_rows(path: str | Path, chunk_chars: int = READ_CHUNK_CHARS) -> Iterator[dict]:
+    """Rows of a JSON array file (parsed incrementally) or a JSONL file, one at a time.
+
+    Only the current read chunk and row are held in memory, so corpora can be
+    fed to ``fit``, ``DenseRetriever.build`` or ``docs_by_id`` without first
+    materializing the parsed list.
+    """
+    with Path(path).open("r", encoding="utf-8") as f:
+        if is_jsonl(path):
+            yield from _iter_lines(f)
+            return
+        buf = f.read(chunk_chars)
+        pos = len(buf) - len(buf.lstrip())
+        if pos < len(buf) and buf[pos] != "[":
+            # Not an array: treat it as JSON lines.
+            f.seek(0)
+            yield from _iter_lines(f)
+            return
+        yield from _iter_array(f, buf, pos + 1, chunk_chars)
+
+
+def _iter_lines(f: IO[str]) -> Iterator[dict]:
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def _iter_array(f: IO[str], buf: str, pos: int, chunk_chars: int) -> Iterator[dict]:
+    decoder = json.JSONDecoder()
+    eof = False
+    while True:
+        while True:
+            pos = _SEPARATORS.match(buf, pos).end()
+            if pos < len(buf) or eof:
+                break
+            more = f.read(chunk_chars)
+            eof = not more
+            buf, pos = buf[pos:] + more, 0
+        if pos >= len(buf):
+            raise ValueError(f"Unterminated JSON array in {f.name}")
+        if buf[pos] == "]":
+            return
+        try:
+            row, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            row, end = None, -1
+            if eof:
+                raise
+        if end < 0 or (end == len(buf) and not eof):
+            # The element runs past the buffered text (or may, for a bare number): read on.
+            more = f.read(chunk_chars)
+            eof = not more
+            buf, pos = buf[pos:] + more, 0
+            continue
+        yield row
+        pos = end
+
+
+class PredictionWriter:
+    """Writes prediction rows to ``path`` as they are produced.
+
+    The output is a JSON array with one row per line (JSONL for ``.jsonl``
+    paths). Rows go to a temporary file that replaces ``path`` when the
+    writer is closed without an error, so readers never see a partial run.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.jsonl = is_jsonl(self.path)
+        self.count = 0
+        self._tmp = self.path.with_name(f"{self.path.name}.tmp")
+        self._file = self._tmp.open("w", encoding="utf-8")
+        if not self.jsonl:
+            self._file.write("[")
+
+    def write(self, rows: Iterable[dict]) -> None:
+        for row in rows:
+            if self.jsonl:
+                self._file.write(json.dumps(row, ensure_ascii=False))
+                self._file.write("\n")
+            else:
+                self._file.write(",\n" if self.count else "\n")
+                self._file.write(json.dumps(row, ensure_ascii=False))
+            self.count += 1
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        if not self.jsonl:
+            self._file.write("\n]\n" if self.count else "]\n")
+        self._file.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self) -> None:
+        self._file.close()
+        self._tmp.unlink(missing_ok=True)
+
+    def __enter__(self) -> PredictionWriter:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
 def save_json(rows: Sequence[dict], path: str | Path) -> None:
     output = Path(path)
     output.parent.mkdir(parents=True, exist_ok=True)
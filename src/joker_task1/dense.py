@@ -1,13 +1,16 @@
 from __future__ import annotations
 
+import hashlib
 import json
-from dataclasses import dataclass
+import time
+from dataclasses import asdict, dataclass, fields
 from pathlib import Path
 from typing import Callable, Iterable
 
 import numpy as np
 
-from .retriever import RetrievedDoc
+from .onnx_backend import InferenceBackend
+from .retriever import RankedList, StringTable, save_array
 
 ProgressFn = Callable[[str, float], None]
 
@@ -19,6 +22,8 @@ class DenseIndexArtifacts:
     docids_path: Path
     meta_path: Path
     faiss_path: Path
+    hashes_path: Path
+    scales_path: Path
 
     @classmethod
     def for_dir(cls, index_dir: str | Path) -> "DenseIndexArtifacts":
@@ -29,25 +34,164 @@ class DenseIndexArtifacts:
             docids_path=root / "docids.json",
             meta_path=root / "meta.json",
             faiss_path=root / "faiss.index",
+            hashes_path=root / "doc_hashes.npy",
+            scales_path=root / "scales.npy",
         )
 
 
+def content_hashes(texts: list[str]) -> np.ndarray:
+    """16-byte BLAKE2b digest of every text as a [N, 16] uint8 array."""
+    out = np.zeros((len(texts), 16), dtype=np.uint8)
+    for i, text in enumerate(texts):
+        out[i] = np.frombuffer(hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest(), dtype=np.uint8)
+    return out
+
+
+DOCID_TABLE = "docids"
+EMBEDDING_STORAGE = ("float32", "float16", "int8")
+ANN_INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+SEARCH_PARAMS = ("ef_search", "nprobe")
+
+
+@dataclass(frozen=True)
+class AnnIndexConfig:
+    """Layout of the FAISS index over the dense embeddings.
+
+    ``flat`` is exact inner-product search. ``ivf`` and ``ivfpq`` cluster the
+    embeddings into ``nlist`` inverted lists (trained on ``train_size``
+    sampled rows) and visit ``nprobe`` of them per query; ``ivfpq`` also
+    compresses vectors into ``pq_m`` codes of ``pq_bits``. ``hnsw`` is a graph
+    with ``hnsw_m`` links per node, searched with ``ef_search`` candidates.
+    ``ef_search`` and ``nprobe`` are search-time settings and can be changed
+    without rebuilding.
+    """
+
+    index_type: str = "flat"
+    nlist: int = 1024
+    nprobe: int = 16
+    hnsw_m: int = 32
+    ef_construction: int = 200
+    ef_search: int = 128
+    pq_m: int = 16
+    pq_bits: int = 8
+    train_size: int = 100_000
+
+    def __post_init__(self) -> None:
+        if self.index_type not in ANN_INDEX_TYPES:
+            raise ValueError(f"Unknown dense index type {self.index_type!r}; expected one of {', '.join(ANN_INDEX_TYPES)}")
+
+    @classmethod
+    def from_meta(cls, meta: dict) -> "AnnIndexConfig":
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in dict(meta.get("index") or {}).items() if k in names})
+
+    def build_key(self) -> dict:
+        """Settings that require rebuilding the FAISS index when changed."""
+        return {k: v for k, v in asdict(self).items() if k not in SEARCH_PARAMS}
+
+
+def quantize_embeddings(embeddings: np.ndarray, storage: str, scales: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray | None]:
+    """Convert float32 rows to ``storage``; int8 uses symmetric per-dimension ``scales`` (fitted when not given)."""
+    if storage not in EMBEDDING_STORAGE:
+        raise ValueError(f"Unknown embedding storage {storage!r}; expected one of {', '.join(EMBEDDING_STORAGE)}")
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if storage != "int8":
+        return embeddings.astype(storage), None
+    if scales is None:
+        peak = np.abs(embeddings).max(axis=0) if len(embeddings) else np.ones(embeddings.shape[1], dtype=np.float32)
+        scales = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+    return np.clip(np.rint(embeddings / scales), -127, 127).astype(np.int8), scales
+
+
+def dequantize_embeddings(rows: np.ndarray, scales: np.ndarray | None = None) -> np.ndarray:
+    rows = np.asarray(rows, dtype=np.float32)
+    return rows * scales if scales is not None else rows
+
+
+def build_faiss_index(embeddings: np.ndarray, config: AnnIndexConfig, seed: int = 13, scales: np.ndarray | None = None):
+    """Create, train (on a row sample) and fill a FAISS inner-product index.
+
+    ``embeddings`` may be a stored (float16/int8) matrix; rows are converted
+    to float32 chunk by chunk.
+    """
+    import faiss
+
+    n, dim = embeddings.shape
+    metric = faiss.METRIC_INNER_PRODUCT
+    if config.index_type == "flat":
+        index = faiss.IndexFlatIP(dim)
+    elif config.index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, config.hnsw_m, metric)
+        index.hnsw.efConstruction = config.ef_construction
+    else:
+        # FAISS wants ~39 training points per list; shrink nlist on small corpora.
+        nlist = max(1, min(config.nlist, n // 39))
+        quantizer = faiss.IndexFlatIP(dim)
+        if config.index_type == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+        else:
+            if dim % config.pq_m:
+                raise ValueError(f"pq_m={config.pq_m} must divide the embedding dimension {dim}")
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, config.pq_m, config.pq_bits, metric)
+        sample = np.arange(n)
+        if n > config.train_size:
+            sample = np.sort(np.random.default_rng(seed).choice(n, size=config.train_size, replace=False))
+        index.train(np.ascontiguousarray(dequantize_embeddings(embeddings[sample], scales)))
+    for start in range(0, n, 65536):
+        index.add(np.ascontiguousarray(dequantize_embeddings(embeddings[start : start + 65536], scales)))
+    return index
+
+
+def set_search_params(index, config: AnnIndexConfig) -> None:
+    if hasattr(index, "nprobe"):
+        index.nprobe = config.nprobe
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = config.ef_search
+
+
 class DenseEncoder:
-    def __init__(self, model_name: str, device: str | None = None, batch_size: int = 32, normalize: bool = True):
+    """Sentence-transformer encoder with length-bucketed batching.
+
+    Texts are ordered by token count and cut into batches whose padded size
+    (rows x longest text) stays within ``max_batch_tokens``, so short texts
+    share large batches instead of being padded to a long neighbour. The
+    default budget is ``batch_size`` rows of the model's maximum sequence
+    length, i.e. the worst case of a fixed-size batch.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        device: str | None = None,
+        batch_size: int = 32,
+        normalize: bool = True,
+        max_batch_tokens: int | None = None,
+        backend: InferenceBackend | None = None,
+    ):
         self.model_name = model_name
         self.device = device
         self.batch_size = batch_size
         self.normalize = normalize
+        self.max_batch_tokens = max_batch_tokens
+        self.backend = backend or InferenceBackend()
         self._model = None
 
+    def _load_torch_model(self):
+        from sentence_transformers import SentenceTransformer
+
+        kwargs = {}
+        if self.device:
+            kwargs["device"] = self.device
+        return SentenceTransformer(self.model_name, **kwargs)
+
     def _load_model(self):
         if self._model is None:
-            from sentence_transformers import SentenceTransformer
+            if self.backend.is_onnx:
+                from .onnx_backend import load_sentence_encoder
 
-            kwargs = {}
-            if self.device:
-                kwargs["device"] = self.device
-            self._model = SentenceTransformer(self.model_name, **kwargs)
+                self._model = load_sentence_encoder(self.model_name, self.backend, self._load_torch_model)
+            else:
+                self._model = self._load_torch_model()
         return self._model
 
     def _prepare_text(self, text: str, *, is_query: bool) -> str:
@@ -62,106 +206,391 @@ class DenseEncoder:
             return "Represent this sentence for searching relevant passages: " + stripped
         return stripped
 
+    def _token_lengths(self, model, rows: list[str]) -> np.ndarray:
+        """Token count per text (capped at the model's max length); a chars/4 estimate without a tokenizer."""
+        max_len = int(getattr(model, "max_seq_length", None) or 512)
+        tokenizer = getattr(model, "tokenizer", None)
+        if tokenizer is not None:
+            lengths = []
+            for start in range(0, len(rows), 4096):
+                encoded = tokenizer(rows[start : start + 4096], add_special_tokens=True, truncation=True, max_length=max_len)
+                lengths.extend(len(ids) for ids in encoded["input_ids"])
+            return np.asarray(lengths, dtype=np.int64)
+        return np.minimum(np.asarray([len(row) // 4 + 2 for row in rows], dtype=np.int64), max_len)
+
+    def length_batches(self, model, rows: list[str]) -> list[np.ndarray]:
+        """Row indices grouped longest-first into batches within the token budget."""
+        lengths = self._token_lengths(model, rows)
+        max_len = int(getattr(model, "max_seq_length", None) or 512)
+        budget = self.max_batch_tokens or max(1, self.batch_size) * max_len
+        order = np.argsort(-lengths, kind="stable")
+        batches: list[np.ndarray] = []
+        start = 0
+        while start < len(order):
+            # Sorted longest-first, so the first row of a batch sets its padded length.
+            rows_fit = max(1, budget // max(1, int(lengths[order[start]])))
+            batches.append(order[start : start + rows_fit])
+            start += rows_fit
+        return batches
+
     def encode_texts(self, texts: Iterable[str], progress: ProgressFn | None = None, progress_span: tuple[float, float] = (0.0, 1.0), *, is_query: bool = False) -> np.ndarray:
         rows = [self._prepare_text(text, is_query=is_query) for text in texts]
         if not rows:
             return np.zeros((0, 0), dtype=np.float32)
         model = self._load_model()
         start_pct, end_pct = progress_span
-        chunks: list[np.ndarray] = []
+        out: np.ndarray | None = None
         total = len(rows)
-        for start in range(0, total, self.batch_size):
-            batch = rows[start : start + self.batch_size]
+        done = 0
+        for batch_ids in self.length_batches(model, rows):
             emb = model.encode(
-                batch,
-                batch_size=self.batch_size,
+                [rows[i] for i in batch_ids.tolist()],
+                batch_size=len(batch_ids),
                 convert_to_numpy=True,
                 normalize_embeddings=self.normalize,
                 show_progress_bar=False,
             )
-            chunks.append(np.asarray(emb, dtype=np.float32))
+            emb = np.asarray(emb, dtype=np.float32)
+            if out is None:
+                out = np.empty((total, emb.shape[1]), dtype=np.float32)
+            out[batch_ids] = emb
+            done += len(batch_ids)
             if progress:
-                done = min(total, start + len(batch))
                 frac = done / total
                 progress(
                     f"Dense encoding: {done}/{total}",
                     start_pct + (end_pct - start_pct) * frac,
                 )
-        return np.vstack(chunks)
+        return out
 
 
 class DenseIndex:
-    def __init__(self, artifacts: DenseIndexArtifacts):
+    """Embedding matrix, docids and FAISS index of one index directory.
+
+    Embeddings are stored as ``storage`` (float32, float16, or int8 with
+    per-dimension scales in ``scales.npy``) and loaded as read-only memmaps,
+    so processes searching the same index share the page cache.
+    """
+
+    def __init__(self, artifacts: DenseIndexArtifacts, config: AnnIndexConfig | None = None, storage: str = "float32"):
         self.artifacts = artifacts
+        self.config = config or AnnIndexConfig()
+        self.storage = storage
 
-    def save(self, embeddings: np.ndarray, docids: list[str], meta: dict, progress: ProgressFn | None = None) -> None:
+    def save(
+        self,
+        embeddings: np.ndarray,
+        docids: list[str],
+        meta: dict,
+        progress: ProgressFn | None = None,
+        doc_hashes: np.ndarray | None = None,
+        scales: np.ndarray | None = None,
+    ) -> None:
+        """Store float32 ``embeddings``; int8 storage reuses ``scales`` when given."""
         self.artifacts.index_dir.mkdir(parents=True, exist_ok=True)
-        np.save(self.artifacts.embeddings_path, embeddings.astype(np.float32))
-        self.artifacts.docids_path.write_text(json.dumps(docids, ensure_ascii=False, indent=2), encoding="utf-8")
-        self.artifacts.meta_path.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+        stored, scales = quantize_embeddings(embeddings, self.storage, scales)
+        save_array(self.artifacts.embeddings_path, stored)
+        if scales is not None:
+            save_array(self.artifacts.scales_path, scales)
+        else:
+            self.artifacts.scales_path.unlink(missing_ok=True)
+        self._write_metadata(docids, meta, doc_hashes)
         if progress:
             progress("Dense index artifacts saved.", 0.92)
+        self._write_faiss(stored, progress=progress, scales=scales)
+
+    def _write_metadata(self, docids: list[str] | StringTable, meta: dict, doc_hashes: np.ndarray | None) -> None:
+        if not isinstance(docids, StringTable) or docids.hash_slots is None:
+            docids = StringTable.from_strings(docids, hashed=True)
+        docids.save(self.artifacts.index_dir, DOCID_TABLE)
+        # Indexes written before the packed table kept docids in a JSON list.
+        self.artifacts.docids_path.unlink(missing_ok=True)
+        self.artifacts.meta_path.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+        if doc_hashes is not None:
+            save_array(self.artifacts.hashes_path, doc_hashes)
+
+    def _write_faiss(
+        self,
+        embeddings: np.ndarray,
+        progress: ProgressFn | None = None,
+        appended_from: int | None = None,
+        scales: np.ndarray | None = None,
+    ) -> None:
+        """Write the FAISS index for ``embeddings``; with ``appended_from`` only rows from there on are added to the stored one."""
         try:
             import faiss
-
-            index = faiss.IndexFlatIP(embeddings.shape[1])
-            index.add(embeddings.astype(np.float32))
-            faiss.write_index(index, str(self.artifacts.faiss_path))
-            if progress:
-                progress("FAISS index written.", 1.0)
         except Exception:
+            # An index left from an earlier build would no longer match the embeddings.
+            self.artifacts.faiss_path.unlink(missing_ok=True)
             if progress:
-                progress("FAISS unavailable; using numpy fallback retrieval.", 1.0)
+                progress(f"FAISS unavailable; no {self.config.index_type} index written, using exact numpy fallback retrieval.", 1.0)
+            return
+        if appended_from is not None and self.artifacts.faiss_path.exists():
+            index = faiss.read_index(str(self.artifacts.faiss_path))
+            index.add(np.ascontiguousarray(dequantize_embeddings(embeddings[appended_from:], scales)))
+        else:
+            if progress and self.config.index_type != "flat":
+                progress(f"Building {self.config.index_type} index...", 0.94)
+            index = build_faiss_index(embeddings, self.config, scales=scales)
+        faiss.write_index(index, str(self.artifacts.faiss_path))
+        if progress:
+            progress(f"FAISS {self.config.index_type} index written.", 1.0)
+
+    def update(
+        self,
+        patch_positions: np.ndarray,
+        patch_rows: np.ndarray,
+        new_rows: np.ndarray,
+        docids: list[str],
+        meta: dict,
+        doc_hashes: np.ndarray,
+        progress: ProgressFn | None = None,
+        rebuild_faiss: bool = False,
+    ) -> None:
+        """Overwrite changed embedding rows in place and append rows for new docids (``docids`` lists all of them).
 
-    def load(self) -> tuple[np.ndarray, list[str], dict]:
-        embeddings = np.load(self.artifacts.embeddings_path)
-        docids = json.loads(self.artifacts.docids_path.read_text(encoding="utf-8"))
+        Rows are quantized with the stored scales, so values outside the
+        range seen at build time are clipped.
+        """
+        scales = self.load_scales()
+        if len(patch_positions):
+            embeddings = np.load(self.artifacts.embeddings_path, mmap_mode="r+")
+            embeddings[patch_positions] = quantize_embeddings(patch_rows, self.storage, scales)[0]
+            embeddings.flush()
+            del embeddings
+        n_old = len(docids) - len(new_rows)
+        if len(new_rows):
+            old = np.load(self.artifacts.embeddings_path, mmap_mode="r")
+            tmp_path = self.artifacts.embeddings_path.with_suffix(".tmp.npy")
+            merged = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=old.dtype, shape=(len(docids), new_rows.shape[1]))
+            merged[:n_old] = old
+            merged[n_old:] = quantize_embeddings(new_rows, self.storage, scales)[0]
+            merged.flush()
+            del merged, old
+            tmp_path.replace(self.artifacts.embeddings_path)
+        self._write_metadata(docids, meta, doc_hashes)
+        if progress:
+            progress("Dense index artifacts updated.", 0.92)
+        embeddings = np.load(self.artifacts.embeddings_path, mmap_mode="r")
+        # Appended rows extend the stored FAISS index; patched rows need it rebuilt.
+        rebuild_faiss = rebuild_faiss or len(patch_positions) > 0
+        self._write_faiss(embeddings, progress=progress, appended_from=None if rebuild_faiss else n_old, scales=scales)
+
+    def load(self) -> tuple[np.ndarray, StringTable, dict]:
+        """Stored embeddings as a read-only memmap (not converted to float32), docids and meta.
+
+        Docids are a memory-mapped ``StringTable`` with a hashed docid ->
+        ordinal lookup.
+        """
+        embeddings = np.load(self.artifacts.embeddings_path, mmap_mode="r")
+        if StringTable.exists(self.artifacts.index_dir, DOCID_TABLE):
+            docids = StringTable.load(self.artifacts.index_dir, DOCID_TABLE)
+        else:
+            docids = StringTable.from_strings(json.loads(self.artifacts.docids_path.read_text(encoding="utf-8")), hashed=True)
         meta = json.loads(self.artifacts.meta_path.read_text(encoding="utf-8"))
-        return np.asarray(embeddings, dtype=np.float32), list(docids), dict(meta)
+        return embeddings, docids, dict(meta)
+
+    def load_scales(self) -> np.ndarray | None:
+        if not self.artifacts.scales_path.exists():
+            return None
+        return np.load(self.artifacts.scales_path)
+
+    def load_hashes(self) -> np.ndarray | None:
+        if not self.artifacts.hashes_path.exists():
+            return None
+        return np.load(self.artifacts.hashes_path)
+
+    def exists(self) -> bool:
+        a = self.artifacts
+        has_docids = StringTable.exists(a.index_dir, DOCID_TABLE) or a.docids_path.exists()
+        return a.embeddings_path.exists() and has_docids and a.meta_path.exists()
 
 
 class DenseRetriever:
-    def __init__(self, model_name: str, index_dir: str | Path, device: str | None = None, batch_size: int = 32):
+    def __init__(
+        self,
+        model_name: str,
+        index_dir: str | Path,
+        device: str | None = None,
+        batch_size: int = 32,
+        index_config: AnnIndexConfig | None = None,
+        storage: str | None = None,
+        max_batch_tokens: int | None = None,
+        backend: InferenceBackend | None = None,
+    ):
         self.model_name = model_name
         self.artifacts = DenseIndexArtifacts.for_dir(index_dir)
-        self.encoder = DenseEncoder(model_name=model_name, device=device, batch_size=batch_size)
+        self.encoder = DenseEncoder(
+            model_name=model_name,
+            device=device,
+            batch_size=batch_size,
+            max_batch_tokens=max_batch_tokens,
+            backend=backend,
+        )
+        # None keeps whatever layout / storage the stored index was built with.
+        self.index_config = index_config
+        self.storage = storage
         self.embeddings: np.ndarray | None = None
-        self.docids: list[str] = []
+        self.scales: np.ndarray | None = None
+        self.docids: list[str] | StringTable = []
         self.meta: dict = {}
         self._faiss_index = None
 
-    def build(self, docs: Iterable[dict], progress: ProgressFn | None = None) -> None:
-        rows = list(docs)
-        texts = [str(row["text"]) for row in rows]
-        docids = [str(row["docid"]) for row in rows]
+    def build(self, docs: Iterable[dict], progress: ProgressFn | None = None, incremental: bool = True) -> None:
+        """Encode ``docs`` into the index directory.
+
+        With ``incremental`` and an existing index built by the same model,
+        only documents whose text hash changed or that are new get encoded:
+        changed rows are patched in place and new ones appended. Removed
+        docids force a rewrite of the stored arrays (still without
+        re-encoding unchanged documents).
+        """
+        texts: list[str] = []
+        docids: list[str] = []
+        for row in docs:
+            docids.append(str(row["docid"]))
+            texts.append(str(row["text"]))
+        hashes = content_hashes(texts)
         if progress:
             progress(f"Preparing dense index for {len(docids)} documents...", 0.02)
+        old_meta = json.loads(self.artifacts.meta_path.read_text(encoding="utf-8")) if DenseIndex(self.artifacts).exists() else {}
+        config = self.index_config or AnnIndexConfig.from_meta(old_meta)
+        storage = self.storage or old_meta.get("storage", "float32")
+        index = DenseIndex(self.artifacts, config, storage)
+        if incremental and old_meta:
+            stale = self._stale_reason(old_meta)
+            if stale is None:
+                rebuild_faiss = AnnIndexConfig.from_meta(old_meta).build_key() != config.build_key()
+                restore = old_meta.get("storage", "float32") != storage
+                self._update(index, texts, docids, hashes, progress=progress, rebuild_faiss=rebuild_faiss, restore=restore)
+                return
+            if progress:
+                progress(f"{stale}; re-encoding the whole corpus.", 0.04)
         embeddings = self.encoder.encode_texts(texts, progress=progress, progress_span=(0.08, 0.88), is_query=False)
-        meta = {"model_name": self.model_name, "size": len(docids), "dim": int(embeddings.shape[1]) if len(docids) else 0}
-        DenseIndex(self.artifacts).save(embeddings=embeddings, docids=docids, meta=meta, progress=progress)
-        self.embeddings = embeddings
-        self.docids = docids
-        self.meta = meta
-        self._load_faiss()
+        meta = self._meta(len(docids), int(embeddings.shape[1]) if len(docids) else 0, index)
+        index.save(embeddings=embeddings, docids=docids, meta=meta, progress=progress, doc_hashes=hashes)
+        self.load()
+
+    def _meta(self, size: int, dim: int, index: DenseIndex) -> dict:
+        return {
+            "model_name": self.model_name,
+            "normalize": self.encoder.normalize,
+            "size": size,
+            "dim": dim,
+            "storage": index.storage,
+            "index": asdict(index.config),
+        }
+
+    def _stale_reason(self, meta: dict) -> str | None:
+        """Why embeddings described by ``meta`` cannot be reused with this encoder, or None."""
+        if meta.get("model_name") != self.model_name:
+            return f"Dense index in {self.artifacts.index_dir} was built with {meta.get('model_name')!r}, not {self.model_name!r}"
+        if bool(meta.get("normalize", True)) != self.encoder.normalize:
+            return f"Dense index in {self.artifacts.index_dir} was built with normalize={meta.get('normalize', True)}"
+        return None
+
+    def _update(
+        self,
+        index: DenseIndex,
+        texts: list[str],
+        docids: list[str],
+        hashes: np.ndarray,
+        progress: ProgressFn | None = None,
+        rebuild_faiss: bool = False,
+        restore: bool = False,
+    ) -> None:
+        """Bring the stored index in line with the corpus; ``restore`` rewrites every row (storage type changed)."""
+        old_embeddings, old_docids, _ = index.load()
+        old_scales = index.load_scales()
+        old_hashes = index.load_hashes()
+        if old_hashes is None or len(old_hashes) != len(old_docids):
+            # Indexes written before hashes were stored: trust the rows of docids that are still present.
+            old_hashes = None
+        positions = np.asarray([old_docids.get(docid, -1) for docid in docids], dtype=np.int64)
+        known = positions >= 0
+        changed = ~known
+        if old_hashes is not None:
+            changed[known] = np.any(old_hashes[positions[known]] != hashes[known], axis=1)
+        removed = len(old_docids) - int(known.sum())
+        todo = np.flatnonzero(changed)
+        if progress:
+            progress(
+                f"Dense index: {len(todo)} new or changed, {removed} removed, {len(docids) - len(todo)} reused documents.", 0.06
+            )
+        encoded = self.encoder.encode_texts(
+            [texts[i] for i in todo.tolist()], progress=progress, progress_span=(0.08, 0.88), is_query=False
+        )
+        dim = int(old_embeddings.shape[1]) if len(old_docids) else int(encoded.shape[1]) if len(todo) else 0
+        meta = self._meta(len(docids), dim, index)
+        if removed or restore:
+            embeddings = np.zeros((len(docids), dim), dtype=np.float32)
+            embeddings[known] = dequantize_embeddings(old_embeddings[positions[known]], old_scales)
+            if len(todo):
+                embeddings[todo] = encoded
+            del old_embeddings
+            # Kept rows re-quantize to the same int8 codes when the scales are reused.
+            scales = None if restore else old_scales
+            index.save(embeddings=embeddings, docids=docids, meta=meta, progress=progress, doc_hashes=hashes, scales=scales)
+        elif len(todo) or old_hashes is None or rebuild_faiss:
+            del old_embeddings
+            edited = known[todo]
+            new = todo[~edited]
+            merged_docids = list(old_docids) + [docids[i] for i in new.tolist()]
+            merged_hashes = np.zeros((len(merged_docids), hashes.shape[1]), dtype=np.uint8)
+            merged_hashes[positions[known]] = hashes[known]
+            merged_hashes[len(old_docids) :] = hashes[new]
+            index.update(
+                patch_positions=positions[todo[edited]],
+                patch_rows=encoded[edited] if len(todo) else np.zeros((0, dim), dtype=np.float32),
+                new_rows=encoded[~edited] if len(todo) else np.zeros((0, dim), dtype=np.float32),
+                docids=merged_docids,
+                meta=meta,
+                doc_hashes=merged_hashes,
+                progress=progress,
+                rebuild_faiss=rebuild_faiss,
+            )
+        self.load()
 
     def load(self) -> None:
-        embeddings, docids, meta = DenseIndex(self.artifacts).load()
+        index = DenseIndex(self.artifacts)
+        embeddings, docids, meta = index.load()
         self.embeddings = embeddings
+        self.scales = index.load_scales() if embeddings.dtype == np.int8 else None
         self.docids = docids
         self.meta = meta
         self._load_faiss()
 
     def ensure_ready(self, docs: Iterable[dict] | None = None, progress: ProgressFn | None = None) -> None:
+        """Load the stored index, bringing it up to date with ``docs`` when they are given."""
         if self.embeddings is not None and self.docids:
             return
-        if self.artifacts.embeddings_path.exists() and self.artifacts.docids_path.exists() and self.artifacts.meta_path.exists():
-            if progress:
-                progress(f"Loading dense index from {self.artifacts.index_dir}", 0.14)
-            self.load()
+        if docs is not None:
+            if progress and DenseIndex(self.artifacts).exists():
+                progress(f"Checking dense index in {self.artifacts.index_dir} against the corpus...", 0.14)
+            self.build(docs, progress=progress)
             return
-        if docs is None:
+        if not DenseIndex(self.artifacts).exists():
             raise FileNotFoundError(f"Dense index not found in {self.artifacts.index_dir}")
-        self.build(docs, progress=progress)
+        if progress:
+            progress(f"Loading dense index from {self.artifacts.index_dir}", 0.14)
+        self.load()
+        stale = self._stale_reason(self.meta)
+        if stale is not None:
+            raise ValueError(f"{stale}; rebuild it with build-dense-index.")
+
+    def _search_config(self) -> AnnIndexConfig:
+        """The stored index layout with this retriever's search parameters, if it has any."""
+        stored = AnnIndexConfig.from_meta(self.meta)
+        if self.index_config is not None:
+            stored = AnnIndexConfig(**{**asdict(stored), **{k: getattr(self.index_config, k) for k in SEARCH_PARAMS}})
+        return stored
+
+    def search_key(self) -> dict:
+        """What decides ``rank_many`` results besides the model and the corpus: embedding storage, ANN layout and search parameters."""
+        if self.embeddings is None:
+            raise RuntimeError("Dense index is not loaded.")
+        index = asdict(self._search_config()) if self._faiss_index is not None else "exact"
+        return {"storage": self.meta.get("storage", "float32"), "index": index}
 
     def _load_faiss(self) -> None:
         if not self.artifacts.faiss_path.exists():
@@ -173,27 +602,85 @@ class DenseRetriever:
             self._faiss_index = faiss.read_index(str(self.artifacts.faiss_path))
         except Exception:
             self._faiss_index = None
+            return
+        set_search_params(self._faiss_index, self._search_config())
+
+    def ann_recall(
+        self, k: int = 100, query_embeddings: np.ndarray | None = None, sample: int = 1000, seed: int = 13
+    ) -> dict[str, float]:
+        """Recall@k of the FAISS index against exact search, with per-query latencies.
+
+        Without ``query_embeddings`` a sample of document embeddings serves as
+        queries.
+        """
+        if self.embeddings is None or self._faiss_index is None:
+            raise RuntimeError("Dense FAISS index is not loaded.")
+        if query_embeddings is None:
+            rng = np.random.default_rng(seed)
+            rows = rng.choice(len(self.docids), size=min(sample, len(self.docids)), replace=False)
+            query_embeddings = dequantize_embeddings(self.embeddings[np.sort(rows)], self.scales)
+        q = np.ascontiguousarray(query_embeddings, dtype=np.float32)
+        k = min(k, len(self.docids))
+        if not len(q) or k <= 0:
+            return {f"recall@{k}": 0.0, "queries": 0}
+        start = time.perf_counter()
+        _, ann = self._faiss_index.search(q, k)
+        ann_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        hits = 0
+        for lo in range(0, len(q), 256):
+            _, exact = self._exact_top_k(q[lo : lo + 256], k)
+            hits += sum(len(np.intersect1d(e, a[a >= 0])) for e, a in zip(exact, ann[lo : lo + 256]))
+        exact_seconds = time.perf_counter() - start
+        return {
+            f"recall@{k}": hits / (len(q) * k),
+            "queries": int(len(q)),
+            "ann_ms_per_query": 1000.0 * ann_seconds / len(q),
+            "exact_ms_per_query": 1000.0 * exact_seconds / len(q),
+        }
 
-    def rank(self, query: str, top_k: int = 1000) -> list[RetrievedDoc]:
+    def _exact_top_k(self, q_emb: np.ndarray, k: int, block_rows: int = 16384) -> tuple[np.ndarray, np.ndarray]:
+        """``(scores, rows)`` of the ``k`` best stored rows for each query by inner product, best first.
+
+        The memmap is read block by block and only a running top ``k`` per
+        query is kept between blocks, so memory stays at queries x (block +
+        k) whatever the index size. Only one block at a time is converted to
+        float32; int8 scales are folded into the queries instead of the rows.
+        Ties are broken by row.
+        """
+        q = np.ascontiguousarray(q_emb * self.scales if self.scales is not None else q_emb, dtype=np.float32)
+        best_vals = np.empty((len(q), 0), dtype=np.float32)
+        best_rows = np.empty((len(q), 0), dtype=np.int64)
+        for lo in range(0, len(self.embeddings), block_rows):
+            block = np.asarray(self.embeddings[lo : lo + block_rows], dtype=np.float32)
+            vals = np.concatenate((best_vals, q @ block.T), axis=1)
+            rows = np.concatenate((best_rows, np.broadcast_to(np.arange(lo, lo + len(block), dtype=np.int64), (len(q), len(block)))), axis=1)
+            if vals.shape[1] > k:
+                part = np.argpartition(-vals, k - 1, axis=1)[:, :k]
+                vals = np.take_along_axis(vals, part, axis=1)
+                rows = np.take_along_axis(rows, part, axis=1)
+            best_vals, best_rows = vals, rows
+        order = np.lexsort((best_rows, -best_vals))
+        return np.take_along_axis(best_vals, order, axis=1), np.take_along_axis(best_rows, order, axis=1)
+
+    def rank(self, query: str, top_k: int = 1000) -> RankedList:
+        return self.rank_many([query], top_k=top_k)[0]
+
+    def rank_many(self, queries: list[str], top_k: int = 1000, search_batch_size: int = 256) -> list[RankedList]:
+        """Encode all queries in encoder batches and search them as one query matrix."""
         if self.embeddings is None:
             raise RuntimeError("Dense index is not loaded.")
-        q_emb = self.encoder.encode_texts([query], is_query=True)
-        query_vec = np.asarray(q_emb[0], dtype=np.float32)
+        k = min(top_k, len(self.docids))
+        if not queries or k <= 0:
+            return [RankedList(self.docids, [], []) for _ in queries]
+        q_emb = np.asarray(self.encoder.encode_texts(queries, is_query=True), dtype=np.float32)
         if self._faiss_index is not None:
-            scores, indices = self._faiss_index.search(query_vec[None, :], min(top_k, len(self.docids)))
-            idxs = indices[0].tolist()
-            vals = scores[0].tolist()
+            scores, indices = self._faiss_index.search(q_emb, k)
         else:
-            vals_arr = self.embeddings @ query_vec
-            if top_k >= len(vals_arr):
-                idxs = np.argsort(-vals_arr).tolist()
-            else:
-                idxs = np.argpartition(-vals_arr, top_k - 1)[:top_k].tolist()
-                idxs.sort(key=lambda i: float(vals_arr[i]), reverse=True)
-            vals = [float(vals_arr[i]) for i in idxs]
-        rows: list[RetrievedDoc] = []
-        for idx, score in zip(idxs, vals):
-            if idx < 0:
-                continue
-            rows.append(RetrievedDoc(docid=self.docids[idx], score=float(score)))
-        return rows[:top_k]
+            scores = np.empty((len(queries), k), dtype=np.float32)
+            indices = np.empty((len(queries), k), dtype=np.int64)
+            for start in range(0, len(queries), search_batch_size):
+                batch = slice(start, start + search_batch_size)
+                scores[batch], indices[batch] = self._exact_top_k(q_emb[batch], k)
+        found = indices >= 0
+        return [RankedList(self.docids, idxs[keep], vals[keep]) for idxs, vals, keep in zip(indices, scores, found)]
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Mapping, Sequence
+
+import numpy as np
+
+from .data import iter_json_rows
+from .retriever import RankedList
+
+DEFAULT_CUTOFFS = (10, 100)
+PAIRED_TESTS = ("randomization", "t")
+
+# A run maps each qid to its ranked docids (best first), as a list or a ``RankedList``.
+Run = Mapping[str, "Sequence[str] | RankedList"]
+
+
+def load_run(predictions_path: str) -> dict[str, list[str]]:
+    """Ranked docids per qid of a predictions file, in file order."""
+    run: dict[str, list[str]] = {}
+    for row in iter_json_rows(predictions_path):
+        run.setdefault(str(row["qid"]), []).append(str(row["docid"]))
+    return run
+
+
+@dataclass
+class EvalResult:
+    """Per-query metric values of one run, aligned with ``qids``."""
+
+    qids: list[str]
+    per_query: dict[str, np.ndarray]
+
+    def mean(self, metric: str = "map") -> float:
+        values = self.per_query[metric]
+        return float(values.mean()) if len(values) else 0.0
+
+    def summary(self) -> dict[str, float]:
+        return {metric: self.mean(metric) for metric in self.per_query}
+
+    def query_rows(self) -> list[dict]:
+        columns = {metric: values.tolist() for metric, values in self.per_query.items()}
+        return [{"qid": qid, **{metric: values[i] for metric, values in columns.items()}} for i, qid in enumerate(self.qids)]
+
+    def confidence_intervals(self, n_resamples: int = 1000, level: float = 0.95, seed: int = 13) -> dict[str, list[float]]:
+        """Percentile bootstrap interval of each metric's mean over queries."""
+        return {
+            metric: list(bootstrap_ci(values, n_resamples=n_resamples, level=level, seed=seed))
+            for metric, values in self.per_query.items()
+        }
+
+
+class Evaluator:
+    """Relevance judgments prepared for scoring many runs.
+
+    Queries with at least one relevant document are evaluated, in
+    ``rel_by_qid`` order; a query missing from a run scores 0 on every
+    metric. A run is reduced to the positions of its relevant documents in
+    each query's top ``k``, and every metric is a bincount over those
+    positions: MAP and MRR at ``k``, and nDCG (binary gains), precision and
+    recall at each of ``cutoffs`` (capped at ``k``). ``score_hits`` and
+    ``score_matrix`` take positions or a boolean hit matrix directly, so
+    search loops that already know which candidates are relevant can skip
+    the docid lookups.
+    """
+
+    def __init__(self, rel_by_qid: Mapping[str, set[str]], k: int = 1000, cutoffs: Sequence[int] = DEFAULT_CUTOFFS):
+        if k < 1:
+            raise ValueError(f"k must be positive, got {k}")
+        self.k = k
+        self.cutoffs = tuple(sorted({min(int(c), k) for c in cutoffs}))
+        self.qids = [str(qid) for qid, rel in rel_by_qid.items() if rel]
+        self.rel = [rel_by_qid[qid] for qid in rel_by_qid if rel_by_qid[qid]]
+        self.n_rel = np.asarray([len(rel) for rel in self.rel], dtype=np.float64)
+        self._discounts = 1.0 / np.log2(np.arange(2, k + 2, dtype=np.float64))
+        ideal = np.cumsum(self._discounts)
+        n_rel = self.n_rel.astype(np.int64)
+        self._ideal = {c: ideal[np.minimum(n_rel, c) - 1] for c in self.cutoffs}
+        # Relevance per docid table of the ``RankedList``s seen, keyed by (query, id(table)).
+        self._tables: dict[tuple[int, int], tuple[object, np.ndarray, bool]] = {}
+
+    @property
+    def metrics(self) -> list[str]:
+        names = ["map", "mrr"]
+        for c in self.cutoffs:
+            names += [f"ndcg@{c}", f"p@{c}", f"recall@{c}"]
+        return names
+
+    def hits(self, run: Run) -> tuple[np.ndarray, np.ndarray]:
+        """``(query rows, 0-based ranks)`` of the relevant documents in each query's top ``k``, by query then rank."""
+        rows: list[int] = []
+        ranks: list[int] = []
+        for q, (qid, rel) in enumerate(zip(self.qids, self.rel)):
+            ranked = run.get(qid)
+            if ranked is None:
+                continue
+            if isinstance(ranked, RankedList):
+                found = self._ranked_hits(q, ranked[: self.k]).tolist()
+            else:
+                found = [i for i, docid in enumerate(ranked[: self.k]) if docid in rel]
+            rows += [q] * len(found)
+            ranks += found
+        return np.asarray(rows, dtype=np.int64), np.asarray(ranks, dtype=np.int64)
+
+    def _ranked_hits(self, q: int, ranked: RankedList) -> np.ndarray:
+        """Hit ranks of a ``RankedList``, from its ordinals.
+
+        Lookup tables (the index's docid table) get the relevant ordinals
+        once; plain docid lists (a query's fusion pool) get a relevance mask
+        once, so rescoring the same pool, as a weight search does, costs
+        one array lookup.
+        """
+        key = (q, id(ranked.docids))
+        entry = self._tables.get(key)
+        if entry is None or entry[0] is not ranked.docids:
+            if len(self._tables) > 4 * len(self.qids) + 64:
+                self._tables.clear()
+            if hasattr(ranked.docids, "get"):
+                ords = [ranked.docids.get(docid) for docid in self.rel[q]]
+                entry = (ranked.docids, np.asarray(sorted(o for o in ords if o is not None), dtype=np.int64), False)
+            else:
+                mask = np.fromiter((docid in self.rel[q] for docid in ranked.docids), dtype=bool, count=len(ranked.docids))
+                entry = (ranked.docids, mask, True)
+            self._tables[key] = entry
+        _, relevant, is_mask = entry
+        return np.flatnonzero(relevant[ranked.ords] if is_mask else np.isin(ranked.ords, relevant))
+
+    def score_hits(self, rows: np.ndarray, ranks: np.ndarray) -> dict[str, np.ndarray]:
+        """Per-query metrics from hit positions (``hits`` order; ranks at or past ``k`` are ignored)."""
+        keep = ranks < self.k
+        rows, ranks = rows[keep], ranks[keep]
+        n_queries = len(self.qids)
+        starts = np.searchsorted(rows, np.arange(n_queries))
+        # 1-based count of relevant documents up to and including each hit.
+        found = np.arange(1, len(rows) + 1) - starts[rows]
+        out = {"map": np.bincount(rows, weights=found / (ranks + 1), minlength=n_queries) / self.n_rel}
+        first = np.full(n_queries, np.inf)
+        np.minimum.at(first, rows, ranks.astype(np.float64))
+        out["mrr"] = 1.0 / (first + 1)
+        for c in self.cutoffs:
+            top = ranks < c
+            found_c = np.bincount(rows[top], minlength=n_queries).astype(np.float64)
+            gain = np.bincount(rows[top], weights=self._discounts[ranks[top]], minlength=n_queries)
+            out[f"ndcg@{c}"] = gain / self._ideal[c]
+            out[f"p@{c}"] = found_c / c
+            out[f"recall@{c}"] = found_c / self.n_rel
+        return out
+
+    def score_matrix(self, hits: np.ndarray) -> dict[str, np.ndarray]:
+        """Per-query metrics of a [queries, depth] boolean hit matrix."""
+        rows, ranks = np.nonzero(np.asarray(hits, dtype=bool))
+        return self.score_hits(rows, ranks)
+
+    def evaluate(self, run: Run) -> EvalResult:
+        return EvalResult(list(self.qids), self.score_hits(*self.hits(run)))
+
+
+def evaluate_run(run: Run, rel_by_qid: Mapping[str, set[str]], k: int = 1000, cutoffs: Sequence[int] = DEFAULT_CUTOFFS) -> EvalResult:
+    return Evaluator(rel_by_qid, k=k, cutoffs=cutoffs).evaluate(run)
+
+
+def bootstrap_ci(values: np.ndarray, n_resamples: int = 1000, level: float = 0.95, seed: int = 13) -> tuple[float, float]:
+    """Percentile bootstrap interval of the mean of ``values``."""
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return 0.0, 0.0
+    rng = np.random.default_rng(seed)
+    means = np.empty(n_resamples, dtype=np.float64)
+    step = max(1, 2_000_000 // len(values))
+    for start in range(0, n_resamples, step):
+        n = min(step, n_resamples - start)
+        means[start : start + n] = values[rng.integers(0, len(values), size=(n, len(values)))].mean(axis=1)
+    tail = 100.0 * (1.0 - level) / 2.0
+    lo, hi = np.percentile(means, [tail, 100.0 - tail])
+    return float(lo), float(hi)
+
+
+def paired_test(
+    a: EvalResult,
+    b: EvalResult,
+    metric: str = "map",
+    method: str = "randomization",
+    n_resamples: int = 10000,
+    level: float = 0.95,
+    seed: int = 13,
+) -> dict:
+    """Paired significance test of ``a`` against ``b`` on one metric over their common queries.
+
+    ``randomization`` is a two-sided sign-flip permutation test on the
+    per-query differences; ``t`` is the paired t-test. The bootstrap
+    interval is that of the mean difference.
+    """
+    if method not in PAIRED_TESTS:
+        raise ValueError(f"Unknown paired test: {method}")
+    b_index = {qid: i for i, qid in enumerate(b.qids)}
+    common = [(i, b_index[qid]) for i, qid in enumerate(a.qids) if qid in b_index]
+    a_vals = a.per_query[metric][[i for i, _ in common]]
+    b_vals = b.per_query[metric][[j for _, j in common]]
+    diff = a_vals - b_vals
+    observed = float(diff.mean()) if len(diff) else 0.0
+    if len(diff) < 2 or not np.any(diff):
+        p_value = 1.0
+    elif method == "t":
+        from scipy.stats import ttest_rel
+
+        p_value = float(ttest_rel(a_vals, b_vals).pvalue)
+    else:
+        rng = np.random.default_rng(seed)
+        extreme = 0
+        step = max(1, 2_000_000 // len(diff))
+        for start in range(0, n_resamples, step):
+            n = min(step, n_resamples - start)
+            signs = rng.integers(0, 2, size=(n, len(diff))) * 2 - 1
+            extreme += int(np.count_nonzero(np.abs((signs * diff).mean(axis=1)) >= abs(observed) - 1e-12))
+        p_value = (extreme + 1) / (n_resamples + 1)
+    return {
+        "metric": metric,
+        "method": method,
+        "queries": len(diff),
+        "mean_a": float(a_vals.mean()) if len(diff) else 0.0,
+        "mean_b": float(b_vals.mean()) if len(diff) else 0.0,
+        "diff": observed,
+        "diff_ci": list(bootstrap_ci(diff, n_resamples=min(n_resamples, 2000), level=level, seed=seed)),
+        "p_value": p_value,
+    }
@@ -2,16 +2,37 @@ from __future__ import annotations
 
 from collections import Counter
 
+import numpy as np
+
 from .retriever import HybridTask1Retriever
 
 
 PUNCT = set("!?\"'`.,:;-")
+# Columns of ``HybridTask1Retriever.doc_features``: the features that depend on the document alone.
+DOC_FEATURES = ("doc_len_norm", "punct_norm", "exclaim_norm", "quote_norm", "repeated_words_norm")
+FEATURE_NAMES = ("exact_match", "token_overlap", "char_overlap") + DOC_FEATURES
 
 
 def _safe_div(num: float, den: float) -> float:
     return num / den if den else 0.0
 
 
+def doc_feature_values(doc_text: str, d_tokens: list[str], d_counter: Counter | None = None) -> tuple[float, ...]:
+    """The ``DOC_FEATURES`` of one document, given its tokens (and their counts)."""
+    d_counter = d_counter if d_counter is not None else Counter(d_tokens)
+    punct_count = sum(1 for ch in doc_text if ch in PUNCT)
+    exclaim_count = doc_text.count("!")
+    quote_count = doc_text.count('"') + doc_text.count("“") + doc_text.count("”")
+    repeated_words = sum(1 for c in d_counter.values() if c >= 2)
+    return (
+        min(len(d_tokens) / 40.0, 1.0),
+        min(punct_count / 10.0, 1.0),
+        min(exclaim_count / 3.0, 1.0),
+        min(quote_count / 4.0, 1.0),
+        min(repeated_words / 4.0, 1.0),
+    )
+
+
 def humor_features(query: str, doc_text: str) -> dict[str, float]:
     q_lower = query.lower()
     d_lower = doc_text.lower()
@@ -23,17 +44,39 @@ def humor_features(query: str, doc_text: str) -> dict[str, float]:
     q_grams = Counter(HybridTask1Retriever.char_ngrams(q_lower))
     d_grams = Counter(HybridTask1Retriever.char_ngrams(d_lower))
     gram_overlap = sum(min(q_grams[g], d_grams[g]) for g in q_grams)
-    punct_count = sum(1 for ch in doc_text if ch in PUNCT)
-    exclaim_count = doc_text.count("!")
-    quote_count = doc_text.count('"') + doc_text.count("“") + doc_text.count("”")
-    repeated_words = sum(1 for _, c in Counter(d_tokens).items() if c >= 2)
     return {
         "exact_match": 1.0 if q_lower and q_lower in d_lower else 0.0,
         "token_overlap": _safe_div(overlap, len(q_tokens)),
         "char_overlap": _safe_div(gram_overlap, len(q_grams)),
-        "doc_len_norm": min(len(d_tokens) / 40.0, 1.0),
-        "punct_norm": min(punct_count / 10.0, 1.0),
-        "exclaim_norm": min(exclaim_count / 3.0, 1.0),
-        "quote_norm": min(quote_count / 4.0, 1.0),
-        "repeated_words_norm": min(repeated_words / 4.0, 1.0),
+        **dict(zip(DOC_FEATURES, doc_feature_values(doc_text, d_tokens, d_counter))),
     }
+
+
+def humor_features_batch(retriever: HybridTask1Retriever | None, query: str, docs: list[tuple[str, str]]) -> np.ndarray:
+    """``humor_features`` for many (docid, text) pairs of one query, one row per pair in ``FEATURE_NAMES`` order.
+
+    Documents in the lexical index take their document-only features from
+    its precomputed matrix and their query overlaps from its postings, in a
+    few array operations per query term. The rest are computed from the
+    text, as are all of them without an index or when the index predates the
+    feature matrix.
+    """
+    out = np.zeros((len(docs), len(FEATURE_NAMES)), dtype=np.float64)
+    indexed: list[int] = []
+    ords: list[int] = []
+    if retriever is not None and len(retriever.doc_features):
+        for i, (docid, text) in enumerate(docs):
+            ordinal = retriever.doc_index.get(docid)
+            if ordinal is not None and retriever.doc_text_lower[ordinal] == text.lower():
+                indexed.append(i)
+                ords.append(ordinal)
+    if indexed:
+        ord_arr = np.asarray(ords, dtype=np.int64)
+        exact, token_overlap, char_overlap = retriever.overlap_features(query, ord_arr)
+        out[indexed, 0], out[indexed, 1], out[indexed, 2] = exact, token_overlap, char_overlap
+        out[indexed, 3:] = retriever.doc_features[ord_arr]
+    remaining = sorted(set(range(len(docs))) - set(indexed))
+    for i in remaining:
+        row = humor_features(query, docs[i][1])
+        out[i] = [row[name] for name in FEATURE_NAMES]
+    return out
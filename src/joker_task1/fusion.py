@@ -1,67 +1,119 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field
-
-from .retriever import RetrievedDoc
-
-
-@dataclass
-class CandidateDoc:
-    docid: str
-    lexical_score: float = 0.0
-    dense_score: float = 0.0
-    rerank_score: float = 0.0
-    humor_score: float = 0.0
-    feature_scores: dict[str, float] = field(default_factory=dict)
-    final_score: float = 0.0
-
-
-def _normalize_map(score_map: dict[str, float]) -> dict[str, float]:
-    if not score_map:
-        return {}
-    vals = list(score_map.values())
-    lo = min(vals)
-    hi = max(vals)
-    if hi == lo:
-        return {k: 1.0 for k in score_map}
-    return {k: (v - lo) / (hi - lo) for k, v in score_map.items()}
-
-
-def rrf_fuse(*rankings: list[RetrievedDoc], k: int = 60) -> dict[str, float]:
-    fused: dict[str, float] = {}
-    for rows in rankings:
-        for rank, row in enumerate(rows, start=1):
-            fused[row.docid] = fused.get(row.docid, 0.0) + 1.0 / (k + rank)
-    return fused
-
-
-def build_candidates(lexical_rows: list[RetrievedDoc], dense_rows: list[RetrievedDoc]) -> dict[str, CandidateDoc]:
-    candidates: dict[str, CandidateDoc] = {}
-    lexical_map = _normalize_map({row.docid: row.score for row in lexical_rows})
-    dense_map = _normalize_map({row.docid: row.score for row in dense_rows})
-    for docid in set(lexical_map) | set(dense_map):
-        candidates[docid] = CandidateDoc(
-            docid=docid,
-            lexical_score=lexical_map.get(docid, 0.0),
-            dense_score=dense_map.get(docid, 0.0),
-        )
-    return candidates
-
-
-def weighted_fuse(candidates: dict[str, CandidateDoc], weights: dict[str, float], top_k: int = 1000) -> list[RetrievedDoc]:
-    rows: list[RetrievedDoc] = []
-    feature_weights = weights.get("feature_weights", {}) if isinstance(weights.get("feature_weights"), dict) else {}
-    for cand in candidates.values():
-        feat_total = 0.0
-        for key, value in cand.feature_scores.items():
-            feat_total += feature_weights.get(key, 0.0) * value
-        cand.final_score = (
-            weights.get("lexical", 1.0) * cand.lexical_score
-            + weights.get("dense", 0.8) * cand.dense_score
-            + weights.get("rerank", 1.2) * cand.rerank_score
-            + weights.get("humor", 1.0) * cand.humor_score
-            + feat_total
-        )
-        rows.append(RetrievedDoc(docid=cand.docid, score=cand.final_score))
-    rows.sort(key=lambda row: row.score, reverse=True)
-    return rows[:top_k]
+from typing import Iterable
+
+import numpy as np
+
+from .retriever import RankedList, RetrievedDoc, min_max
+
+# Fused signals, in ``weighted_fuse`` summation order, and their default weights.
+SIGNALS = ("lexical", "dense", "rerank", "humor")
+DEFAULT_SIGNAL_WEIGHTS = {"lexical": 1.0, "dense": 0.8, "rerank": 1.2, "humor": 1.0}
+
+
+class CandidatePool:
+    """Fusion candidates of one query, stored column-wise.
+
+    Rows are documents in first-stage order (the lexical run, then documents
+    only the dense run found). Each signal in ``SIGNALS`` and each handcrafted
+    feature is one float64 column, and each first-stage run keeps its 1-based
+    ranks (0 where the run missed the document) for RRF.
+
+    Columns are never written in place: setting scores replaces the column,
+    so ``copy`` is a shallow copy that shares every column with the original
+    until one side sets new scores.
+    """
+
+    def __init__(self, docids: list[str]):
+        self.docids = docids
+        self.index = {docid: i for i, docid in enumerate(docids)}
+        self.columns: dict[str, np.ndarray] = {name: np.zeros(len(docids), dtype=np.float64) for name in SIGNALS}
+        self.feature_names: tuple[str, ...] = ()
+        self.ranks: dict[str, np.ndarray] = {}
+
+    @classmethod
+    def from_runs(cls, lexical_rows: RankedList, dense_rows: RankedList) -> CandidatePool:
+        """Candidates of both first-stage runs with their min-max normalized scores."""
+        run_docids = {"lexical": lexical_rows.docid_list(), "dense": dense_rows.docid_list()}
+        pool = cls(list(dict.fromkeys(run_docids["lexical"] + run_docids["dense"])))
+        for name, rows in (("lexical", lexical_rows), ("dense", dense_rows)):
+            pool._set_normalized(name, run_docids[name], rows.scores)
+            ranks = np.zeros(len(pool), dtype=np.int64)
+            ranks[pool.positions(run_docids[name])[::-1]] = np.arange(len(rows), 0, -1)
+            pool.ranks[name] = ranks
+        return pool
+
+    def __len__(self) -> int:
+        return len(self.docids)
+
+    def __contains__(self, docid: str) -> bool:
+        return docid in self.index
+
+    def positions(self, docids: Iterable[str]) -> np.ndarray:
+        """Row of each docid (all must be candidates)."""
+        return np.fromiter((self.index[docid] for docid in docids), dtype=np.int64)
+
+    def copy(self) -> CandidatePool:
+        other = CandidatePool.__new__(CandidatePool)
+        other.docids = self.docids
+        other.index = self.index
+        other.columns = dict(self.columns)
+        other.feature_names = self.feature_names
+        other.ranks = self.ranks
+        return other
+
+    def _assign(self, name: str, rows: np.ndarray, values: np.ndarray) -> None:
+        column = self.columns.get(name)
+        column = column.copy() if column is not None else np.zeros(len(self.docids), dtype=np.float64)
+        column[rows] = values
+        self.columns[name] = column
+
+    def set_scores(self, signal: str, rows: RankedList | list[RetrievedDoc]) -> None:
+        """Min-max normalize ``rows`` (over all of them) into the ``signal`` column of the candidates among them."""
+        if not isinstance(rows, RankedList):
+            rows = RankedList.from_rows(rows)
+        self._set_normalized(signal, rows.docid_list(), rows.scores)
+
+    def _set_normalized(self, signal: str, docids: list[str], scores: np.ndarray) -> None:
+        scores = min_max(scores)
+        keep = [i for i, docid in enumerate(docids) if docid in self.index]
+        self._assign(signal, self.positions(docids[i] for i in keep), scores[keep])
+
+    def set_features(self, docids: list[str], names: tuple[str, ...], values: np.ndarray) -> None:
+        """Feature ``values`` ([len(docids), len(names)]) of some candidates; the others keep 0.0."""
+        rows = self.positions(docids)
+        values = np.asarray(values, dtype=np.float64).reshape(len(rows), len(names))
+        for j, name in enumerate(names):
+            self._assign(name, rows, values[:, j])
+        self.feature_names += tuple(name for name in names if name not in self.feature_names)
+
+    def rrf(self, k: int = 60) -> np.ndarray:
+        """Reciprocal-rank fusion score of each candidate over the first-stage runs."""
+        fused = np.zeros(len(self.docids), dtype=np.float64)
+        for ranks in self.ranks.values():
+            fused = fused + np.where(ranks > 0, 1.0 / (k + ranks), 0.0)
+        return fused
+
+    def fused_scores(self, weights: dict, signals: tuple[str, ...] = SIGNALS, rows: np.ndarray | None = None) -> np.ndarray:
+        """``weighted_fuse`` scores of the candidates (or of ``rows``) over ``signals`` and the features."""
+        feature_weights = weights.get("feature_weights", {}) if isinstance(weights.get("feature_weights"), dict) else {}
+        pick = (lambda column: column) if rows is None else (lambda column: column[rows])
+        n = len(self.docids) if rows is None else len(rows)
+        feat_total = np.zeros(n, dtype=np.float64)
+        for name in self.feature_names:
+            feat_total = feat_total + feature_weights.get(name, 0.0) * pick(self.columns[name])
+        total = np.zeros(n, dtype=np.float64)
+        for i, name in enumerate(signals):
+            term = weights.get(name, DEFAULT_SIGNAL_WEIGHTS[name]) * pick(self.columns[name])
+            total = term if i == 0 else total + term
+        return total + feat_total
+
+
+def build_candidates(lexical_rows: RankedList, dense_rows: RankedList) -> CandidatePool:
+    return CandidatePool.from_runs(lexical_rows, dense_rows)
+
+
+def weighted_fuse(candidates: CandidatePool, weights: dict[str, float], top_k: int = 1000) -> RankedList:
+    """Candidates ranked by the weighted sum of their signals and features; ties keep pool order."""
+    scores = candidates.fused_scores(weights)
+    return RankedList(candidates.docids, np.arange(len(candidates), dtype=np.int64), scores).sorted(top_k)
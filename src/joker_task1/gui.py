@@ -10,14 +10,15 @@ from pathlib import Path
 from tkinter import filedialog, messagebox, ttk
 from time import perf_counter
 
-from .cli import (
+from .cache import PairScoreCache
+from .data import iter_json_rows, load_json, to_qrel_map, zip_single_file
+from .evaluation import EvalResult, evaluate_run, load_run
+from .pipeline import (
     build_hybrid_predictions,
     build_predictions,
-    evaluate_predictions_file,
-    map_at_k,
     tune_params,
 )
-from .data import load_json, to_qrel_map, zip_single_file
+from .tuning import search_lexical_params
 
 
 class Task1Gui:
@@ -42,6 +43,8 @@ class Task1Gui:
         self.manual_var = tk.IntVar(value=0)
         self.topk_var = tk.IntVar(value=1000)
         self.autotune_var = tk.BooleanVar(value=False)
+        self.tune_strategy_var = tk.StringVar(value="grid")
+        self.tune_trials_var = tk.IntVar(value=50)
         self.eval_after_run_var = tk.BooleanVar(value=False)
 
         self.pipeline_var = tk.StringVar(value="hybrid")
@@ -60,6 +63,7 @@ class Task1Gui:
         self.learning_rate_var = tk.DoubleVar(value=2e-5)
         self.max_length_var = tk.IntVar(value=256)
         self.fusion_config_var = tk.StringVar(value="")
+        self.rerank_cache_var = tk.StringVar(value="artifacts/cache/rerank_scores.sqlite")
         self.compare_models_var = tk.StringVar(value="camembert-base Qwen/Qwen3-Reranker-0.6B facebook/bart-base distilbert-base-uncased")
         self.compare_output_dir_var = tk.StringVar(value="artifacts/model_comparisons")
         self.compare_file_var = tk.StringVar(value="artifacts/model_comparisons/model_comparison_metrics.json")
@@ -118,6 +122,7 @@ class Task1Gui:
         add_file_row(paths, "Comparison output dir", self.compare_output_dir_var, 10, directory=True)
         add_file_row(paths, "Comparison summary JSON", self.compare_file_var, 11)
         add_file_row(paths, "Auto report JSON", self.report_path_var, 12)
+        add_file_row(paths, "Reranker score cache", self.rerank_cache_var, 13)
         paths.columnconfigure(1, weight=1)
 
         controls = ttk.LabelFrame(frm, text="Run controls", padding=10)
@@ -135,6 +140,9 @@ class Task1Gui:
         opts.grid(row=1, column=0, columnspan=8, sticky="w", pady=(8, 0))
         ttk.Checkbutton(opts, text="Manual run", variable=self.manual_var, onvalue=1, offvalue=0).pack(side="left", padx=4)
         ttk.Checkbutton(opts, text="Auto-tune lexical weights", variable=self.autotune_var).pack(side="left", padx=10)
+        ttk.Combobox(opts, textvariable=self.tune_strategy_var, values=["grid", "random", "tpe", "halving"], width=8, state="readonly").pack(side="left")
+        ttk.Label(opts, text="Trials").pack(side="left", padx=(8, 4))
+        ttk.Spinbox(opts, from_=1, to=1000, textvariable=self.tune_trials_var, width=6).pack(side="left")
         ttk.Checkbutton(opts, text="Evaluate after prediction", variable=self.eval_after_run_var).pack(side="left", padx=10)
         ttk.Checkbutton(opts, text="Auto-save run report", variable=self.auto_report_var).pack(side="left", padx=10)
         ttk.Label(opts, text="Top-K").pack(side="left", padx=(12, 4))
@@ -434,20 +442,19 @@ class Task1Gui:
         self.status_var.set("Evaluating...")
         threading.Thread(target=self._worker_eval_only, daemon=True).start()
 
-    def _evaluate_map(self, pred_path: str, qrels_path: str, k: int) -> float:
-        predictions = load_json(pred_path)
-        qrels = load_json(qrels_path)
-        rel_by_qid = to_qrel_map(qrels)
-        pred_by_qid: dict[str, list[str]] = {}
-        for row in predictions:
-            pred_by_qid.setdefault(str(row["qid"]), []).append(str(row["docid"]))
-        return map_at_k(pred_by_qid, rel_by_qid, k=k)
+    def _evaluate(self, run: dict, qrels_path: str, k: int) -> EvalResult:
+        return evaluate_run(run, to_qrel_map(load_json(qrels_path)), k=k)
+
+    @staticmethod
+    def _format_metrics(result: EvalResult) -> str:
+        return ", ".join(f"{metric}={value:.4f}" for metric, value in result.summary().items() if metric != "map")
 
     def _worker_eval_only(self):
         try:
             self._emit("progress", "Evaluating predictions...", 0.2)
-            score = evaluate_predictions_file(self.eval_pred_var.get(), self.qrels_var.get(), self.topk_var.get())
-            self._emit("progress", f"MAP@{self.topk_var.get()}: {score:.6f}", 1.0)
+            result = self._evaluate(load_run(self.eval_pred_var.get()), self.qrels_var.get(), self.topk_var.get())
+            score = result.mean("map")
+            self._emit("progress", f"MAP@{self.topk_var.get()}: {score:.6f} ({self._format_metrics(result)})", 1.0)
             self._emit("done", f"Evaluation complete. MAP@{self.topk_var.get()} = {score:.6f}")
         except Exception as exc:
             self._emit("error", str(exc))
@@ -456,14 +463,13 @@ class Task1Gui:
         try:
             from .dense import DenseRetriever
 
-            docs = load_json(self.docs_var.get())
             retriever = DenseRetriever(
                 model_name=self.dense_model_var.get().strip(),
                 index_dir=self.dense_index_dir_var.get().strip(),
                 device=self.device_var.get().strip() or None,
                 batch_size=self.batch_size_var.get(),
             )
-            retriever.build(docs, progress=lambda msg, p: self._emit("progress", msg, p))
+            retriever.build(iter_json_rows(self.docs_var.get()), progress=lambda msg, p: self._emit("progress", msg, p))
             self._emit("done", f"Dense index created in {self.dense_index_dir_var.get().strip()}")
         except Exception as exc:
             self._emit("error", str(exc))
@@ -519,21 +525,36 @@ class Task1Gui:
                 docs = load_json(docs_path)
                 queries = load_json(queries_path)
                 qrels = load_json(qrels_path)
-                params, holdout = tune_params(
-                    docs=docs,
-                    queries=queries,
-                    qrels=qrels,
-                    top_k=self.topk_var.get(),
-                    progress=lambda msg, p: self._emit("progress", msg, p),
-                )
+                strategy = self.tune_strategy_var.get()
+                if strategy == "grid":
+                    params, holdout = tune_params(
+                        docs=docs,
+                        queries=queries,
+                        qrels=qrels,
+                        top_k=self.topk_var.get(),
+                        progress=lambda msg, p: self._emit("progress", msg, p),
+                    )
+                else:
+                    params, holdout = search_lexical_params(
+                        docs=docs,
+                        queries=queries,
+                        qrels=qrels,
+                        strategy=strategy,
+                        n_trials=self.tune_trials_var.get(),
+                        top_k=self.topk_var.get(),
+                        log_path=str(Path(params_out).with_suffix(".trials.jsonl")) if params_out else None,
+                        progress=lambda msg, p: self._emit("progress", msg, p),
+                    )
                 self._emit("progress", f"Selected lexical params: {params}; holdout MAP={holdout:.6f}", 0.55)
                 if params_out:
                     with Path(params_out).open("w", encoding="utf-8") as f:
                         json.dump(params, f, ensure_ascii=False, indent=2)
                     self._emit("progress", f"Saved lexical params to {params_out}", 0.58)
 
+            rerank_cache_stats = None
+            rankings: dict = {}
             if self.pipeline_var.get() == "baseline":
-                rows = build_predictions(
+                n_rows = build_predictions(
                     docs_path=docs_path,
                     queries_path=queries_path,
                     output_path=output_path,
@@ -542,29 +563,37 @@ class Task1Gui:
                     qrels_path=qrels_path,
                     top_k=self.topk_var.get(),
                     params=params,
+                    rankings=rankings,
                     progress=lambda msg, p: self._emit("progress", msg, p),
                 )
             else:
-                rows = build_hybrid_predictions(
-                    docs_path=docs_path,
-                    queries_path=queries_path,
-                    output_path=output_path,
-                    run_id=self.run_id_var.get().strip(),
-                    manual=self.manual_var.get(),
-                    qrels_path=qrels_path,
-                    top_k=self.topk_var.get(),
-                    lexical_params=params,
-                    dense_model=self.dense_model_var.get().strip(),
-                    dense_index_dir=self.dense_index_dir_var.get().strip(),
-                    dense_top_k=self.dense_topk_var.get(),
-                    reranker_model=self.reranker_model_var.get().strip() or None,
-                    rerank_top_n=self.rerank_topn_var.get(),
-                    humor_model_dir=self.humor_model_dir_var.get().strip() or None,
-                    device=self.device_var.get().strip() or None,
-                    batch_size=self.batch_size_var.get(),
-                    fusion_config_path=self.fusion_config_var.get().strip() or None,
-                    progress=lambda msg, p: self._emit("progress", msg, p),
-                )
+                rerank_cache = PairScoreCache(self.rerank_cache_var.get().strip() or None)
+                try:
+                    n_rows = build_hybrid_predictions(
+                        docs_path=docs_path,
+                        queries_path=queries_path,
+                        output_path=output_path,
+                        run_id=self.run_id_var.get().strip(),
+                        manual=self.manual_var.get(),
+                        qrels_path=qrels_path,
+                        top_k=self.topk_var.get(),
+                        lexical_params=params,
+                        dense_model=self.dense_model_var.get().strip(),
+                        dense_index_dir=self.dense_index_dir_var.get().strip(),
+                        dense_top_k=self.dense_topk_var.get(),
+                        reranker_model=self.reranker_model_var.get().strip() or None,
+                        rerank_top_n=self.rerank_topn_var.get(),
+                        humor_model_dir=self.humor_model_dir_var.get().strip() or None,
+                        device=self.device_var.get().strip() or None,
+                        batch_size=self.batch_size_var.get(),
+                        fusion_config_path=self.fusion_config_var.get().strip() or None,
+                        rerank_cache=rerank_cache,
+                        rankings=rankings,
+                        progress=lambda msg, p: self._emit("progress", msg, p),
+                    )
+                    rerank_cache_stats = rerank_cache.stats()
+                finally:
+                    rerank_cache.close()
 
             if zip_path:
                 zip_single_file(output_path, zip_path, arcname="prediction.json")
@@ -572,10 +601,15 @@ class Task1Gui:
 
             if self.eval_after_run_var.get() and qrels_path:
                 self._emit("progress", "Running post-prediction evaluation...", 0.99)
-                score = self._evaluate_map(output_path, qrels_path, self.topk_var.get())
-                self._emit("progress", f"MAP@{self.topk_var.get()} on selected data: {score:.6f}", 1.0)
+                result = self._evaluate(rankings, qrels_path, self.topk_var.get())
+                score = result.mean("map")
+                metrics = result.summary()
+                self._emit(
+                    "progress", f"MAP@{self.topk_var.get()} on selected data: {score:.6f} ({self._format_metrics(result)})", 1.0
+                )
             else:
                 score = None
+                metrics = None
 
             report = {
                 "timestamp_utc": datetime.now(timezone.utc).isoformat(),
@@ -590,11 +624,12 @@ class Task1Gui:
                 "outputs": {
                     "predictions": output_path,
                     "zip": zip_path or None,
-                    "rows_written": len(rows),
+                    "rows_written": n_rows,
                 },
                 "evaluation": {
                     "metric": f"MAP@{self.topk_var.get()}",
                     "score": score,
+                    "metrics": metrics,
                 },
                 "settings": {
                     "run_id": self.run_id_var.get().strip(),
@@ -610,13 +645,16 @@ class Task1Gui:
                     "batch_size": self.batch_size_var.get(),
                     "fusion_config_path": self.fusion_config_var.get().strip() or None,
                     "auto_tune": self.autotune_var.get(),
+                    "tune_strategy": self.tune_strategy_var.get() if self.autotune_var.get() else None,
+                    "rerank_cache": self.rerank_cache_var.get().strip() or None,
                 },
+                "rerank_cache": rerank_cache_stats,
                 "resource_snapshot": self.resource_var.get(),
             }
             self._write_run_report(report)
 
             self.eval_pred_var.set(output_path)
-            self._emit("done", f"Completed successfully. Rows written: {len(rows)}")
+            self._emit("done", f"Completed successfully. Rows written: {n_rows}")
         except Exception as exc:
             self._emit("error", str(exc))
 
@@ -658,6 +696,7 @@ class Task1Gui:
                     str(self.batch_size_var.get()),
                     "--models",
                     *[name.strip() for name in self.compare_models_var.get().split() if name.strip()],
+                    *(["--rerank-cache", self.rerank_cache_var.get().strip()] if self.rerank_cache_var.get().strip() else []),
                 ]
             )
 
@@ -12,6 +12,7 @@ from torch import nn
 from torch.utils.data import DataLoader, Dataset
 
 from .data import docs_by_id, queries_by_id
+from .onnx_backend import InferenceBackend
 from .retriever import HybridTask1Retriever
 
 ProgressFn = Callable[[str, float], None]
@@ -49,31 +50,65 @@ class PairDataset(Dataset):
 
 
 class HumorPairScorer:
-    def __init__(self, model_dir: str | Path, device: str | None = None, max_length: int = 256):
-        from transformers import AutoModelForSequenceClassification, AutoTokenizer
-
+    def __init__(
+        self,
+        model_dir: str | Path,
+        device: str | None = None,
+        max_length: int = 256,
+        backend: InferenceBackend | None = None,
+    ):
         self.model_dir = str(model_dir)
         self.device_name = device or ("cuda" if torch.cuda.is_available() else "cpu")
         self.max_length = max_length
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
-        self.model = AutoModelForSequenceClassification.from_pretrained(self.model_dir, num_labels=1)
+        self.backend = backend or InferenceBackend()
         self.device = torch.device(self.device_name)
-        self.model.to(self.device)
-        self.model.eval()
+        self._onnx = None
+        if self.backend.is_onnx:
+            from .onnx_backend import load_pair_scorer
+
+            self._onnx = load_pair_scorer("humor", self.model_dir, self.backend, self._export_source)
+            self.tokenizer = self._onnx.tokenizer
+            self.model = None
+        else:
+            self.tokenizer, self.model = self._load_torch_model()
+
+    def _load_torch_model(self):
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
+        model = AutoModelForSequenceClassification.from_pretrained(self.model_dir, num_labels=1)
+        model.to(self.device)
+        model.eval()
+        return tokenizer, model
+
+    def _export_source(self):
+        """Pieces ``load_pair_scorer`` needs to export and parity-check the PyTorch classifier."""
+        self.tokenizer, self.model = self._load_torch_model()
+
+        def reference(pairs: list[tuple[str, str]]) -> list[float]:
+            return self._predict([(query, "", doc) for query, doc in pairs], batch_size=8, onnx=False)
+
+        return self.model, self.tokenizer, self.max_length, "sigmoid", reference
+
+    def score_pairs(
+        self, query: str, docs: list[str], batch_size: int = 8, docids: list[str] | None = None
+    ) -> list[float]:
+        """Humor probability of each doc for ``query``; ``docids`` lets document token ids be cached across queries."""
+        ids = docids if docids is not None else [""] * len(docs)
+        return self._predict([(query, docid, doc) for docid, doc in zip(ids, docs)], batch_size=batch_size)
+
+    def _predict(self, pairs: list[tuple[str, str, str]], batch_size: int, onnx: bool = True) -> list[float]:
+        from .pair_tokens import shared_pair_tokenizer
 
-    def score_pairs(self, query: str, docs: list[str], batch_size: int = 8) -> list[float]:
+        tokens = shared_pair_tokenizer(self.tokenizer)
+        tokens.warm([(docid, text) for _, docid, text in pairs])
         rows: list[float] = []
-        for start in range(0, len(docs), batch_size):
-            batch_docs = docs[start : start + batch_size]
-            enc = self.tokenizer(
-                [query] * len(batch_docs),
-                batch_docs,
-                truncation=True,
-                padding=True,
-                max_length=self.max_length,
-                return_tensors="pt",
-            )
-            enc = {k: v.to(self.device) for k, v in enc.items()}
+        for start in range(0, len(pairs), batch_size):
+            features = tokens.encode(pairs[start : start + batch_size], self.max_length)
+            if onnx and self._onnx is not None:
+                rows.extend(float(p) for p in self._onnx.predict_features(features))
+                continue
+            enc = {k: torch.from_numpy(v).to(self.device) for k, v in features.items()}
             with torch.no_grad():
                 logits = self.model(**enc).logits.squeeze(-1)
                 probs = torch.sigmoid(logits).detach().cpu().tolist()
@@ -115,7 +150,7 @@ def build_pair_examples(
     total_qids = max(1, len(qid_to_pos_docids))
     for idx, (qid, pos_docids) in enumerate(qid_to_pos_docids.items(), start=1):
         query_text = str(query_map[qid]["query"])
-        hard_pool = [row.docid for row in retriever.rank(query_text, top_k=max(50, negatives_per_positive * len(pos_docids) * 2))]
+        hard_pool = retriever.rank(query_text, top_k=max(50, negatives_per_positive * len(pos_docids) * 2)).docid_list()
         hard_pool = [docid for docid in hard_pool if docid not in pos_docids]
         while len(hard_pool) < negatives_per_positive * len(pos_docids):
             candidate = rnd.choice(all_docids)
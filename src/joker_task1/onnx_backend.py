@@ -0,0 +1,376 @@
+from __future__ import annotations
+
+import hashlib
+import inspect
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+ProgressFn = Callable[[str, float], None]
+INFERENCE_BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_EXPORT_FORMAT = 1
+MODEL_INPUTS = ("input_ids", "attention_mask", "token_type_ids")
+# Short probe texts for the parity check run right after export.
+PARITY_QUERIES = (
+    "why did the scarecrow win an award",
+    "pun about bread",
+    "a joke with a play on words about time flying",
+    "knock knock",
+)
+PARITY_DOCS = (
+    "Because he was outstanding in his field.",
+    "I used to be a baker, but I couldn't make enough dough.",
+    "Time flies like an arrow; fruit flies like a banana.",
+    "The results of the quarterly report are attached to this message for review.",
+)
+
+
+@dataclass(frozen=True)
+class InferenceBackend:
+    """How the dense encoder, cross-encoder and humor scorer run.
+
+    ``torch`` uses the models as loaded by sentence-transformers /
+    transformers. ``onnx`` exports each model once to ``cache_dir`` and runs
+    it through onnxruntime on CPU; ``onnx-int8`` additionally applies
+    dynamic int8 weight quantization. ``threads`` sets onnxruntime's
+    intra-op thread count (0 keeps its default of one per physical core).
+
+    An export whose parity check against PyTorch falls below
+    ``min_spearman`` (rank correlation of the probe scores) or, when set,
+    above ``max_abs_diff`` is refused rather than used for inference.
+    """
+
+    kind: str = "torch"
+    cache_dir: str = "artifacts/onnx"
+    threads: int = 0
+    min_spearman: float = 0.95
+    max_abs_diff: float | None = None
+
+    def __post_init__(self) -> None:
+        if self.kind not in INFERENCE_BACKENDS:
+            raise ValueError(f"Unknown inference backend {self.kind!r}; expected one of {', '.join(INFERENCE_BACKENDS)}")
+
+    @property
+    def is_onnx(self) -> bool:
+        return self.kind != "torch"
+
+    @property
+    def quantize(self) -> bool:
+        return self.kind == "onnx-int8"
+
+    def model_key(self, model_name: str) -> str:
+        """Model name as used in score cache keys, so ONNX scores never mix with PyTorch ones."""
+        return model_name if not self.is_onnx else f"{model_name}@{self.kind}"
+
+    def parity_failure(self, report: dict | None) -> str | None:
+        """Why a parity report is outside the tolerance, or None (also for exports without a report)."""
+        if not report:
+            return None
+        if report.get("spearman", 1.0) < self.min_spearman:
+            return f"spearman {report['spearman']:.4f} < {self.min_spearman}"
+        if self.max_abs_diff is not None and report["max_abs_diff"] > self.max_abs_diff:
+            return f"max |diff| {report['max_abs_diff']:.2e} > {self.max_abs_diff}"
+        return None
+
+    def artifact_dir(self, role: str, model_name: str) -> Path:
+        safe = "".join(ch.lower() if ch.isalnum() else "_" for ch in model_name).strip("_") or "model"
+        return Path(self.cache_dir) / f"{role}-{safe}-{'int8' if self.quantize else 'fp32'}"
+
+
+def source_fingerprint(model_name: str) -> str:
+    """Identity of the exported weights: file sizes and mtimes for a local model directory, else the hub name."""
+    path = Path(model_name)
+    h = hashlib.sha1(model_name.encode("utf-8"))
+    if path.is_dir():
+        for item in sorted(path.rglob("*")):
+            if item.is_file() and not item.name.startswith("."):
+                stat = item.stat()
+                h.update(f"{item.relative_to(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def parity_report(reference: np.ndarray, candidate: np.ndarray) -> dict[str, float]:
+    """Max/mean absolute difference and Spearman rank correlation of two score arrays."""
+    reference = np.asarray(reference, dtype=np.float64).ravel()
+    candidate = np.asarray(candidate, dtype=np.float64).ravel()
+    diff = np.abs(reference - candidate)
+    report = {"max_abs_diff": float(diff.max(initial=0.0)), "mean_abs_diff": float(diff.mean()) if len(diff) else 0.0}
+    if len(reference) > 1:
+        ranks_ref = np.argsort(np.argsort(reference, kind="stable"), kind="stable").astype(np.float64)
+        ranks_cand = np.argsort(np.argsort(candidate, kind="stable"), kind="stable").astype(np.float64)
+        report["spearman"] = float(np.corrcoef(ranks_ref, ranks_cand)[0, 1])
+    return report
+
+
+def export_transformer(hf_model, tokenizer, out_dir: Path, quantize: bool, meta: dict) -> Path:
+    """Export a Hugging Face model's first output (logits or last hidden state) to ``out_dir/model.onnx``.
+
+    Batch and sequence axes are dynamic. With ``quantize`` the exported graph
+    is rewritten with dynamic int8 weights. ``meta`` (plus the inputs used)
+    is written next to it together with the tokenizer.
+    """
+    import torch
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    sample = tokenizer(["a short probe"], ["another probe text"], return_tensors="pt")
+    forward_args = inspect.signature(hf_model.forward).parameters
+    names = [name for name in MODEL_INPUTS if name in sample and name in forward_args]
+
+    class _FirstOutput(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(names, inputs)))[0]
+
+    fp32_path = out_dir / "model.fp32.onnx"
+    hf_model = hf_model.to("cpu").eval()
+    # Newer torch defaults to the dynamo exporter, which does not take ``dynamic_axes`` for positional inputs.
+    legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            _FirstOutput(hf_model),
+            tuple(sample[name] for name in names),
+            str(fp32_path),
+            input_names=names,
+            output_names=["output"],
+            dynamic_axes={
+                **{name: {0: "batch", 1: "sequence"} for name in names},
+                # Hidden states keep the sequence axis; classifier logits do not.
+                "output": {0: "batch", 1: "sequence"} if meta.get("role") == "dense" else {0: "batch"},
+            },
+            opset_version=17,
+            **legacy,
+        )
+    model_path = out_dir / "model.onnx"
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(str(fp32_path), str(model_path), weight_type=QuantType.QInt8)
+        fp32_path.unlink()
+    else:
+        fp32_path.replace(model_path)
+    tokenizer.save_pretrained(str(out_dir))
+    meta = {**meta, "format": ONNX_EXPORT_FORMAT, "inputs": names, "quantized": quantize}
+    (out_dir / "onnx_meta.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+    return model_path
+
+
+def exported_meta(out_dir: Path, fingerprint: str) -> dict | None:
+    """Meta of a usable cached export in ``out_dir``, or None when it is missing or stale."""
+    meta_path = out_dir / "onnx_meta.json"
+    if not meta_path.exists() or not (out_dir / "model.onnx").exists():
+        return None
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    if meta.get("format") != ONNX_EXPORT_FORMAT or meta.get("source") != fingerprint:
+        return None
+    return meta
+
+
+class OnnxModel:
+    """onnxruntime CPU session plus the tokenizer of an exported model."""
+
+    def __init__(self, model_dir: str | Path, threads: int = 0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_dir = Path(model_dir)
+        self.meta = json.loads((self.model_dir / "onnx_meta.json").read_text(encoding="utf-8"))
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            str(self.model_dir / "model.onnx"), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(str(self.model_dir))
+        self.max_length = int(self.meta.get("max_length") or 512)
+
+    def run(self, texts: list[str], pair_texts: list[str] | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """First model output and the attention mask for one padded batch."""
+        encoded = self.tokenizer(
+            texts, pair_texts, truncation=True, padding=True, max_length=self.max_length, return_tensors="np"
+        )
+        feed = {name: np.asarray(encoded[name], dtype=np.int64) for name in self.meta["inputs"]}
+        return self.session.run(None, feed)[0], np.asarray(encoded["attention_mask"])
+
+
+class OnnxSentenceEncoder(OnnxModel):
+    """Stand-in for ``SentenceTransformer.encode`` over an exported transformer plus numpy pooling."""
+
+    @property
+    def max_seq_length(self) -> int:
+        return self.max_length
+
+    def encode(
+        self,
+        sentences: list[str],
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = False,
+        show_progress_bar: bool = False,
+    ) -> np.ndarray:
+        chunks = []
+        for start in range(0, len(sentences), max(1, batch_size)):
+            hidden, mask = self.run(list(sentences[start : start + batch_size]))
+            chunks.append(self._pool(hidden.astype(np.float32), mask))
+        emb = np.vstack(chunks) if chunks else np.zeros((0, 0), dtype=np.float32)
+        if normalize_embeddings or self.meta.get("normalize"):
+            norms = np.linalg.norm(emb, axis=1, keepdims=True)
+            emb = emb / np.maximum(norms, 1e-12)
+        return emb.astype(np.float32)
+
+    def _pool(self, hidden: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        pooling = self.meta.get("pooling", "mean")
+        if pooling == "cls":
+            return hidden[:, 0]
+        weights = mask[..., None].astype(np.float32)
+        if pooling == "max":
+            return np.where(weights > 0, hidden, -1e9).max(axis=1)
+        if pooling == "lasttoken":
+            last = np.maximum(mask.sum(axis=1) - 1, 0)
+            return hidden[np.arange(len(hidden)), last]
+        return (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+
+
+class OnnxPairScorer(OnnxModel):
+    """Stand-in for ``CrossEncoder.predict`` over an exported sequence classifier."""
+
+    def predict(self, pairs: list[tuple[str, str]], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        scores: list[np.ndarray] = []
+        for start in range(0, len(pairs), max(1, batch_size)):
+            batch = pairs[start : start + batch_size]
+            logits, _ = self.run([query for query, _ in batch], [doc for _, doc in batch])
+            scores.append(self._activate(logits))
+        return np.concatenate(scores) if scores else np.zeros(0, dtype=np.float32)
+
+    def predict_features(self, features: dict[str, np.ndarray]) -> np.ndarray:
+        """Scores of one batch already encoded (e.g. by ``PairTokenizer``) with this model's tokenizer."""
+        feed = {name: np.asarray(features[name], dtype=np.int64) for name in self.meta["inputs"]}
+        return self._activate(self.session.run(None, feed)[0])
+
+    def _activate(self, logits: np.ndarray) -> np.ndarray:
+        logits = logits.astype(np.float32)
+        logits = logits[:, 0] if logits.ndim == 2 and logits.shape[1] == 1 else logits
+        return _sigmoid(logits) if self.meta.get("activation") == "sigmoid" else logits
+
+
+def _pooling_mode(st_model) -> tuple[str, bool]:
+    """Pooling mode and whether a Normalize module follows, for a plain Transformer+Pooling sentence-transformer."""
+    pooling, normalize = "mean", False
+    for module in list(st_model)[1:]:
+        name = type(module).__name__
+        if name == "Pooling":
+            pooling = module.get_pooling_mode_str() if hasattr(module, "get_pooling_mode_str") else "mean"
+            if pooling not in ("mean", "cls", "max", "lasttoken"):
+                raise ValueError(f"Pooling mode {pooling!r} is not supported by the ONNX backend")
+        elif name == "Normalize":
+            normalize = True
+        else:
+            raise ValueError(f"Sentence-transformer module {name} is not supported by the ONNX backend")
+    return pooling, normalize
+
+
+def load_sentence_encoder(
+    model_name: str,
+    backend: InferenceBackend,
+    load_torch: Callable[[], object],
+    progress: ProgressFn | None = None,
+) -> OnnxSentenceEncoder:
+    """Cached ONNX export of a sentence-transformer, exporting (and checking parity) on first use."""
+    out_dir = backend.artifact_dir("dense", model_name)
+    fingerprint = source_fingerprint(model_name)
+    if exported_meta(out_dir, fingerprint) is None:
+        if progress:
+            progress(f"Exporting {model_name} to ONNX in {out_dir}...", 0.0)
+        st_model = load_torch()
+        pooling, normalize = _pooling_mode(st_model)
+        transformer = st_model[0]
+        export_transformer(
+            transformer.auto_model,
+            transformer.tokenizer,
+            out_dir,
+            backend.quantize,
+            {
+                "role": "dense",
+                "model_name": model_name,
+                "source": fingerprint,
+                "pooling": pooling,
+                "normalize": normalize,
+                "max_length": int(st_model.max_seq_length or 512),
+            },
+        )
+        encoder = OnnxSentenceEncoder(out_dir, threads=backend.threads)
+        texts = list(PARITY_QUERIES + PARITY_DOCS)
+        reference = np.asarray(st_model.encode(texts, convert_to_numpy=True, normalize_embeddings=True), dtype=np.float32)
+        candidate = encoder.encode(texts, normalize_embeddings=True)
+        _record_parity(out_dir, encoder, parity_report(reference @ reference.T, candidate @ candidate.T), progress)
+    else:
+        encoder = OnnxSentenceEncoder(out_dir, threads=backend.threads)
+    _check_parity(encoder, backend)
+    return encoder
+
+
+def load_pair_scorer(
+    role: str,
+    model_name: str,
+    backend: InferenceBackend,
+    load_torch: Callable[[], tuple[object, object, int, str, Callable[[list[tuple[str, str]]], np.ndarray]]],
+    progress: ProgressFn | None = None,
+) -> OnnxPairScorer:
+    """Cached ONNX export of a (query, doc) sequence classifier.
+
+    ``load_torch`` returns ``(hf_model, tokenizer, max_length, activation,
+    reference_scorer)``; it is only called when no up-to-date export exists,
+    and the reference scorer is used for the parity check.
+    """
+    out_dir = backend.artifact_dir(role, model_name)
+    fingerprint = source_fingerprint(model_name)
+    if exported_meta(out_dir, fingerprint) is None:
+        if progress:
+            progress(f"Exporting {model_name} to ONNX in {out_dir}...", 0.0)
+        hf_model, tokenizer, max_length, activation, reference_scorer = load_torch()
+        export_transformer(
+            hf_model,
+            tokenizer,
+            out_dir,
+            backend.quantize,
+            {"role": role, "model_name": model_name, "source": fingerprint, "activation": activation, "max_length": max_length},
+        )
+        scorer = OnnxPairScorer(out_dir, threads=backend.threads)
+        pairs = [(query, doc) for query in PARITY_QUERIES for doc in PARITY_DOCS]
+        _record_parity(out_dir, scorer, parity_report(reference_scorer(pairs), scorer.predict(pairs)), progress)
+    else:
+        scorer = OnnxPairScorer(out_dir, threads=backend.threads)
+    _check_parity(scorer, backend)
+    return scorer
+
+
+def _record_parity(out_dir: Path, model: OnnxModel, report: dict[str, float], progress: ProgressFn | None) -> None:
+    model.meta["parity"] = report
+    (out_dir / "onnx_meta.json").write_text(json.dumps(model.meta, ensure_ascii=False, indent=2), encoding="utf-8")
+    if progress:
+        progress(
+            f"ONNX parity vs PyTorch: max |diff| {report['max_abs_diff']:.2e}, spearman {report.get('spearman', 1.0):.4f}",
+            0.0,
+        )
+
+
+def _check_parity(model: OnnxModel, backend: InferenceBackend) -> None:
+    """Refuse an export (fresh or cached) whose stored parity report is outside the backend's tolerance."""
+    failure = backend.parity_failure(model.meta.get("parity"))
+    if failure is not None:
+        hint = "use --backend onnx (fp32) or torch" if backend.quantize else "use --backend torch"
+        raise ValueError(
+            f"ONNX export in {model.model_dir} does not match PyTorch ({failure}); {hint}, "
+            "or relax --onnx-min-spearman / --onnx-max-abs-diff"
+        )
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+# Probes used to read the special-token layout of ``tokenizer(query, doc)``.
+_TEMPLATE_PROBES = (
+    ("pun", "joke"),
+    ("Why did the chicken cross the road?", "To get to the other side!"),
+    ("  knock, knock  ", "Who's there? Lettuce... \"lettuce\" in!"),
+)
+
+
+def tokenizer_family(tokenizer) -> str:
+    """Fingerprint of everything that decides token ids, so models sharing a tokenizer share encodings."""
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is not None:
+        state = json.loads(backend.to_str())
+        state.pop("truncation", None)
+        state.pop("padding", None)
+        payload = json.dumps(state, sort_keys=True)
+    else:
+        payload = json.dumps([type(tokenizer).__name__, sorted(tokenizer.get_vocab().items()), tokenizer.init_kwargs], default=str)
+    extra = [tokenizer.pad_token_id, getattr(tokenizer, "padding_side", "right"), getattr(tokenizer, "truncation_side", "right")]
+    return hashlib.sha1((payload + json.dumps(extra, default=str)).encode("utf-8")).hexdigest()
+
+
+class PairTokenizer:
+    """(query, doc) encodings assembled from cached token ids.
+
+    Each query and document is tokenized once (documents are cached per
+    docid and text, least recently used first out) and the pair encoding is
+    built by concatenating them with the special tokens and token type ids
+    the tokenizer itself uses, read off a few probe pairs. Truncation follows
+    ``truncation=True`` (longest first); the rare pairs where both sides
+    would have to be cut are sent to the tokenizer as they are. Tokenizers
+    whose pair layout cannot be reproduced this way (``supported`` is False)
+    get every pair tokenized directly.
+    """
+
+    def __init__(self, tokenizer, max_docs: int = 200_000, max_queries: int = 4096, family: str | None = None):
+        self.tokenizer = tokenizer
+        self.max_docs = max_docs
+        self.max_queries = max_queries
+        self.family = family or tokenizer_family(tokenizer)
+        self.pad_id = int(tokenizer.pad_token_id if tokenizer.pad_token_id is not None else 0)
+        self.pad_left = getattr(tokenizer, "padding_side", "right") == "left"
+        self.cut_left = getattr(tokenizer, "truncation_side", "right") == "left"
+        self.doc_hits = 0
+        self.doc_misses = 0
+        self._docs: OrderedDict[tuple[str, int], list[int]] = OrderedDict()
+        self._queries: OrderedDict[str, list[int]] = OrderedDict()
+        self._template = self._read_template()
+        self.supported = self._template is not None
+
+    def _ids(self, text: str) -> list[int]:
+        return list(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def _read_template(self) -> tuple[list[list[int]], list[int] | None] | None:
+        """``([prefix, middle, suffix], segment token types)`` of the tokenizer's pair layout, or None."""
+        template = None
+        for query, doc in _TEMPLATE_PROBES:
+            q_ids, d_ids = self._ids(query), self._ids(doc)
+            full = self.tokenizer(query, doc)
+            ids = list(full["input_ids"])
+            types = list(full["token_type_ids"]) if "token_type_ids" in full else None
+            if template is None:
+                template = self._match_layout(ids, types, q_ids, d_ids)
+                if template is None:
+                    return None
+            enc = self._assemble(template, q_ids, d_ids)
+            if enc[0] != ids or (types is not None and enc[1] != types):
+                return None
+        return template
+
+    @staticmethod
+    def _match_layout(ids: list[int], types: list[int] | None, q_ids: list[int], d_ids: list[int]):
+        for i in range(len(ids) - len(q_ids) + 1):
+            if ids[i : i + len(q_ids)] != q_ids:
+                continue
+            for j in range(i + len(q_ids), len(ids) - len(d_ids) + 1):
+                if ids[j : j + len(d_ids)] != d_ids:
+                    continue
+                bounds = [(0, i), (i, i + len(q_ids)), (i + len(q_ids), j), (j, j + len(d_ids)), (j + len(d_ids), len(ids))]
+                segment_types = None
+                if types is not None:
+                    segment_types = [types[lo] if hi > lo else 0 for lo, hi in bounds]
+                return [ids[:i], ids[i + len(q_ids) : j], ids[j + len(d_ids) :]], segment_types
+        return None
+
+    @staticmethod
+    def _assemble(template, q_ids: list[int], d_ids: list[int]) -> tuple[list[int], list[int] | None]:
+        (prefix, middle, suffix), segment_types = template
+        segments = (prefix, q_ids, middle, d_ids, suffix)
+        ids = [token for segment in segments for token in segment]
+        if segment_types is None:
+            return ids, None
+        return ids, [t for segment, t in zip(segments, segment_types) for _ in segment]
+
+    def query_ids(self, query: str) -> list[int]:
+        ids = self._queries.get(query)
+        if ids is None:
+            ids = self._queries[query] = self._ids(query)
+            while len(self._queries) > self.max_queries:
+                self._queries.popitem(last=False)
+        return ids
+
+    def doc_ids(self, docid: str, text: str) -> list[int]:
+        key = (str(docid), hash(text))
+        ids = self._docs.get(key)
+        if ids is not None:
+            self._docs.move_to_end(key)
+            self.doc_hits += 1
+            return ids
+        self.doc_misses += 1
+        ids = self._docs[key] = self._ids(text)
+        while len(self._docs) > self.max_docs:
+            self._docs.popitem(last=False)
+        return ids
+
+    def warm(self, docs: list[tuple[str, str]]) -> None:
+        """Tokenize the uncached (docid, text) pairs in one batched call."""
+        todo = {}
+        for docid, text in docs:
+            key = (str(docid), hash(text))
+            if key not in self._docs:
+                todo[key] = text
+        if not todo:
+            return
+        keys = list(todo)
+        for key, ids in zip(keys, self.tokenizer([todo[key] for key in keys], add_special_tokens=False)["input_ids"]):
+            self._docs[key] = list(ids)
+        self.doc_misses += len(keys)
+        while len(self._docs) > self.max_docs:
+            self._docs.popitem(last=False)
+
+    def _cut(self, ids: list[int], keep: int) -> list[int]:
+        if len(ids) <= keep:
+            return ids
+        return ids[len(ids) - keep :] if self.cut_left else ids[:keep]
+
+    def encode(self, pairs: list[tuple[str, str, str]], max_length: int) -> dict[str, np.ndarray]:
+        """Padded ``input_ids``/``attention_mask`` (and ``token_type_ids``) for (query, docid, doc text) pairs."""
+        if not self.supported:
+            enc = self.tokenizer(
+                [query for query, _, _ in pairs],
+                [text for _, _, text in pairs],
+                truncation=True,
+                padding=True,
+                max_length=max_length,
+                return_tensors="np",
+            )
+            return {name: np.asarray(value, dtype=np.int64) for name, value in enc.items()}
+        (prefix, middle, suffix), segment_types = self._template
+        budget = max_length - len(prefix) - len(middle) - len(suffix)
+        rows: list[tuple[list[int], list[int] | None]] = []
+        for query, docid, text in pairs:
+            q_ids, d_ids = self.query_ids(query), self.doc_ids(docid, text)
+            if len(q_ids) + len(d_ids) > budget:
+                if 2 * min(len(q_ids), len(d_ids)) > budget:
+                    enc = self.tokenizer(query, text, truncation=True, max_length=max_length)
+                    rows.append((list(enc["input_ids"]), list(enc["token_type_ids"]) if segment_types is not None else None))
+                    continue
+                if len(q_ids) > len(d_ids):
+                    q_ids = self._cut(q_ids, budget - len(d_ids))
+                else:
+                    d_ids = self._cut(d_ids, budget - len(q_ids))
+            rows.append(self._assemble(self._template, q_ids, d_ids))
+        width = max((len(ids) for ids, _ in rows), default=0)
+        input_ids = np.full((len(rows), width), self.pad_id, dtype=np.int64)
+        attention = np.zeros((len(rows), width), dtype=np.int64)
+        token_types = np.zeros((len(rows), width), dtype=np.int64) if segment_types is not None else None
+        for i, (ids, types) in enumerate(rows):
+            cols = slice(width - len(ids), width) if self.pad_left else slice(0, len(ids))
+            input_ids[i, cols] = ids
+            attention[i, cols] = 1
+            if token_types is not None:
+                token_types[i, cols] = types
+        out = {"input_ids": input_ids, "attention_mask": attention}
+        if token_types is not None:
+            out["token_type_ids"] = token_types
+        return out
+
+
+_SHARED: dict[str, PairTokenizer] = {}
+# Tokenizer object -> its shared PairTokenizer, so the family is fingerprinted once per tokenizer, not per call.
+_BY_TOKENIZER: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def shared_pair_tokenizer(tokenizer) -> PairTokenizer:
+    """The process-wide ``PairTokenizer`` for this tokenizer's family, so scorers with the same tokenizer reuse its caches."""
+    try:
+        return _BY_TOKENIZER[tokenizer]
+    except (KeyError, TypeError):
+        pass
+    family = tokenizer_family(tokenizer)
+    if family not in _SHARED:
+        _SHARED[family] = PairTokenizer(tokenizer, family=family)
+    try:
+        _BY_TOKENIZER[tokenizer] = _SHARED[family]
+    except TypeError:
+        pass
+    return _SHARED[family]
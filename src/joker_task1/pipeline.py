@@ -0,0 +1,678 @@
+from __future__ import annotations
+
+import itertools
+import json
+from contextlib import nullcontext
+from dataclasses import replace
+from random import Random
+from typing import Callable, Iterator
+
+import numpy as np
+
+from .cache import PairScoreCache, StageCache, content_hash, corpus_fingerprint
+from .cascade import CascadeConfig, StageReport, linear_scores, prune
+from .data import PredictionWriter, docs_by_id, iter_json_rows, load_json, save_json, to_qrel_map
+from .evaluation import Evaluator, evaluate_run, load_run
+from .features import FEATURE_NAMES, humor_features_batch
+from .fusion import CandidatePool, build_candidates, weighted_fuse
+from .onnx_backend import InferenceBackend
+from .retriever import HybridTask1Retriever, RankedList, RetrievedDoc, qrels_fingerprint
+
+ProgressFn = Callable[[str, float], None]
+QUERY_BATCH_SIZE = 64
+DEFAULT_FUSION_WEIGHTS = {
+    "lexical": 1.0,
+    "dense": 0.8,
+    "rerank": 1.2,
+    "humor": 1.0,
+    "feature_weights": {
+        "exact_match": 0.1,
+        "token_overlap": 0.12,
+        "char_overlap": 0.1,
+        "doc_len_norm": 0.04,
+        "punct_norm": 0.04,
+        "exclaim_norm": 0.03,
+        "quote_norm": 0.03,
+        "repeated_words_norm": 0.04,
+    },
+}
+
+
+def map_at_k(pred_by_qid: dict[str, list[str]], rel_by_qid: dict[str, set[str]], k: int = 1000) -> float:
+    return Evaluator(rel_by_qid, k=k, cutoffs=()).evaluate(pred_by_qid).mean("map")
+
+
+def split_qrels_by_query(qrels: list[dict], valid_ratio: float = 0.2, seed: int = 13) -> tuple[list[dict], list[dict]]:
+    qids = sorted({str(r["qid"]) for r in qrels})
+    rnd = Random(seed)
+    rnd.shuffle(qids)
+    cut = max(1, int(len(qids) * valid_ratio))
+    valid_qids = set(qids[:cut])
+    train = [r for r in qrels if str(r["qid"]) not in valid_qids]
+    valid = [r for r in qrels if str(r["qid"]) in valid_qids]
+    return train, valid
+
+
+def prediction_rows(run_id: str, manual: int, qid: str, ranked: RankedList | list[RetrievedDoc]) -> list[dict]:
+    """Submission rows of one query's ranking (scores min-max normalized)."""
+    if not isinstance(ranked, RankedList):
+        ranked = RankedList.from_rows(ranked)
+    normalized = ranked.normalized()
+    return [
+        {
+            "run_id": run_id,
+            "manual": int(manual),
+            "qid": qid,
+            "docid": docid,
+            "rank": rank,
+            "score": round(score, 6),
+        }
+        for rank, (docid, score) in enumerate(zip(normalized.docid_list(), normalized.scores.tolist()), start=1)
+    ]
+
+
+def load_lexical_retriever(
+    docs_path: str,
+    qrels: list[dict] | None = None,
+    params: dict | None = None,
+    index_dir: str | None = None,
+    docs: list[dict] | None = None,
+    progress: ProgressFn | None = None,
+) -> HybridTask1Retriever:
+    """Open the saved lexical index in ``index_dir`` or fit (and save) a new one.
+
+    A saved index is only reused if it was built from the same corpus and,
+    when ``qrels`` are given, the same qrels; otherwise it is refitted and
+    overwritten.
+    """
+    if index_dir and HybridTask1Retriever.index_exists(index_dir):
+        if progress:
+            progress(f"Loading lexical index from {index_dir}", 0.05)
+        retriever = HybridTask1Retriever.load(index_dir, params=params)
+        corpus_hash = corpus_fingerprint(docs if docs is not None else iter_json_rows(docs_path))
+        stale = retriever.stale_reason(corpus_hash, qrels_fingerprint(qrels) if qrels is not None else None)
+        if stale is None:
+            return retriever
+        message = f"{stale}; refitting it."
+        if progress:
+            progress(message, 0.05)
+        else:
+            print(message)
+    retriever = HybridTask1Retriever(**(params or {}))
+    retriever.fit(docs=docs if docs is not None else iter_json_rows(docs_path), qrels=qrels, progress=progress)
+    if index_dir:
+        retriever.save(index_dir)
+    return retriever
+
+
+def seed_candidates(
+    query_text: str,
+    lexical_rows: RankedList,
+    dense_rows: RankedList,
+    doc_map: dict[str, dict],
+    rerank_top_n: int,
+    lexical: HybridTask1Retriever | None = None,
+) -> tuple[CandidatePool, list[tuple[str, str]]]:
+    """Fuse first-stage runs into candidates with features; returns them and the (docid, text) rerank pool.
+
+    ``lexical`` lets the humor features come from its precomputed per-document
+    matrix and postings instead of the document texts.
+    """
+    candidates = build_candidates(lexical_rows, dense_rows)
+    ranked_seed = np.argsort(-candidates.rrf(), kind="stable")
+    candidate_ids = [candidates.docids[i] for i in ranked_seed[: max(rerank_top_n, 100)].tolist()]
+
+    featured = [(docid, str(doc_map[docid]["text"])) for docid in candidate_ids]
+    candidates.set_features(candidate_ids, FEATURE_NAMES, humor_features_batch(lexical, query_text, featured))
+
+    return candidates, featured[:rerank_top_n]
+
+
+def cached_stage(
+    cache: StageCache | None,
+    stage: str,
+    qids: list[str],
+    key_parts: list[dict],
+    compute: Callable[[list[int]], list],
+) -> list:
+    """Per-query stage outputs, served from ``cache`` where possible.
+
+    ``compute`` receives the positions of the cache misses and returns their
+    JSON-serializable outputs in the same order; only those are stored.
+    """
+    if cache is None:
+        return compute(list(range(len(qids))))
+    keys = [cache.key(stage, qid, **parts) for qid, parts in zip(qids, key_parts)]
+    found = cache.get_many(keys)
+    out = [found.get(key) for key in keys]
+    miss = [i for i, key in enumerate(keys) if key not in found]
+    if miss:
+        computed = compute(miss)
+        for i, value in zip(miss, computed):
+            out[i] = value
+        cache.put_many(stage, {keys[i]: (qids[i], value) for i, value in zip(miss, computed)})
+    return out
+
+
+def rows_to_json(rows: RankedList) -> list[list]:
+    return [list(pair) for pair in zip(rows.docid_list(), rows.scores.tolist())]
+
+
+def rows_from_json(rows: list[list]) -> RankedList:
+    return RankedList.from_pairs([docid for docid, _ in rows], (score for _, score in rows))
+
+
+def report_cache_stats(cache: StageCache, progress: ProgressFn | None) -> None:
+    stats = cache.stats()
+    message = f"Stage cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_ratio']:.1%} hit ratio)"
+    if progress:
+        progress(message, 0.95)
+    else:
+        print(message)
+
+
+def open_stage_cache(path: str | None, max_mb: int = 1024) -> StageCache | None:
+    return StageCache(path, max_bytes=max_mb * 1024 * 1024) if path else None
+
+
+def lexical_stage(
+    retriever: HybridTask1Retriever,
+    queries: list[dict],
+    top_k: int,
+    backend: str = "postings",
+    workers: int = 1,
+    cache: StageCache | None = None,
+) -> list[RankedList]:
+    """``rank_many`` over query rows, reusing lexical runs cached for the same index, params and top-k."""
+    texts = [str(q["query"]) for q in queries]
+    if cache is None:
+        return retriever.rank_many(texts, top_k=top_k, backend=backend, workers=workers)
+    fingerprint = retriever.fingerprint()
+    rows = cached_stage(
+        cache,
+        "lexical",
+        [str(q["qid"]) for q in queries],
+        [{"index": fingerprint, "top_k": top_k, "query": text} for text in texts],
+        lambda miss: [
+            rows_to_json(ranked)
+            for ranked in retriever.rank_many([texts[i] for i in miss], top_k=top_k, backend=backend, workers=workers)
+        ],
+    )
+    return [rows_from_json(r) for r in rows]
+
+
+def build_predictions(
+    docs_path: str,
+    queries_path: str,
+    output_path: str,
+    run_id: str,
+    manual: int,
+    qrels_path: str | None = None,
+    top_k: int = 1000,
+    params: dict | None = None,
+    lexical_index_dir: str | None = None,
+    lexical_backend: str = "postings",
+    workers: int = 1,
+    stage_cache_path: str | None = None,
+    stage_cache_max_mb: int = 1024,
+    rankings: dict[str, RankedList] | None = None,
+    progress: ProgressFn | None = None,
+) -> int:
+    """Write lexical predictions to ``output_path`` query batch by query batch; returns the number of rows.
+
+    ``rankings``, when given, also receives each query's ranking by qid, for evaluation without reading the file back.
+    """
+    if progress:
+        progress("Loading input files...", 0.02)
+    queries = load_json(queries_path)
+    qrels = load_json(qrels_path) if qrels_path else None
+
+    retriever = load_lexical_retriever(docs_path, qrels=qrels, params=params, index_dir=lexical_index_dir, progress=progress)
+    stage_cache = open_stage_cache(stage_cache_path, stage_cache_max_mb)
+
+    total_queries = max(1, len(queries))
+    # With a process pool every worker takes a share of the whole query list at once.
+    step = len(queries) if workers > 1 else QUERY_BATCH_SIZE
+    if progress and workers > 1:
+        progress(f"Ranking {len(queries)} queries on {workers} workers...", 0.6)
+    with PredictionWriter(output_path) as writer:
+        for start in range(0, len(queries), max(1, step)):
+            batch = queries[start : start + step]
+            ranked = lexical_stage(retriever, batch, top_k, backend=lexical_backend, workers=workers, cache=stage_cache)
+            for q, rows in zip(batch, ranked):
+                writer.write(prediction_rows(run_id, manual, str(q["qid"]), rows))
+                if rankings is not None:
+                    rankings[str(q["qid"])] = rows
+            done = start + len(batch)
+            if progress:
+                progress(f"Ranking queries: {done}/{total_queries}", 0.6 + 0.3 * (done / total_queries))
+
+    if stage_cache is not None:
+        report_cache_stats(stage_cache, progress)
+        stage_cache.close()
+
+    if progress:
+        progress(f"Saved predictions to {output_path}", 0.96)
+    return writer.count
+
+
+def load_fusion_config(path: str | None) -> dict:
+    if not path:
+        return json.loads(json.dumps(DEFAULT_FUSION_WEIGHTS))
+    data = load_json(path)
+    merged = json.loads(json.dumps(DEFAULT_FUSION_WEIGHTS))
+    for key, value in data.items():
+        if key == "feature_weights" and isinstance(value, dict):
+            merged.setdefault("feature_weights", {}).update(value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def iter_hybrid_candidates(
+    docs: list[dict],
+    queries: list[dict],
+    qrels: list[dict] | None = None,
+    top_k: int = 1000,
+    lexical_params: dict | None = None,
+    lexical_index_dir: str | None = None,
+    lexical_backend: str = "postings",
+    workers: int = 1,
+    dense_model: str = "BAAI/bge-small-en-v1.5",
+    dense_index_dir: str = "artifacts/dense_index",
+    dense_top_k: int = 700,
+    reranker_model: str | None = None,
+    rerank_top_n: int = 200,
+    humor_model_dir: str | None = None,
+    device: str | None = None,
+    batch_size: int = 32,
+    backend: InferenceBackend | None = None,
+    cascade: CascadeConfig | None = None,
+    stage_cache: StageCache | None = None,
+    rerank_cache: PairScoreCache | None = None,
+    report: StageReport | None = None,
+    progress: ProgressFn | None = None,
+) -> Iterator[tuple[dict, CandidatePool]]:
+    """Run every hybrid stage before fusion, yielding each query row with its scored candidates.
+
+    With a ``stage_cache`` the lexical and dense runs and the reranker/humor
+    scores are looked up per query first and only missing ones are computed.
+    A ``cascade`` prunes the rerank pool before the reranker and humor scorer
+    see it; ``report`` collects per-stage latency, pool sizes and recall.
+    """
+    from .dense import DenseRetriever
+
+    doc_map = docs_by_id(docs)
+    backend = backend or InferenceBackend()
+    cascade = cascade or CascadeConfig()
+
+    if progress:
+        progress("Fitting lexical retriever...", 0.02)
+    lexical = load_lexical_retriever(
+        "", qrels=qrels, params=lexical_params, index_dir=lexical_index_dir, docs=docs, progress=progress
+    )
+
+    if progress:
+        progress(f"Loading dense retriever ({dense_model})...", 0.12)
+    dense = DenseRetriever(
+        model_name=dense_model, index_dir=dense_index_dir, device=device, batch_size=batch_size, backend=backend
+    )
+    dense.ensure_ready(docs=docs, progress=progress)
+
+    reranker = None
+    if reranker_model:
+        if progress:
+            progress(f"Loading reranker ({reranker_model})...", 0.18)
+        from .rerank import CrossEncoderReranker
+
+        reranker = CrossEncoderReranker(
+            model_name=reranker_model,
+            device=device,
+            batch_size=max(4, batch_size // 2),
+            score_cache=rerank_cache,
+            backend=backend,
+        )
+
+    cascade_ranker = None
+    if cascade.model and cascade.model_top_n > 0:
+        if progress:
+            progress(f"Loading cascade reranker ({cascade.model})...", 0.2)
+        from .rerank import CrossEncoderReranker
+
+        cascade_ranker = CrossEncoderReranker(
+            model_name=cascade.model,
+            device=device,
+            batch_size=max(4, batch_size // 2),
+            score_cache=rerank_cache,
+            backend=backend,
+        )
+
+    humor_scorer = None
+    if humor_model_dir:
+        if progress:
+            progress(f"Loading humor classifier ({humor_model_dir})...", 0.22)
+        from .humor_classifier import HumorPairScorer
+
+        humor_scorer = HumorPairScorer(model_dir=humor_model_dir, device=device, backend=backend)
+
+    corpus_hash = corpus_fingerprint(docs) if stage_cache is not None else ""
+    dense_key = dense.search_key()
+    dense_k = min(top_k, dense_top_k)
+    total_queries = max(1, len(queries))
+    lexical_all = None
+    if workers > 1:
+        if progress:
+            progress(f"Lexical ranking on {workers} workers...", 0.24)
+        with _timed(report, "first_stage", 0):
+            lexical_all = lexical_stage(lexical, queries, top_k, backend=lexical_backend, workers=workers, cache=stage_cache)
+    for start in range(0, len(queries), QUERY_BATCH_SIZE):
+        batch = queries[start : start + QUERY_BATCH_SIZE]
+        texts = [str(q["query"]) for q in batch]
+        qids = [str(q["qid"]) for q in batch]
+        with _timed(report, "first_stage", len(batch)):
+            if lexical_all is not None:
+                lexical_batch = lexical_all[start : start + QUERY_BATCH_SIZE]
+            else:
+                lexical_batch = lexical_stage(lexical, batch, top_k, backend=lexical_backend, cache=stage_cache)
+            dense_batch = cached_stage(
+                stage_cache,
+                "dense",
+                qids,
+                [
+                    {"corpus": corpus_hash, "model": backend.model_key(dense_model), "top_k": dense_k, "query": text, **dense_key}
+                    for text in texts
+                ],
+                lambda miss: [rows_to_json(rows) for rows in dense.rank_many([texts[i] for i in miss], top_k=dense_k)],
+            )
+            seeds = [
+                seed_candidates(text, lexical_rows, rows_from_json(dense_rows), doc_map, rerank_top_n, lexical)
+                for text, lexical_rows, dense_rows in zip(texts, lexical_batch, dense_batch)
+            ]
+        pools = [rerank_docs for _, rerank_docs in seeds]
+        if report is not None:
+            for qid, (candidates, rerank_docs) in zip(qids, seeds):
+                report.record("first_stage", qid, len(candidates), [docid for docid, _ in rerank_docs])
+
+        if cascade.fast_top_n > 0:
+            fast_weights = cascade.fast_weights or DEFAULT_FUSION_WEIGHTS
+            with _timed(report, "fast", len(batch)):
+                pools = [
+                    prune(
+                        pool,
+                        linear_scores(candidates, [docid for docid, _ in pool], fast_weights),
+                        cascade.fast_top_n,
+                        cascade.fast_margin,
+                        cascade.min_keep,
+                    )
+                    for (candidates, _), pool in zip(seeds, pools)
+                ]
+            if report is not None:
+                for qid, (_, rerank_docs), pool in zip(qids, seeds, pools):
+                    report.record("fast", qid, len(rerank_docs), [docid for docid, _ in pool])
+
+        if cascade_ranker is not None:
+            before = [len(pool) for pool in pools]
+            with _timed(report, "distilled", len(batch)):
+                distilled_batch = cached_stage(
+                    stage_cache,
+                    "distilled",
+                    qids,
+                    [
+                        {"query": text, "docs": content_hash(pool), "model": backend.model_key(cascade.model)}
+                        for text, pool in zip(texts, pools)
+                    ],
+                    lambda miss: [
+                        rows_to_json(rows) for rows in cascade_ranker.rerank_many([texts[i] for i in miss], [pools[i] for i in miss])
+                    ],
+                )
+                pools = [
+                    prune(
+                        [(docid, dict(pool)[docid]) for docid, _ in distilled],
+                        [score for _, score in distilled],
+                        cascade.model_top_n,
+                        cascade.model_margin,
+                        cascade.min_keep,
+                    )
+                    for pool, distilled in zip(pools, distilled_batch)
+                ]
+            if report is not None:
+                for qid, n_in, pool in zip(qids, before, pools):
+                    report.record("distilled", qid, n_in, [docid for docid, _ in pool])
+
+        # Keyed on the (docid, text) pairs, so editing a document's text invalidates its pair scores.
+        pool_keys = [{"query": text, "docs": content_hash(pool)} for text, pool in zip(texts, pools)]
+
+        if reranker:
+            with _timed(report, "rerank", len(batch)):
+                reranked_batch = cached_stage(
+                    stage_cache,
+                    "rerank",
+                    qids,
+                    [dict(parts, model=backend.model_key(reranker_model)) for parts in pool_keys],
+                    lambda miss: [
+                        rows_to_json(rows) for rows in reranker.rerank_many([texts[i] for i in miss], [pools[i] for i in miss])
+                    ],
+                )
+            for (candidates, _), reranked in zip(seeds, reranked_batch):
+                candidates.set_scores("rerank", rows_from_json(reranked))
+
+        if humor_scorer:
+            with _timed(report, "humor", len(batch)):
+                humor_batch = cached_stage(
+                    stage_cache,
+                    "humor",
+                    qids,
+                    [dict(parts, model=backend.model_key(str(humor_model_dir))) for parts in pool_keys],
+                    lambda miss: [
+                        [
+                            float(score)
+                            for score in humor_scorer.score_pairs(
+                                texts[i],
+                                [text for _, text in pools[i]],
+                                batch_size=max(4, batch_size // 2),
+                                docids=[docid for docid, _ in pools[i]],
+                            )
+                        ]
+                        if pools[i]
+                        else []
+                        for i in miss
+                    ],
+                )
+            for (candidates, _), pool, humor_scores in zip(seeds, pools, humor_batch):
+                humor_rows = RankedList.from_pairs([docid for docid, _ in pool], humor_scores)
+                candidates.set_scores("humor", humor_rows)
+
+        for query_row, (candidates, _) in zip(batch, seeds):
+            yield query_row, candidates
+
+        done = start + len(batch)
+        if progress:
+            progress(f"Hybrid ranking queries: {done}/{total_queries}", 0.25 + 0.7 * (done / total_queries))
+
+
+def _timed(report: StageReport | None, stage: str, n_queries: int):
+    return report.timed(stage, n_queries) if report is not None else nullcontext()
+
+
+def build_hybrid_predictions(
+    docs_path: str,
+    queries_path: str,
+    output_path: str,
+    run_id: str,
+    manual: int,
+    qrels_path: str | None = None,
+    top_k: int = 1000,
+    lexical_params: dict | None = None,
+    lexical_index_dir: str | None = None,
+    lexical_backend: str = "postings",
+    workers: int = 1,
+    dense_model: str = "BAAI/bge-small-en-v1.5",
+    dense_index_dir: str = "artifacts/dense_index",
+    dense_top_k: int = 700,
+    reranker_model: str | None = None,
+    rerank_top_n: int = 200,
+    humor_model_dir: str | None = None,
+    device: str | None = None,
+    batch_size: int = 32,
+    backend: InferenceBackend | None = None,
+    cascade: CascadeConfig | None = None,
+    fusion_config_path: str | None = None,
+    stage_cache_path: str | None = None,
+    stage_cache_max_mb: int = 1024,
+    rerank_cache: PairScoreCache | None = None,
+    stage_report_path: str | None = None,
+    rankings: dict[str, RankedList] | None = None,
+    progress: ProgressFn | None = None,
+) -> int:
+    """Write hybrid predictions to ``output_path`` as each query is fused; returns the number of rows.
+
+    ``rankings``, when given, also receives each query's fused ranking by qid.
+    """
+    docs = load_json(docs_path)
+    queries = load_json(queries_path)
+    qrels = load_json(qrels_path) if qrels_path else None
+
+    fusion_weights = load_fusion_config(fusion_config_path)
+    if cascade is not None and cascade.fast_weights is None:
+        cascade = replace(cascade, fast_weights=fusion_weights)
+    stage_cache = open_stage_cache(stage_cache_path, stage_cache_max_mb)
+    report = StageReport(to_qrel_map(qrels) if qrels else None)
+    with PredictionWriter(output_path) as writer:
+        for query_row, candidates in iter_hybrid_candidates(
+            docs,
+            queries,
+            qrels,
+            top_k=top_k,
+            lexical_params=lexical_params,
+            lexical_index_dir=lexical_index_dir,
+            lexical_backend=lexical_backend,
+            workers=workers,
+            dense_model=dense_model,
+            dense_index_dir=dense_index_dir,
+            dense_top_k=dense_top_k,
+            reranker_model=reranker_model,
+            rerank_top_n=rerank_top_n,
+            humor_model_dir=humor_model_dir,
+            device=device,
+            batch_size=batch_size,
+            backend=backend,
+            cascade=cascade,
+            stage_cache=stage_cache,
+            rerank_cache=rerank_cache,
+            report=report,
+            progress=progress,
+        ):
+            ranked = weighted_fuse(candidates, fusion_weights, top_k=top_k)
+            writer.write(prediction_rows(run_id, manual, str(query_row["qid"]), ranked))
+            if rankings is not None:
+                rankings[str(query_row["qid"])] = ranked
+    if stage_cache is not None:
+        report_cache_stats(stage_cache, progress)
+        stage_cache.close()
+    message = f"Stage timings:\n{report.format()}"
+    if progress:
+        progress(message, 0.96)
+    else:
+        print(message)
+    if stage_report_path:
+        save_json(report.summary(), stage_report_path)
+
+    if progress:
+        progress(f"Saved hybrid predictions to {output_path}", 0.98)
+    return writer.count
+
+
+def average_precision(scores: np.ndarray, ords: np.ndarray, rel_mask: np.ndarray, n_rel: int, top_k: int) -> float:
+    """AP@k of the ranking ``rank`` would return for these candidate scores (ties in corpus order)."""
+    scores = np.where(scores > 0.0, scores, -np.inf)
+    n = len(scores)
+    if n > top_k:
+        kth = np.partition(scores, n - top_k)[n - top_k]
+        pool = np.flatnonzero((scores >= kth) & np.isfinite(scores))
+    else:
+        pool = np.flatnonzero(np.isfinite(scores))
+    order = pool[np.lexsort((ords[pool], -scores[pool]))][:top_k]
+    hit_count = 0
+    precision_sum = 0.0
+    for i in (np.flatnonzero(rel_mask[order]) + 1).tolist():
+        hit_count += 1
+        precision_sum += hit_count / i
+    return precision_sum / n_rel
+
+
+def tune_params(
+    docs: list[dict],
+    queries: list[dict],
+    qrels: list[dict],
+    top_k: int = 1000,
+    progress: ProgressFn | None = None,
+) -> tuple[dict, float]:
+    """Grid-search the lexical parameters on a query holdout.
+
+    The corpus is fitted once: only ``k1``/``b`` change BM25 and the other
+    parameters are linear weights, so each holdout query's component scores are
+    computed once (BM25 once per ``(k1, b)``) and every weight combination is
+    scored as one vectorized linear combination. Scores match ``rank`` exactly.
+    """
+    train_qrels, valid_qrels = split_qrels_by_query(qrels)
+
+    qtext = {str(q["qid"]): str(q["query"]) for q in queries}
+    valid_rel = {qid: rel_set for qid, rel_set in to_qrel_map(valid_qrels).items() if rel_set}
+
+    grid = {
+        "k1": [1.2, 1.5, 1.8],
+        "b": [0.6, 0.75, 0.9],
+        "char_weight": [0.2, 0.35, 0.5],
+        "humor_weight": [0.1, 0.2, 0.4],
+        "match_boost": [0.05, 0.1, 0.2],
+    }
+
+    retriever = HybridTask1Retriever()
+    retriever.fit(docs=docs, qrels=train_qrels)
+
+    holdout = []
+    for qid, rel_set in valid_rel.items():
+        query = qtext.get(qid, "")
+        ords = retriever.candidate_ordinals(query)
+        rel_mask = np.asarray([retriever.docids[o] in rel_set for o in ords.tolist()], dtype=bool)
+        fixed = retriever.component_scores(query, ords, ("char", "humor", "exact"))
+        holdout.append((query, ords, rel_mask, len(rel_set), fixed))
+
+    keys = list(grid.keys())
+    weight_combos = list(itertools.product(grid["char_weight"], grid["humor_weight"], grid["match_boost"]))
+    weights = np.asarray(weight_combos, dtype=np.float64)
+    char_w, humor_w, match_w = weights[:, 0:1], weights[:, 1:2], weights[:, 2:3]
+    bm25_pairs = list(itertools.product(grid["k1"], grid["b"]))
+
+    best_params: dict = {}
+    best_map = -1.0
+    total = len(bm25_pairs) * len(weight_combos)
+
+    for i, (k1, b) in enumerate(bm25_pairs, start=1):
+        retriever.k1, retriever.b = k1, b
+        aps: list[list[float]] = [[] for _ in weight_combos]
+        for query, ords, rel_mask, n_rel, fixed in holdout:
+            bm25 = retriever.component_scores(query, ords, ("bm25",))["bm25"]
+            scores = (
+                retriever.bm25_weight * bm25[None, :]
+                + char_w * fixed["char"][None, :]
+                + humor_w * fixed["humor"][None, :]
+                + match_w * fixed["exact"][None, :]
+            )
+            for row, combo_aps in enumerate(aps):
+                combo_aps.append(average_precision(scores[row], ords, rel_mask, n_rel, top_k))
+
+        for vals, combo_aps in zip(weight_combos, aps):
+            score = sum(combo_aps) / len(combo_aps) if combo_aps else 0.0
+            if score > best_map:
+                best_map = score
+                best_params = dict(zip(keys, (k1, b, *vals)))
+
+        if progress:
+            progress(f"Auto-tune grid search: {i * len(weight_combos)}/{total}", 0.05 + 0.45 * (i / len(bm25_pairs)))
+
+    return best_params, best_map
+
+
+def evaluate_predictions_file(predictions_path: str, qrels_path: str, k: int) -> float:
+    return evaluate_run(load_run(predictions_path), to_qrel_map(load_json(qrels_path)), k=k, cutoffs=()).mean("map")
@@ -1,50 +1,159 @@
 from __future__ import annotations
 
-from .retriever import RetrievedDoc
+from .cache import PairScoreCache
+from .onnx_backend import InferenceBackend
+from .retriever import RankedList
 
 
 class CrossEncoderReranker:
-    def __init__(self, model_name: str, device: str | None = None, batch_size: int = 8):
+    def __init__(
+        self,
+        model_name: str,
+        device: str | None = None,
+        batch_size: int = 8,
+        score_cache: PairScoreCache | None = None,
+        backend: InferenceBackend | None = None,
+    ):
         self.model_name = model_name
         self.device = device
         self.batch_size = batch_size
+        self.score_cache = score_cache
+        self.backend = backend or InferenceBackend()
         self._model = None
 
     def _load_model(self):
         if self._model is None:
-            from sentence_transformers import CrossEncoder
-
-            kwargs = {}
-            if self.device:
-                kwargs["device"] = self.device
-            self._model = CrossEncoder(self.model_name, **kwargs)
-            tokenizer = getattr(self._model, "tokenizer", None)
-            model = getattr(self._model, "model", None)
-            if tokenizer is not None and tokenizer.pad_token is None:
-                if tokenizer.eos_token is not None:
-                    tokenizer.pad_token = tokenizer.eos_token
-                elif tokenizer.sep_token is not None:
-                    tokenizer.pad_token = tokenizer.sep_token
-                elif tokenizer.cls_token is not None:
-                    tokenizer.pad_token = tokenizer.cls_token
-                elif tokenizer.unk_token is not None:
-                    tokenizer.pad_token = tokenizer.unk_token
-            if tokenizer is not None and model is not None and getattr(model.config, "pad_token_id", None) is None:
-                if getattr(tokenizer, "pad_token_id", None) is not None:
-                    model.config.pad_token_id = tokenizer.pad_token_id
+            if self.backend.is_onnx:
+                from .onnx_backend import load_pair_scorer
+
+                self._model = load_pair_scorer("rerank", self.model_name, self.backend, self._export_source)
+            else:
+                self._model = self._load_torch_model()
         return self._model
 
-    def score_pairs(self, query: str, docs: list[str]) -> list[float]:
-        if not docs:
+    def _export_source(self):
+        """Pieces ``load_pair_scorer`` needs to export and parity-check the PyTorch cross-encoder."""
+        cross_encoder = self._load_torch_model()
+        activation_name = "sigmoid" if type(_activation(cross_encoder)).__name__ == "Sigmoid" else "identity"
+        max_length = int(getattr(cross_encoder, "max_length", None) or 512)
+
+        def reference(pairs: list[tuple[str, str]]):
+            return cross_encoder.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+
+        return cross_encoder.model, cross_encoder.tokenizer, max_length, activation_name, reference
+
+    def _load_torch_model(self):
+        from sentence_transformers import CrossEncoder
+
+        kwargs = {}
+        if self.device:
+            kwargs["device"] = self.device
+        cross_encoder = CrossEncoder(self.model_name, **kwargs)
+        tokenizer = getattr(cross_encoder, "tokenizer", None)
+        model = getattr(cross_encoder, "model", None)
+        if tokenizer is not None and tokenizer.pad_token is None:
+            if tokenizer.eos_token is not None:
+                tokenizer.pad_token = tokenizer.eos_token
+            elif tokenizer.sep_token is not None:
+                tokenizer.pad_token = tokenizer.sep_token
+            elif tokenizer.cls_token is not None:
+                tokenizer.pad_token = tokenizer.cls_token
+            elif tokenizer.unk_token is not None:
+                tokenizer.pad_token = tokenizer.unk_token
+        if tokenizer is not None and model is not None and getattr(model.config, "pad_token_id", None) is None:
+            if getattr(tokenizer, "pad_token_id", None) is not None:
+                model.config.pad_token_id = tokenizer.pad_token_id
+        return cross_encoder
+
+    def _predict(self, pairs: list[tuple[str, str, str]]) -> list[float]:
+        """Scores of (query, docid, doc text) pairs.
+
+        Pair encodings come from the process-wide ``PairTokenizer`` of the
+        model's tokenizer, so document token ids are reused across queries and
+        with any other scorer sharing the tokenizer.
+        """
+        if not pairs:
             return []
         model = self._load_model()
-        pairs = [(query, doc) for doc in docs]
-        scores = model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
-        return [float(score) for score in scores]
-
-    def rerank(self, query: str, docs: list[tuple[str, str]], top_k: int | None = None) -> list[RetrievedDoc]:
-        texts = [text for _, text in docs]
-        scores = self.score_pairs(query, texts)
-        rows = [RetrievedDoc(docid=docid, score=score) for (docid, _), score in zip(docs, scores)]
-        rows.sort(key=lambda row: row.score, reverse=True)
-        return rows if top_k is None else rows[:top_k]
+        tokenizer = getattr(model, "tokenizer", None)
+        if tokenizer is None:
+            scores = model.predict([(query, text) for query, _, text in pairs], batch_size=self.batch_size, show_progress_bar=False)
+            return [float(score) for score in scores]
+        from .pair_tokens import shared_pair_tokenizer
+
+        tokens = shared_pair_tokenizer(tokenizer)
+        max_length = int(getattr(model, "max_length", None) or tokenizer.model_max_length)
+        tokens.warm([(docid, text) for _, docid, text in pairs])
+        scores: list[float] = []
+        for start in range(0, len(pairs), self.batch_size):
+            features = tokens.encode(pairs[start : start + self.batch_size], max_length)
+            if hasattr(model, "predict_features"):
+                batch_scores = model.predict_features(features)
+            else:
+                batch_scores = _torch_scores(model, features)
+            scores.extend(float(score) for score in batch_scores)
+        return scores
+
+    def score_pairs(self, query: str, docs: list[str]) -> list[float]:
+        return self._predict([(query, "", doc) for doc in docs])
+
+    def score_pairs_many(self, queries: list[str], docs: list[list[str]]) -> list[list[float]]:
+        """Score every (query, doc) pair of a query batch in one pass."""
+        return self._split(self._predict([(query, "", doc) for query, query_docs in zip(queries, docs) for doc in query_docs]), docs)
+
+    @staticmethod
+    def _split(flat: list[float], docs: list[list]) -> list[list[float]]:
+        out: list[list[float]] = []
+        start = 0
+        for query_docs in docs:
+            out.append(flat[start : start + len(query_docs)])
+            start += len(query_docs)
+        return out
+
+    def _cached_scores(self, queries: list[str], docs: list[list[tuple[str, str]]]) -> list[list[float]]:
+        """Scores of (docid, text) candidates; only pairs missing from ``score_cache`` reach the model."""
+        pairs = [(query, docid, text) for query, query_docs in zip(queries, docs) for docid, text in query_docs]
+        if self.score_cache is None:
+            return self._split(self._predict(pairs), docs)
+        keys = [PairScoreCache.pair_key(self.backend.model_key(self.model_name), query, docid, text) for query, docid, text in pairs]
+        found = self.score_cache.get_many(keys)
+        miss = [i for i in range(len(pairs)) if i not in found]
+        if miss:
+            scored = self._predict([pairs[i] for i in miss])
+            found.update(zip(miss, scored))
+            self.score_cache.put_many([keys[i] for i in miss], scored)
+        return self._split([found[i] for i in range(len(pairs))], docs)
+
+    @staticmethod
+    def _ranked(docs: list[tuple[str, str]], scores: list[float], top_k: int | None) -> RankedList:
+        return RankedList.from_pairs([docid for docid, _ in docs], scores).sorted(top_k)
+
+    def rerank(self, query: str, docs: list[tuple[str, str]], top_k: int | None = None) -> RankedList:
+        return self._ranked(docs, self._cached_scores([query], [docs])[0], top_k)
+
+    def rerank_many(
+        self, queries: list[str], docs: list[list[tuple[str, str]]], top_k: int | None = None
+    ) -> list[RankedList]:
+        """Batch form of ``rerank``: ``docs[i]`` holds the (docid, text) candidates of ``queries[i]``."""
+        scores = self._cached_scores(queries, docs)
+        return [self._ranked(query_docs, query_scores, top_k) for query_docs, query_scores in zip(docs, scores)]
+
+
+def _activation(cross_encoder):
+    """The score activation ``CrossEncoder.predict`` applies (attribute name varies across sentence-transformers versions)."""
+    return getattr(cross_encoder, "activation_fn", None) or getattr(cross_encoder, "default_activation_function", None)
+
+
+def _torch_scores(cross_encoder, features: dict) -> list[float]:
+    """``CrossEncoder.predict`` for one pre-encoded batch of a single-label model."""
+    import torch
+
+    model = cross_encoder.model
+    device = next(model.parameters()).device
+    model.eval()
+    with torch.inference_mode():
+        logits = model(**{name: torch.from_numpy(value).to(device) for name, value in features.items()}).logits
+        activation = _activation(cross_encoder)
+        if activation is not None:
+            logits = activation(logits)
+    return logits[:, 0].float().cpu().tolist()
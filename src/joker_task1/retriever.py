@@ -1,13 +1,44 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import math
 import re
-from collections import Counter, defaultdict
+import tempfile
+from bisect import bisect_left
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
-from typing import Callable, Iterable
+from itertools import repeat
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Sequence
+
+import numpy as np
 
 TOKEN_RE = re.compile(r"\b\w+\b", flags=re.UNICODE)
 ProgressFn = Callable[[str, float], None]
+_EMPTY_ORDS = np.zeros(0, dtype=np.int64)
+LEXICAL_INDEX_FORMAT = 1
+_INDEX_ARRAYS = (
+    "doc_lens",
+    "humor_prior",
+    "idf",
+    "term_ptr",
+    "term_docs",
+    "term_tfs",
+    "term_max_tf",
+    "term_min_dl",
+    "char_idf",
+    "char_ptr",
+    "char_docs",
+    "char_weights",
+    "char_max_weight",
+    "char_doc_norm",
+)
+# String tables and their key -> id lookup ("hash", "sorted" or None).
+_INDEX_TABLES = {"docids": "hash", "doc_text_lower": None, "vocab": "sorted", "char_vocab": "sorted"}
+# Per-document humor feature matrix; indexes saved before it existed load without one.
+_DOC_FEATURES_FILE = "doc_features.npy"
 
 
 @dataclass(frozen=True)
@@ -16,8 +47,239 @@ class RetrievedDoc:
     score: float
 
 
+def min_max(scores: np.ndarray) -> np.ndarray:
+    """Scores scaled to [0, 1]; all 1.0 when they are equal."""
+    scores = np.asarray(scores, dtype=np.float64)
+    if not len(scores):
+        return scores
+    lo, hi = scores.min(), scores.max()
+    if hi == lo:
+        return np.ones(len(scores), dtype=np.float64)
+    return (scores - lo) / (hi - lo)
+
+
+class RankedList(Sequence):
+    """One ranking as parallel arrays, best first.
+
+    ``ords`` index into ``docids`` (the retriever's docid table, or a plain
+    list) and ``scores`` hold the matching float64 scores. Indexing or
+    iterating yields ``RetrievedDoc`` objects, so code written against
+    ``list[RetrievedDoc]`` keeps working; slices and ``normalized`` share the
+    docid table and ordinals instead of building new objects.
+    """
+
+    __slots__ = ("docids", "ords", "scores")
+
+    def __init__(self, docids: Sequence[str], ords: np.ndarray, scores: np.ndarray):
+        self.docids = docids
+        self.ords = np.asarray(ords, dtype=np.int64)
+        self.scores = np.asarray(scores, dtype=np.float64)
+
+    @classmethod
+    def from_pairs(cls, docids: list[str], scores: Iterable[float]) -> RankedList:
+        """Ranking of ``docids`` in the given order with their ``scores``."""
+        return cls(docids, np.arange(len(docids), dtype=np.int64), np.fromiter(scores, dtype=np.float64, count=len(docids)))
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[RetrievedDoc]) -> RankedList:
+        rows = list(rows)
+        return cls.from_pairs([row.docid for row in rows], (row.score for row in rows))
+
+    def __len__(self) -> int:
+        return len(self.ords)
+
+    def __getitem__(self, i):
+        if isinstance(i, (slice, np.ndarray)):
+            return RankedList(self.docids, self.ords[i], self.scores[i])
+        return RetrievedDoc(docid=self.docids[int(self.ords[i])], score=float(self.scores[i]))
+
+    def __iter__(self) -> Iterator[RetrievedDoc]:
+        for docid, score in zip(self.docid_list(), self.scores.tolist()):
+            yield RetrievedDoc(docid=docid, score=score)
+
+    def __repr__(self) -> str:
+        return f"RankedList({len(self)} docs)"
+
+    def docid_list(self) -> list[str]:
+        return [self.docids[o] for o in self.ords.tolist()]
+
+    def rows(self) -> list[RetrievedDoc]:
+        """The ranking as ``RetrievedDoc`` objects."""
+        return list(self)
+
+    def normalized(self) -> RankedList:
+        """Same ranking with min-max normalized scores."""
+        return RankedList(self.docids, self.ords, min_max(self.scores))
+
+    def sorted(self, top_k: int | None = None) -> RankedList:
+        """The (``top_k``) best by score, ties in current order."""
+        order = np.argsort(-self.scores, kind="stable")
+        return self[order if top_k is None else order[:top_k]]
+
+
+def _positive_docids(qrels: Iterable[dict]) -> set[str]:
+    return {str(r["docid"]) for r in qrels if int(r.get("qrel", 0)) > 0}
+
+
+def qrels_fingerprint(qrels: Iterable[dict] | None) -> str:
+    """SHA-1 of the docids with a positive qrel, the only part of the qrels ``fit`` uses."""
+    docids = sorted(_positive_docids(qrels)) if qrels else []
+    return hashlib.sha1("\0".join(docids).encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class _QueryTerms:
+    """Query resolved against the fitted vocabularies."""
+
+    text_lower: str
+    term_ids: list[int]
+    gram_ids: list[int]
+    gram_weights: list[float]
+    gram_norm: float
+    has_grams: bool
+
+
+def save_array(path: Path, arr: np.ndarray) -> None:
+    """``np.save`` through a temporary file, so processes that memory-map ``path`` keep reading the old data."""
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as fh:
+        np.save(fh, arr)
+    tmp.replace(path)
+
+
+def _key_hash(encoded: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(encoded, digest_size=8).digest(), "little")
+
+
+class StringTable:
+    """Read-only UTF-8 strings packed into one byte blob plus an offsets array.
+
+    ``table[i]`` returns the i-th string. ``get(key)`` finds the id of
+    ``key`` through an optional lookup index, so a memory-mapped table needs
+    no Python dict at load time: ``hash_slots`` is an open-addressing table
+    (linear probing over 64-bit BLAKE2b key hashes, -1 for empty slots) with
+    O(1) lookups; ``sorted_ids`` (ids ordered by their UTF-8 bytes) is
+    searched by bisection.
+    """
+
+    def __init__(
+        self,
+        blob: np.ndarray,
+        offsets: np.ndarray,
+        sorted_ids: np.ndarray | None = None,
+        hash_slots: np.ndarray | None = None,
+    ):
+        self.blob = blob
+        self.offsets = offsets
+        self.sorted_ids = sorted_ids
+        self.hash_slots = hash_slots
+
+    @classmethod
+    def from_strings(cls, strings: Iterable[str], *, sortable: bool = False, hashed: bool = False) -> "StringTable":
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        sorted_ids = np.asarray(sorted(range(len(encoded)), key=encoded.__getitem__), dtype=np.int64) if sortable else None
+        hash_slots = cls._hash_slots([_key_hash(e) for e in encoded]) if hashed else None
+        return cls(blob, offsets, sorted_ids, hash_slots)
+
+    @staticmethod
+    def _hash_slots(hashes: list[int]) -> np.ndarray:
+        """Place ids into a power-of-two slot array (load <= 0.5) by vectorized linear probing."""
+        n_slots = 1 << max(1, (2 * len(hashes) - 1).bit_length())
+        slots = np.full(n_slots, -1, dtype=np.int64)
+        ids = np.arange(len(hashes), dtype=np.int64)
+        pos = (np.asarray(hashes, dtype=np.uint64) & np.uint64(n_slots - 1)).astype(np.int64)
+        while len(ids):
+            free = slots[pos] < 0
+            # Among ids probing the same free slot, the lowest id claims it.
+            cand_pos, first = np.unique(pos[free], return_index=True)
+            slots[cand_pos] = ids[free][first]
+            placed = np.zeros(len(ids), dtype=bool)
+            placed[np.flatnonzero(free)[first]] = True
+            ids, pos = ids[~placed], (pos[~placed] + 1) & (n_slots - 1)
+        return slots
+
+    def save(self, root: Path, name: str) -> None:
+        save_array(root / f"{name}.blob.npy", self.blob)
+        save_array(root / f"{name}.offsets.npy", self.offsets)
+        for suffix, arr in (("sorted", self.sorted_ids), ("hash", self.hash_slots)):
+            if arr is not None:
+                save_array(root / f"{name}.{suffix}.npy", arr)
+            else:
+                (root / f"{name}.{suffix}.npy").unlink(missing_ok=True)
+
+    @staticmethod
+    def exists(root: Path, name: str) -> bool:
+        return (root / f"{name}.offsets.npy").exists() and (root / f"{name}.blob.npy").exists()
+
+    @classmethod
+    def load(cls, root: Path, name: str, mmap_mode: str | None = "r") -> "StringTable":
+        sorted_path = root / f"{name}.sorted.npy"
+        hash_path = root / f"{name}.hash.npy"
+        return cls(
+            np.load(root / f"{name}.blob.npy", mmap_mode=mmap_mode),
+            np.load(root / f"{name}.offsets.npy", mmap_mode=mmap_mode),
+            np.load(sorted_path, mmap_mode=mmap_mode) if sorted_path.exists() else None,
+            np.load(hash_path, mmap_mode=mmap_mode) if hash_path.exists() else None,
+        )
+
+    def _bytes(self, i: int) -> bytes:
+        return self.blob[self.offsets[i] : self.offsets[i + 1]].tobytes()
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self._bytes(i).decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def get(self, key: str, default: int | None = None) -> int | None:
+        encoded = key.encode("utf-8")
+        if self.hash_slots is not None:
+            mask = len(self.hash_slots) - 1
+            pos = _key_hash(encoded) & mask
+            while (i := int(self.hash_slots[pos])) >= 0:
+                if self._bytes(i) == encoded:
+                    return i
+                pos = (pos + 1) & mask
+            return default
+        if self.sorted_ids is None:
+            raise TypeError("StringTable was built without a lookup index")
+        pos = bisect_left(self.sorted_ids, encoded, key=self._bytes)
+        if pos < len(self.sorted_ids) and self._bytes(self.sorted_ids[pos]) == encoded:
+            return int(self.sorted_ids[pos])
+        return default
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+
+def _build_postings(
+    keys: list[int], doc_ords: list[int], values: np.ndarray, n_keys: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Group (key, doc, value) triples into CSR postings sorted by doc ordinal."""
+    key_arr = np.asarray(keys, dtype=np.int64)
+    order = np.argsort(key_arr, kind="stable")
+    ptr = np.zeros(n_keys + 1, dtype=np.int64)
+    np.cumsum(np.bincount(key_arr, minlength=n_keys), out=ptr[1:])
+    docs = np.asarray(doc_ords, dtype=np.int32)[order]
+    return ptr, docs, values[order]
+
+
 class HybridTask1Retriever:
-    """Efficient lexical retriever for JOKER Task 1."""
+    """Efficient lexical retriever for JOKER Task 1.
+
+    ``fit`` builds term and char n-gram postings (CSR arrays keyed by
+    vocabulary ordinal, doc ordinals ascending). ``rank`` only scores documents
+    that appear in the postings of a query term or gram, the humor prior or
+    the exact-match set, and stops early with a MaxScore cutoff once no
+    unseen document can reach the current top-k.
+    """
 
     def __init__(
         self,
@@ -35,18 +297,34 @@ class HybridTask1Retriever:
         self.humor_weight = humor_weight
         self.match_boost = match_boost
 
-        self.doc_text_lower: dict[str, str] = {}
-        self.term_freqs: dict[str, Counter[str]] = {}
-        self.doc_lens: dict[str, int] = {}
-        self.df: defaultdict[str, int] = defaultdict(int)
-        self.idf: dict[str, float] = {}
+        self.docids: list[str] | StringTable = []
+        self.doc_index: dict[str, int] | StringTable = {}
+        self.doc_text_lower: list[str] | StringTable = []
+        self.doc_lens = np.zeros(0, dtype=np.int32)
         self.avgdl: float = 0.0
-        self.humor_prior: dict[str, float] = defaultdict(float)
-
-        self.char_tf: dict[str, Counter[str]] = {}
-        self.char_df: defaultdict[str, int] = defaultdict(int)
-        self.char_idf: dict[str, float] = {}
-        self.char_doc_norm: dict[str, float] = {}
+        self.humor_prior = np.zeros(0, dtype=np.float64)
+
+        self.vocab: dict[str, int] | StringTable = {}
+        self.idf = np.zeros(0, dtype=np.float64)
+        self.term_ptr = np.zeros(1, dtype=np.int64)
+        self.term_docs = np.zeros(0, dtype=np.int32)
+        self.term_tfs = np.zeros(0, dtype=np.int32)
+        self.term_max_tf = np.zeros(0, dtype=np.int32)
+        self.term_min_dl = np.zeros(0, dtype=np.int32)
+
+        self.char_vocab: dict[str, int] | StringTable = {}
+        self.char_idf = np.zeros(0, dtype=np.float64)
+        self.char_ptr = np.zeros(1, dtype=np.int64)
+        self.char_docs = np.zeros(0, dtype=np.int32)
+        self.char_weights = np.zeros(0, dtype=np.float32)
+        self.char_max_weight = np.zeros(0, dtype=np.float32)
+        self.char_doc_norm = np.zeros(0, dtype=np.float64)
+        self.doc_features = np.zeros((0, 0), dtype=np.float64)
+        # Fingerprints of the corpus and the qrels the index was fitted on ("" for indexes saved without them).
+        self.corpus_hash = ""
+        self.qrels_hash = ""
+        self.index_dir: Path | None = None
+        self._sparse_scorer = None
 
     @staticmethod
     def tokenize(text: str) -> list[str]:
@@ -64,121 +342,508 @@ class HybridTask1Retriever:
             grams.extend(t[i : i + n] for i in range(len(t) - n + 1))
         return grams
 
+    @property
+    def n_docs(self) -> int:
+        return len(self.docids)
+
     def fit(self, docs: Iterable[dict], qrels: Iterable[dict] | None = None, progress: ProgressFn | None = None) -> None:
-        docs = list(docs)
+        """Index ``docs`` in one pass; any iterable of rows works, e.g. ``iter_json_rows`` over the corpus file."""
+        from .features import doc_feature_values
+
         total_len = 0
-        total_docs = max(1, len(docs))
+        total_docs = len(docs) if hasattr(docs, "__len__") else 0
+
+        self.docids = []
+        self.doc_index = {}
+        self.doc_text_lower = []
+        self.vocab = {}
+        self.char_vocab = {}
+        self.index_dir = None
+        self._sparse_scorer = None
+        doc_lens: list[int] = []
+        term_keys: list[int] = []
+        term_doc_ords: list[int] = []
+        term_tfs: list[int] = []
+        gram_keys: list[int] = []
+        gram_doc_ords: list[int] = []
+        gram_tfs: list[int] = []
+        doc_features: list[tuple[float, ...]] = []
+        corpus_hash = hashlib.sha1()
 
         for i, d in enumerate(docs, start=1):
             docid = str(d["docid"])
             text = str(d["text"])
+            corpus_hash.update(f"{docid}\0{text}\0".encode("utf-8"))
             text_lower = text.lower()
-            self.doc_text_lower[docid] = text_lower
+            ordinal = len(self.docids)
+            self.docids.append(docid)
+            self.doc_index[docid] = ordinal
+            self.doc_text_lower.append(text_lower)
 
             tok = self.tokenize(text)
             tf = Counter(tok)
-            self.term_freqs[docid] = tf
-            self.doc_lens[docid] = len(tok)
+            doc_lens.append(len(tok))
             total_len += len(tok)
-            for t in tf:
-                self.df[t] += 1
+            doc_features.append(doc_feature_values(text, tok, tf))
+            for t, c in tf.items():
+                term_keys.append(self.vocab.setdefault(t, len(self.vocab)))
+                term_doc_ords.append(ordinal)
+                term_tfs.append(c)
 
             ctf = Counter(self.char_ngrams(text_lower))
-            self.char_tf[docid] = ctf
-            for g in ctf:
-                self.char_df[g] += 1
+            for g, c in ctf.items():
+                gram_keys.append(self.char_vocab.setdefault(g, len(self.char_vocab)))
+                gram_doc_ords.append(ordinal)
+                gram_tfs.append(c)
 
             if progress and (i % 2000 == 0 or i == total_docs):
-                progress(f"Indexed documents: {i}/{total_docs}", 0.4 * (i / total_docs))
+                if total_docs:
+                    progress(f"Indexed documents: {i}/{total_docs}", 0.4 * (i / total_docs))
+                else:
+                    progress(f"Indexed documents: {i}", 0.2)
 
-        n_docs = max(1, len(self.term_freqs))
+        n_docs = max(1, len(self.docids))
         self.avgdl = total_len / n_docs
-
-        for term, df in self.df.items():
-            self.idf[term] = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
-
-        for gram, df in self.char_df.items():
-            self.char_idf[gram] = math.log(1 + n_docs / (1 + df))
-
-        total_tf = max(1, len(self.char_tf))
-        for i, (docid, ctf) in enumerate(self.char_tf.items(), start=1):
-            norm2 = 0.0
-            for gram, tf in ctf.items():
-                w = (1.0 + math.log(tf)) * self.char_idf.get(gram, 0.0)
-                norm2 += w * w
-            self.char_doc_norm[docid] = math.sqrt(norm2) if norm2 > 0 else 1.0
-            if progress and (i % 2000 == 0 or i == total_tf):
-                progress(f"Computed vector norms: {i}/{total_tf}", 0.4 + 0.2 * (i / total_tf))
-
+        self.doc_lens = np.asarray(doc_lens, dtype=np.int32)
+        self.doc_features = np.asarray(doc_features, dtype=np.float64).reshape(len(doc_lens), -1)
+
+        self.term_ptr, self.term_docs, self.term_tfs = _build_postings(
+            term_keys, term_doc_ords, np.asarray(term_tfs, dtype=np.int32), len(self.vocab)
+        )
+        term_df = np.diff(self.term_ptr).tolist()
+        self.idf = np.asarray(
+            [math.log(1 + (n_docs - df + 0.5) / (df + 0.5)) for df in term_df], dtype=np.float64
+        )
+        if len(self.vocab):
+            starts = self.term_ptr[:-1]
+            self.term_max_tf = np.maximum.reduceat(self.term_tfs, starts)
+            self.term_min_dl = np.minimum.reduceat(self.doc_lens[self.term_docs], starts)
+        else:
+            self.term_max_tf = np.zeros(0, dtype=np.int32)
+            self.term_min_dl = np.zeros(0, dtype=np.int32)
+
+        gram_key_arr = np.asarray(gram_keys, dtype=np.int64)
+        gram_doc_arr = np.asarray(gram_doc_ords, dtype=np.int64)
+        char_df = np.bincount(gram_key_arr, minlength=len(self.char_vocab)).tolist()
+        self.char_idf = np.asarray([math.log(1 + n_docs / (1 + df)) for df in char_df], dtype=np.float64)
+
+        weights = (1.0 + np.log(np.asarray(gram_tfs, dtype=np.float64))) * self.char_idf[gram_key_arr]
+        norm2 = np.bincount(gram_doc_arr, weights=weights * weights, minlength=len(self.docids))
+        self.char_doc_norm = np.where(norm2 > 0, np.sqrt(norm2), 1.0)
+        if progress:
+            progress(f"Computed vector norms: {len(self.docids)}/{len(self.docids)}", 0.6)
+
+        # Postings carry L2-normalized document weights, so the cosine reduces
+        # to a sparse dot product with the normalized query vector.
+        normalized = (weights / self.char_doc_norm[gram_doc_arr]).astype(np.float32)
+        self.char_ptr, self.char_docs, self.char_weights = _build_postings(
+            gram_keys, gram_doc_ords, normalized, len(self.char_vocab)
+        )
+        if len(self.char_vocab):
+            self.char_max_weight = np.maximum.reduceat(self.char_weights, self.char_ptr[:-1])
+        else:
+            self.char_max_weight = np.zeros(0, dtype=np.float32)
+
+        self.corpus_hash = corpus_hash.hexdigest()
+        self.qrels_hash = qrels_fingerprint(qrels)
+        self.humor_prior = np.zeros(len(self.docids), dtype=np.float64)
         if qrels:
-            positive_ids = {str(r["docid"]) for r in qrels if int(r.get("qrel", 0)) > 0}
-            for docid in self.term_freqs:
-                self.humor_prior[docid] = 1.0 if docid in positive_ids else 0.0
+            for docid in _positive_docids(qrels):
+                ordinal = self.doc_index.get(docid)
+                if ordinal is not None:
+                    self.humor_prior[ordinal] = 1.0
+        # Packed docids with a hashed lookup replace the per-document str list and dict.
+        self.docids = StringTable.from_strings(self.docids, hashed=True)
+        self.doc_index = self.docids
 
         if progress:
             progress("Model fitting complete.", 0.6)
 
-    def bm25(self, query_tokens: list[str], docid: str) -> float:
-        score = 0.0
-        tf_doc = self.term_freqs[docid]
-        dl = self.doc_lens[docid]
-        norm = self.k1 * (1 - self.b + self.b * dl / max(self.avgdl, 1e-9))
-        for t in query_tokens:
-            tf = tf_doc.get(t, 0)
-            if tf:
-                idf = self.idf.get(t, 0.0)
-                score += idf * (tf * (self.k1 + 1)) / (tf + norm)
-        return score
+    @property
+    def params(self) -> dict:
+        return {
+            "k1": self.k1,
+            "b": self.b,
+            "bm25_weight": self.bm25_weight,
+            "char_weight": self.char_weight,
+            "humor_weight": self.humor_weight,
+            "match_boost": self.match_boost,
+        }
+
+    def fingerprint(self) -> str:
+        """SHA-1 of the scoring params and fitted index (corpus texts, docids, lengths, idf tables, humor prior)."""
+        h = hashlib.sha1(json.dumps(self.params, sort_keys=True).encode("utf-8"))
+        if self.corpus_hash:
+            h.update(self.corpus_hash.encode("utf-8"))
+        else:
+            # Indexes saved without a corpus fingerprint: the lowercased texts they keep.
+            for text in self.doc_text_lower:
+                h.update(text.encode("utf-8"))
+                h.update(b"\0")
+        for docid in self.docids:
+            h.update(docid.encode("utf-8"))
+            h.update(b"\0")
+        for arr in (self.doc_lens, self.idf, self.char_idf, self.humor_prior):
+            h.update(np.ascontiguousarray(arr).tobytes())
+        return h.hexdigest()
 
-    def char_tfidf_cosine(self, query_text: str, docid: str) -> float:
+    @staticmethod
+    def index_exists(index_dir: str | Path) -> bool:
+        return (Path(index_dir) / "meta.json").exists()
+
+    def save(self, index_dir: str | Path, progress: ProgressFn | None = None) -> None:
+        """Write the fitted index as .npy arrays and packed string tables."""
+        root = Path(index_dir)
+        root.mkdir(parents=True, exist_ok=True)
+        for name in _INDEX_ARRAYS:
+            save_array(root / f"{name}.npy", np.asarray(getattr(self, name)))
+        save_array(root / _DOC_FEATURES_FILE, np.asarray(self.doc_features))
+        for name, lookup in _INDEX_TABLES.items():
+            table = getattr(self, name)
+            if not isinstance(table, StringTable):
+                table = StringTable.from_strings(table, sortable=lookup == "sorted", hashed=lookup == "hash")
+            table.save(root, name)
+        meta = {
+            "format": LEXICAL_INDEX_FORMAT,
+            "size": self.n_docs,
+            "avgdl": self.avgdl,
+            "params": self.params,
+            "corpus_hash": self.corpus_hash,
+            "qrels_hash": self.qrels_hash,
+        }
+        (root / "meta.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+        self.index_dir = root
+        if progress:
+            progress(f"Lexical index written to {root}", 1.0)
+
+    @classmethod
+    def load(cls, index_dir: str | Path, params: dict | None = None, mmap_mode: str | None = "r") -> "HybridTask1Retriever":
+        """Open an index written by ``save``.
+
+        Arrays are memory-mapped read-only by default, so worker processes
+        loading the same directory share its pages. ``params`` overrides the
+        scoring parameters stored at save time.
+        """
+        root = Path(index_dir)
+        meta = json.loads((root / "meta.json").read_text(encoding="utf-8"))
+        if meta.get("format") != LEXICAL_INDEX_FORMAT:
+            raise ValueError(f"Unsupported lexical index format in {root}: {meta.get('format')}")
+        retriever = cls(**{**meta.get("params", {}), **(params or {})})
+        retriever.avgdl = float(meta["avgdl"])
+        retriever.corpus_hash = str(meta.get("corpus_hash", ""))
+        retriever.qrels_hash = str(meta.get("qrels_hash", ""))
+        for name in _INDEX_ARRAYS:
+            setattr(retriever, name, np.load(root / f"{name}.npy", mmap_mode=mmap_mode))
+        for name in _INDEX_TABLES:
+            setattr(retriever, name, StringTable.load(root, name, mmap_mode=mmap_mode))
+        retriever.doc_index = retriever.docids
+        if (root / _DOC_FEATURES_FILE).exists():
+            retriever.doc_features = np.load(root / _DOC_FEATURES_FILE, mmap_mode=mmap_mode)
+        retriever.index_dir = root
+        return retriever
+
+    def stale_reason(self, corpus_hash: str, qrels_hash: str | None = None) -> str | None:
+        """Why this index does not match the corpus (and qrels, when given) with these fingerprints, or None."""
+        where = f" in {self.index_dir}" if self.index_dir is not None else ""
+        if not self.corpus_hash:
+            return f"Lexical index{where} was saved without a corpus fingerprint"
+        if self.corpus_hash != corpus_hash:
+            return f"Lexical index{where} was built from a different corpus"
+        if qrels_hash is not None and self.qrels_hash != qrels_hash:
+            return f"Lexical index{where} was built with different qrels (humor prior)"
+        return None
+
+    def _term_ids(self, tokens: list[str]) -> list[int]:
+        ids = (self.vocab.get(t) for t in tokens)
+        return [tid for tid in ids if tid is not None]
+
+    def _doc_ordinal(self, docid: str) -> int:
+        ordinal = self.doc_index.get(docid)
+        if ordinal is None:
+            raise KeyError(docid)
+        return ordinal
+
+    def _query_terms(self, query_tokens: list[str], query_text: str) -> _QueryTerms:
+        term_ids = self._term_ids(query_tokens)
         qtf = Counter(self.char_ngrams(query_text))
-        if not qtf:
-            return 0.0
-
-        dot = 0.0
+        gram_ids: list[int] = []
+        gram_weights: list[float] = []
         qnorm2 = 0.0
-        doc_ctf = self.char_tf[docid]
-
         for gram, tfq in qtf.items():
-            idf = self.char_idf.get(gram, 0.0)
-            if idf == 0.0:
+            gid = self.char_vocab.get(gram)
+            if gid is None:
                 continue
-            qw = (1.0 + math.log(tfq)) * idf
+            qw = (1.0 + math.log(tfq)) * float(self.char_idf[gid])
             qnorm2 += qw * qw
+            gram_ids.append(gid)
+            gram_weights.append(qw)
+        return _QueryTerms(
+            text_lower=query_text,
+            term_ids=term_ids,
+            gram_ids=gram_ids,
+            gram_weights=gram_weights,
+            gram_norm=math.sqrt(qnorm2) if qnorm2 > 0 else 1.0,
+            has_grams=bool(qtf),
+        )
 
-            tfd = doc_ctf.get(gram, 0)
-            if tfd:
-                dw = (1.0 + math.log(tfd)) * idf
-                dot += qw * dw
-
-        qnorm = math.sqrt(qnorm2) if qnorm2 > 0 else 1.0
-        dnorm = self.char_doc_norm.get(docid, 1.0)
-        return dot / (qnorm * dnorm) if qnorm > 0 and dnorm > 0 else 0.0
+    @staticmethod
+    def _lookup(ptr: np.ndarray, docs: np.ndarray, key: int, ords: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Locate ``ords`` in the postings of ``key``; returns (positions, present mask)."""
+        lo, hi = int(ptr[key]), int(ptr[key + 1])
+        seg = docs[lo:hi]
+        pos = np.minimum(np.searchsorted(seg, ords), max(hi - lo - 1, 0))
+        return lo + pos, seg[pos] == ords
+
+    def _bm25_scores(self, term_ids: list[int], ords: np.ndarray) -> np.ndarray:
+        score = np.zeros(len(ords), dtype=np.float64)
+        if not term_ids or not len(ords):
+            return score
+        dl = self.doc_lens[ords].astype(np.float64)
+        norm = self.k1 * (1 - self.b + self.b * dl / max(self.avgdl, 1e-9))
+        for tid in term_ids:
+            pos, present = self._lookup(self.term_ptr, self.term_docs, tid, ords)
+            tf = np.where(present, self.term_tfs[pos], 0).astype(np.float64)
+            idf = float(self.idf[tid])
+            contrib = idf * (tf * (self.k1 + 1)) / (tf + norm)
+            score = score + np.where(present, contrib, 0.0)
+        return score
 
-    def rank(self, query: str, top_k: int = 1000) -> list[RetrievedDoc]:
-        q_tokens = self.tokenize(query)
+    def _char_dot(self, q: _QueryTerms) -> tuple[np.ndarray, np.ndarray]:
+        """Cosine of the query gram vector with every document sharing a gram.
+
+        Returns ``(doc ordinals, scores)`` with ordinals ascending.
+        """
+        if not q.gram_ids:
+            return _EMPTY_ORDS, np.zeros(0, dtype=np.float64)
+        starts = self.char_ptr[q.gram_ids]
+        lengths = self.char_ptr[np.asarray(q.gram_ids) + 1] - starts
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(int(lengths.sum()))
+        query_weights = np.repeat(np.asarray(q.gram_weights, dtype=np.float64) / q.gram_norm, lengths)
+        docs, inverse = np.unique(self.char_docs[positions], return_inverse=True)
+        scores = np.bincount(inverse, weights=query_weights * self.char_weights[positions], minlength=len(docs))
+        return docs.astype(np.int64), scores
+
+    def _char_scores(self, q: _QueryTerms, ords: np.ndarray, char_dot: tuple[np.ndarray, np.ndarray] | None = None) -> np.ndarray:
+        docs, scores = char_dot if char_dot is not None else self._char_dot(q)
+        if not len(docs) or not len(ords):
+            return np.zeros(len(ords), dtype=np.float64)
+        pos = np.minimum(np.searchsorted(docs, ords), len(docs) - 1)
+        return np.where(docs[pos] == ords, scores[pos], 0.0)
+
+    def _exact_scores(self, q: _QueryTerms, ords: np.ndarray) -> np.ndarray:
+        q_lower = q.text_lower
+        return np.asarray(
+            [1.0 if q_lower and q_lower in self.doc_text_lower[o] else 0.0 for o in ords.tolist()], dtype=np.float64
+        )
+
+    def _gram_tfs(self, gid: int, ords: np.ndarray) -> np.ndarray:
+        """Raw count of gram ``gid`` in each of ``ords`` (0 where absent).
+
+        Postings only keep the normalized weight ``(1 + log tf) * idf / norm``,
+        which is inverted here; float32 keeps ``log tf`` far inside rounding
+        distance of the integer count.
+        """
+        pos, present = self._lookup(self.char_ptr, self.char_docs, gid, ords)
+        log_tf = self.char_weights[pos].astype(np.float64) * self.char_doc_norm[ords] / float(self.char_idf[gid]) - 1.0
+        return np.where(present, np.rint(np.exp(log_tf)), 0.0)
+
+    def overlap_features(self, query: str, ords: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """``(exact_match, token_overlap, char_overlap)`` of ``query`` with each document in ``ords``.
+
+        Same values as ``features.humor_features``, read from the postings
+        instead of re-tokenizing the documents.
+        """
+        ords = np.asarray(ords, dtype=np.int64)
         q_lower = query.lower()
-        scored: list[RetrievedDoc] = []
-
-        for docid in self.term_freqs:
-            bm25_score = self.bm25(q_tokens, docid)
-            char_score = self.char_tfidf_cosine(q_lower, docid)
-            humor = self.humor_prior.get(docid, 0.0)
-            exact = 1.0 if q_lower and q_lower in self.doc_text_lower[docid] else 0.0
-            score = (
-                self.bm25_weight * bm25_score
-                + self.char_weight * char_score
-                + self.humor_weight * humor
-                + self.match_boost * exact
-            )
-            if score > 0.0:
-                scored.append(RetrievedDoc(docid=docid, score=score))
-
-        scored.sort(key=lambda x: x.score, reverse=True)
-        return scored[:top_k]
+        exact = np.asarray(
+            [1.0 if q_lower and q_lower in self.doc_text_lower[o] else 0.0 for o in ords.tolist()], dtype=np.float64
+        )
+        q_tokens = self.tokenize(query)
+        token_hits = np.zeros(len(ords), dtype=np.float64)
+        for token, count in Counter(q_tokens).items():
+            tid = self.vocab.get(token)
+            if tid is None or not len(ords):
+                continue
+            pos, present = self._lookup(self.term_ptr, self.term_docs, tid, ords)
+            token_hits += np.minimum(np.where(present, self.term_tfs[pos], 0), count)
+        q_grams = Counter(self.char_ngrams(q_lower))
+        gram_hits = np.zeros(len(ords), dtype=np.float64)
+        for gram, count in q_grams.items():
+            gid = self.char_vocab.get(gram)
+            if gid is None or not len(ords):
+                continue
+            gram_hits += np.minimum(self._gram_tfs(gid, ords), count)
+        token_overlap = token_hits / len(q_tokens) if q_tokens else token_hits
+        char_overlap = gram_hits / len(q_grams) if q_grams else gram_hits
+        return exact, token_overlap, char_overlap
+
+    def _score_ordinals(
+        self, q: _QueryTerms, ords: np.ndarray, char_dot: tuple[np.ndarray, np.ndarray] | None = None
+    ) -> np.ndarray:
+        bm25_score = self._bm25_scores(q.term_ids, ords)
+        char_score = self._char_scores(q, ords, char_dot)
+        humor = self.humor_prior[ords]
+        exact = self._exact_scores(q, ords)
+        return (
+            self.bm25_weight * bm25_score
+            + self.char_weight * char_score
+            + self.humor_weight * humor
+            + self.match_boost * exact
+        )
+
+    def candidate_ordinals(self, query: str) -> np.ndarray:
+        """Ordinals (ascending) of every document that can score non-zero on ``query`` for any weights."""
+        q = self._query_terms(self.tokenize(query), query.lower())
+        parts = [self.term_docs[self.term_ptr[tid] : self.term_ptr[tid + 1]] for tid in q.term_ids]
+        parts += [self.char_docs[self.char_ptr[gid] : self.char_ptr[gid + 1]] for gid in q.gram_ids]
+        parts.append(np.flatnonzero(self.humor_prior))
+        if q.text_lower and not q.has_grams:
+            parts.append(np.asarray([o for o, text in enumerate(self.doc_text_lower) if q.text_lower in text], dtype=np.int64))
+        return np.unique(np.concatenate([np.asarray(part, dtype=np.int64) for part in parts]))
+
+    def component_scores(
+        self, query: str, ords: np.ndarray, components: Iterable[str] = ("bm25", "char", "humor", "exact")
+    ) -> dict[str, np.ndarray]:
+        """Unweighted per-signal scores of ``query`` for the documents ``ords``.
+
+        ``rank`` scores a document as ``bm25_weight * bm25 + char_weight * char
+        + humor_weight * humor + match_boost * exact`` over these arrays.
+        """
+        q = self._query_terms(self.tokenize(query), query.lower())
+        out: dict[str, np.ndarray] = {}
+        for name in components:
+            if name == "bm25":
+                out[name] = self._bm25_scores(q.term_ids, ords)
+            elif name == "char":
+                out[name] = self._char_scores(q, ords)
+            elif name == "humor":
+                out[name] = np.asarray(self.humor_prior[ords], dtype=np.float64)
+            elif name == "exact":
+                out[name] = self._exact_scores(q, ords)
+            else:
+                raise ValueError(f"Unknown score component: {name}")
+        return out
+
+    def _candidate_lists(self, q: _QueryTerms) -> list[tuple[np.ndarray, float]]:
+        """Doc ordinal lists that can give a document a non-zero score, with score upper bounds."""
+        lists: list[tuple[np.ndarray, float]] = []
+        min_norm = self.k1 * (1 - self.b)
+        for tid in q.term_ids:
+            max_tf = float(self.term_max_tf[tid])
+            norm = min_norm + self.k1 * self.b * float(self.term_min_dl[tid]) / max(self.avgdl, 1e-9)
+            ub = float(self.idf[tid]) * (max_tf * (self.k1 + 1)) / (max_tf + norm)
+            lists.append((self.term_docs[self.term_ptr[tid] : self.term_ptr[tid + 1]], self.bm25_weight * ub))
+        for gid, qw in zip(q.gram_ids, q.gram_weights):
+            ub = qw / q.gram_norm * float(self.char_max_weight[gid])
+            lists.append((self.char_docs[self.char_ptr[gid] : self.char_ptr[gid + 1]], self.char_weight * ub))
+        if self.humor_weight != 0.0:
+            lists.append((np.flatnonzero(self.humor_prior), self.humor_weight))
+        if q.text_lower and not q.has_grams and self.match_boost != 0.0:
+            # Queries too short for char grams: exact matches are not covered by any postings.
+            exact = [o for o, text in enumerate(self.doc_text_lower) if q.text_lower in text]
+            lists.append((np.asarray(exact, dtype=np.int64), self.match_boost))
+        return lists
+
+    def _top_candidates(self, q: _QueryTerms, top_k: int) -> tuple[np.ndarray, np.ndarray]:
+        lists = self._candidate_lists(q)
+        if not lists:
+            return _EMPTY_ORDS, np.zeros(0, dtype=np.float64)
+        char_dot = self._char_dot(q)
+        can_prune = (
+            min(self.bm25_weight, self.char_weight, self.humor_weight, self.match_boost) >= 0.0
+            and self.k1 > 0.0
+            and 0.0 <= self.b <= 1.0
+            and top_k > 0
+        )
+        if not can_prune:
+            ords = np.unique(np.concatenate([docs for docs, _ in lists]).astype(np.int64))
+            return ords, self._score_ordinals(q, ords, char_dot)
+
+        # MaxScore: visit lists by decreasing upper bound; once the remaining
+        # lists (plus the exact-match boost) cannot lift an unseen document to
+        # the current k-th best score, the unseen documents are skipped.
+        lists.sort(key=lambda item: item[1], reverse=True)
+        remaining = [0.0] * (len(lists) + 1)
+        for i in range(len(lists) - 1, -1, -1):
+            remaining[i] = remaining[i + 1] + lists[i][1]
+        exact_bound = self.match_boost if q.text_lower else 0.0
+
+        seen = _EMPTY_ORDS
+        seen_scores = np.zeros(0, dtype=np.float64)
+        for i, (docs, _) in enumerate(lists):
+            new = np.setdiff1d(docs.astype(np.int64), seen, assume_unique=True)
+            if len(new):
+                seen = np.concatenate([seen, new])
+                seen_scores = np.concatenate([seen_scores, self._score_ordinals(q, new, char_dot)])
+            if i + 1 == len(lists):
+                break
+            positive = seen_scores[seen_scores > 0.0]
+            if len(positive) < top_k:
+                continue
+            theta = -np.partition(-positive, top_k - 1)[top_k - 1]
+            if (remaining[i + 1] + exact_bound) * (1 + 1e-9) + 1e-12 < theta:
+                break
+
+        order = np.argsort(seen, kind="stable")
+        return seen[order], seen_scores[order]
+
+    def bm25(self, query_tokens: list[str], docid: str) -> float:
+        ords = np.asarray([self._doc_ordinal(docid)], dtype=np.int64)
+        return float(self._bm25_scores(self._term_ids(query_tokens), ords)[0])
+
+    def char_tfidf_cosine(self, query_text: str, docid: str) -> float:
+        ords = np.asarray([self._doc_ordinal(docid)], dtype=np.int64)
+        return float(self._char_scores(self._query_terms([], query_text), ords)[0])
+
+    def rank(self, query: str, top_k: int = 1000) -> RankedList:
+        q = self._query_terms(self.tokenize(query), query.lower())
+        ords, scores = self._top_candidates(q, top_k)
+        keep = scores > 0.0
+        ords, scores = ords[keep], scores[keep]
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return RankedList(self.docids, ords[order], scores[order])
+
+    def rank_many(
+        self, queries: list[str], top_k: int = 1000, backend: str = "postings", workers: int = 1
+    ) -> list[RankedList]:
+        """Rank a batch of queries, one postings walk each or as sparse matrix products.
+
+        With ``workers > 1`` the queries are sharded over a process pool whose
+        workers memory-map this index from ``index_dir`` (saved to a temporary
+        directory first if the index only lives in memory).
+        """
+        if workers > 1 and len(queries) > 1:
+            return self._rank_many_parallel(queries, top_k, backend, workers)
+        if backend == "sparse":
+            if self._sparse_scorer is None:
+                from .sparse import SparseLexicalScorer
+
+                self._sparse_scorer = SparseLexicalScorer(self)
+            return self._sparse_scorer.rank_many(queries, top_k=top_k)
+        if backend != "postings":
+            raise ValueError(f"Unknown lexical backend: {backend}")
+        return [self.rank(query, top_k=top_k) for query in queries]
+
+    def _rank_many_parallel(self, queries: list[str], top_k: int, backend: str, workers: int) -> list[RankedList]:
+        n_shards = min(len(queries), workers * 4)
+        size = -(-len(queries) // n_shards)
+        shards = [queries[i : i + size] for i in range(0, len(queries), size)]
+        with tempfile.TemporaryDirectory(prefix="joker_lexical_") as tmp:
+            index_dir = self.index_dir
+            if index_dir is None:
+                self.save(tmp)
+                self.index_dir = None
+                index_dir = Path(tmp)
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_rank_worker, initargs=(str(index_dir), self.params)
+            ) as pool:
+                results = list(pool.map(_rank_shard, shards, repeat(top_k), repeat(backend)))
+        return [RankedList(self.docids, ords, scores) for shard in results for ords, scores in shard]
 
     @staticmethod
-    def normalize_scores(rows: list[RetrievedDoc]) -> list[RetrievedDoc]:
+    def normalize_scores(rows: RankedList | list[RetrievedDoc]) -> RankedList | list[RetrievedDoc]:
+        if isinstance(rows, RankedList):
+            return rows.normalized()
         if not rows:
             return rows
         max_score = max(r.score for r in rows)
@@ -186,3 +851,18 @@ class HybridTask1Retriever:
         if max_score == min_score:
             return [RetrievedDoc(docid=r.docid, score=1.0) for r in rows]
         return [RetrievedDoc(docid=r.docid, score=(r.score - min_score) / (max_score - min_score)) for r in rows]
+
+
+_WORKER_RETRIEVER: HybridTask1Retriever | None = None
+
+
+def _init_rank_worker(index_dir: str, params: dict) -> None:
+    global _WORKER_RETRIEVER
+    _WORKER_RETRIEVER = HybridTask1Retriever.load(index_dir, params=params)
+
+
+def _rank_shard(queries: list[str], top_k: int, backend: str) -> list[tuple[np.ndarray, np.ndarray]]:
+    assert _WORKER_RETRIEVER is not None
+    ranked = _WORKER_RETRIEVER.rank_many(queries, top_k=top_k, backend=backend)
+    # Ordinals and scores only; the parent maps them onto its own docid table.
+    return [(rows.ords, rows.scores) for rows in ranked]
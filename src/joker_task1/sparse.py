@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import numpy as np
+
+from .retriever import HybridTask1Retriever, RankedList
+
+
+class SparseLexicalScorer:
+    """Batch scoring backend for a fitted ``HybridTask1Retriever``.
+
+    The retriever's postings are reused as (terms x docs) CSR matrices: one of
+    BM25-saturated term weights and one of normalized char-gram tf-idf
+    weights. A batch of queries becomes a sparse query matrix, so scoring it
+    is one sparse product per signal followed by an ``argpartition`` top-k.
+    Rankings match ``HybridTask1Retriever.rank`` up to float summation order.
+    """
+
+    def __init__(self, retriever: HybridTask1Retriever, query_batch_size: int = 64):
+        from scipy import sparse
+
+        self.retriever = retriever
+        self.query_batch_size = max(1, query_batch_size)
+        self._sparse = sparse
+        n_docs = retriever.n_docs
+        self.char_matrix = sparse.csr_matrix(
+            (np.asarray(retriever.char_weights, dtype=np.float64), retriever.char_docs, retriever.char_ptr),
+            shape=(len(retriever.char_ptr) - 1, n_docs),
+        )
+        self._bm25_key: tuple[float, float, float] | None = None
+        self._bm25_matrix = None
+
+    def bm25_matrix(self):
+        """BM25 weights for the retriever's current ``k1``/``b``, rebuilt when they change."""
+        r = self.retriever
+        key = (r.k1, r.b, r.avgdl)
+        if self._bm25_key != key:
+            tf = np.asarray(r.term_tfs, dtype=np.float64)
+            dl = np.asarray(r.doc_lens, dtype=np.float64)[r.term_docs]
+            norm = r.k1 * (1 - r.b + r.b * dl / max(r.avgdl, 1e-9))
+            idf = np.repeat(np.asarray(r.idf, dtype=np.float64), np.diff(r.term_ptr))
+            values = idf * (tf * (r.k1 + 1)) / (tf + norm)
+            self._bm25_matrix = self._sparse.csr_matrix(
+                (values, r.term_docs, r.term_ptr), shape=(len(r.term_ptr) - 1, r.n_docs)
+            )
+            self._bm25_key = key
+        return self._bm25_matrix
+
+    def _query_matrices(self, query_terms: list) -> tuple:
+        term_rows: list[int] = []
+        term_cols: list[int] = []
+        gram_rows: list[int] = []
+        gram_cols: list[int] = []
+        gram_vals: list[float] = []
+        for row, q in enumerate(query_terms):
+            term_rows.extend([row] * len(q.term_ids))
+            term_cols.extend(q.term_ids)
+            gram_rows.extend([row] * len(q.gram_ids))
+            gram_cols.extend(q.gram_ids)
+            gram_vals.extend(w / q.gram_norm for w in q.gram_weights)
+        n = len(query_terms)
+        bm25 = self.bm25_matrix()
+        # Duplicate (row, term) entries are summed, so a repeated query token counts twice as in ``bm25``.
+        term_q = self._sparse.csr_matrix(
+            (np.ones(len(term_rows), dtype=np.float64), (term_rows, term_cols)), shape=(n, bm25.shape[0])
+        )
+        gram_q = self._sparse.csr_matrix((gram_vals, (gram_rows, gram_cols)), shape=(n, self.char_matrix.shape[0]))
+        return term_q, gram_q
+
+    def _score_batch(self, query_terms: list):
+        r = self.retriever
+        term_q, gram_q = self._query_matrices(query_terms)
+        scores = r.bm25_weight * (term_q @ self.bm25_matrix()) + r.char_weight * (gram_q @ self.char_matrix)
+        prior = np.flatnonzero(np.asarray(r.humor_prior))
+        if r.humor_weight != 0.0 and len(prior):
+            n = len(query_terms)
+            humor = self._sparse.csr_matrix(
+                (
+                    np.full(n * len(prior), r.humor_weight, dtype=np.float64),
+                    np.tile(prior, n),
+                    np.arange(n + 1, dtype=np.int64) * len(prior),
+                ),
+                shape=scores.shape,
+            )
+            scores = scores + humor
+        return scores.tocsr()
+
+    def _apply_exact_match(self, q, docs: np.ndarray, vals: np.ndarray, top_k: int) -> tuple[np.ndarray, np.ndarray]:
+        r = self.retriever
+        if not q.text_lower or r.match_boost == 0.0:
+            return docs, vals
+        if not q.has_grams:
+            # Too short for char grams: exact matches may lie outside every posting list.
+            exact = np.asarray([o for o, text in enumerate(r.doc_text_lower) if q.text_lower in text], dtype=np.int64)
+            missing = np.setdiff1d(exact, docs)
+            docs = np.concatenate([docs, missing])
+            vals = np.concatenate([vals, np.zeros(len(missing), dtype=np.float64)])
+            check = np.isin(docs, exact)
+            vals = vals + np.where(check, r.match_boost, 0.0)
+            return docs, vals
+        check = np.ones(len(docs), dtype=bool)
+        if r.match_boost > 0.0 and len(vals) > top_k:
+            # Only documents within one boost of the k-th score can change the top-k.
+            kth = np.partition(vals, len(vals) - top_k)[len(vals) - top_k]
+            check = vals >= kth - r.match_boost
+        idx = np.flatnonzero(check)
+        hits = np.asarray([q.text_lower in r.doc_text_lower[o] for o in docs[idx].tolist()], dtype=bool)
+        vals = vals.copy()
+        vals[idx[hits]] = vals[idx[hits]] + r.match_boost
+        return docs, vals
+
+    @staticmethod
+    def _top_k(docs: np.ndarray, vals: np.ndarray, top_k: int) -> tuple[np.ndarray, np.ndarray]:
+        keep = vals > 0.0
+        docs, vals = docs[keep], vals[keep]
+        if len(vals) > top_k:
+            kth = -np.partition(-vals, top_k - 1)[top_k - 1]
+            keep = vals >= kth
+            docs, vals = docs[keep], vals[keep]
+        # Ties keep corpus order, as in ``HybridTask1Retriever.rank``.
+        order = np.lexsort((docs, -vals))[:top_k]
+        return docs[order], vals[order]
+
+    def rank_many(self, queries: list[str], top_k: int = 1000) -> list[RankedList]:
+        r = self.retriever
+        out: list[RankedList] = []
+        if top_k <= 0:
+            return [RankedList(r.docids, [], []) for _ in queries]
+        for start in range(0, len(queries), self.query_batch_size):
+            batch = queries[start : start + self.query_batch_size]
+            query_terms = [r._query_terms(r.tokenize(text), text.lower()) for text in batch]
+            scores = self._score_batch(query_terms)
+            for row, q in enumerate(query_terms):
+                lo, hi = scores.indptr[row], scores.indptr[row + 1]
+                docs = scores.indices[lo:hi].astype(np.int64)
+                vals = np.asarray(scores.data[lo:hi], dtype=np.float64)
+                docs, vals = self._apply_exact_match(q, docs, vals, top_k)
+                docs, vals = self._top_k(docs, vals, top_k)
+                out.append(RankedList(r.docids, docs, vals))
+        return out
+
+    def rank(self, query: str, top_k: int = 1000) -> RankedList:
+        return self.rank_many([query], top_k=top_k)[0]
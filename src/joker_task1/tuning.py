@@ -0,0 +1,716 @@
+from __future__ import annotations
+
+import json
+import math
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from random import Random
+from time import perf_counter
+
+import numpy as np
+
+from .cache import content_hash, corpus_fingerprint
+from .data import to_qrel_map
+from .evaluation import Evaluator
+from .fusion import DEFAULT_SIGNAL_WEIGHTS, SIGNALS, CandidatePool, weighted_fuse
+from .pipeline import (
+    DEFAULT_FUSION_WEIGHTS,
+    ProgressFn,
+    average_precision,
+    iter_hybrid_candidates,
+    load_fusion_config,
+    split_qrels_by_query,
+)
+from .retriever import HybridTask1Retriever, qrels_fingerprint
+
+STRATEGIES = ("random", "tpe", "halving")
+_NO_CANDIDATES = CandidatePool([])
+
+LEXICAL_SPACE: dict[str, tuple[float, float]] = {
+    "k1": (0.5, 2.5),
+    "b": (0.0, 1.0),
+    "char_weight": (0.0, 1.0),
+    "humor_weight": (0.0, 1.0),
+    "match_boost": (0.0, 0.5),
+}
+
+
+def fusion_space(base: dict | None = None) -> dict[str, tuple[float, float]]:
+    """Search ranges around a fusion config; ``feature_weights`` entries are flattened to ``feature_weights.<name>``."""
+    base = base or DEFAULT_FUSION_WEIGHTS
+    space = {key: (0.0, max(1.0, 2.0 * float(base[key]))) for key in ("lexical", "dense", "rerank", "humor")}
+    for key, value in base.get("feature_weights", {}).items():
+        space[f"feature_weights.{key}"] = (0.0, max(0.5, 2.0 * float(value)))
+    return space
+
+
+def fusion_weights_from_params(params: dict[str, float], base: dict | None = None) -> dict:
+    """Overlay flat trial params onto a fusion config in the ``load_fusion_config`` layout."""
+    weights = json.loads(json.dumps(base or DEFAULT_FUSION_WEIGHTS))
+    for key, value in params.items():
+        if key.startswith("feature_weights."):
+            weights.setdefault("feature_weights", {})[key.split(".", 1)[1]] = value
+        else:
+            weights[key] = value
+    return weights
+
+
+class LexicalObjective:
+    """Per-query AP of the lexical index in ``index_dir`` under sampled ``HybridTask1Retriever`` params.
+
+    Candidate sets and the char/humor/exact components are cached per query, so
+    a trial only recomputes BM25 for its ``k1``/``b``.
+    """
+
+    def __init__(self, index_dir: str, query_text: dict[str, str], rel_by_qid: dict[str, set[str]], top_k: int = 1000):
+        self.index_dir = index_dir
+        self.query_text = query_text
+        self.rel_by_qid = rel_by_qid
+        self.top_k = top_k
+        self._retriever: HybridTask1Retriever | None = None
+        self._cache: dict[str, tuple] = {}
+
+    def __getstate__(self) -> dict:
+        state = dict(self.__dict__)
+        state["_retriever"] = None
+        state["_cache"] = {}
+        return state
+
+    def _query(self, qid: str) -> tuple:
+        if qid not in self._cache:
+            r = self._retriever
+            text = self.query_text.get(qid, "")
+            ords = r.candidate_ordinals(text)
+            rel_mask = np.asarray([r.docids[o] in self.rel_by_qid[qid] for o in ords.tolist()], dtype=bool)
+            self._cache[qid] = (text, ords, rel_mask, r.component_scores(text, ords, ("char", "humor", "exact")))
+        return self._cache[qid]
+
+    def query_aps(self, params: dict[str, float], qids: list[str]) -> list[float]:
+        if self._retriever is None:
+            self._retriever = HybridTask1Retriever.load(self.index_dir)
+        r = self._retriever
+        r.k1, r.b = params["k1"], params["b"]
+        aps: list[float] = []
+        for qid in qids:
+            text, ords, rel_mask, fixed = self._query(qid)
+            bm25 = r.component_scores(text, ords, ("bm25",))["bm25"]
+            scores = (
+                r.bm25_weight * bm25
+                + params["char_weight"] * fixed["char"]
+                + params["humor_weight"] * fixed["humor"]
+                + params["match_boost"] * fixed["exact"]
+            )
+            aps.append(average_precision(scores, ords, rel_mask, len(self.rel_by_qid[qid]), self.top_k))
+        return aps
+
+
+class FusionObjective:
+    """Per-query AP of ``weighted_fuse`` over hybrid candidates computed once before the search."""
+
+    def __init__(
+        self,
+        candidates: dict[str, CandidatePool],
+        rel_by_qid: dict[str, set[str]],
+        top_k: int = 1000,
+        base_weights: dict | None = None,
+    ):
+        self.candidates = candidates
+        self.rel_by_qid = rel_by_qid
+        self.top_k = top_k
+        self.base_weights = base_weights
+        self.evaluators = {qid: Evaluator({qid: rel}, k=top_k, cutoffs=()) for qid, rel in rel_by_qid.items()}
+
+    def query_aps(self, params: dict[str, float], qids: list[str]) -> list[float]:
+        weights = fusion_weights_from_params(params, self.base_weights)
+        aps: list[float] = []
+        for qid in qids:
+            rows = weighted_fuse(self.candidates.get(qid, _NO_CANDIDATES), weights, top_k=self.top_k)
+            aps.append(self.evaluators[qid].evaluate({qid: rows}).mean("map"))
+        return aps
+
+
+@dataclass
+class Trial:
+    trial: int
+    params: dict[str, float]
+    rung_scores: list[float] = field(default_factory=list)
+    status: str = "running"
+
+    @property
+    def score(self) -> float:
+        return self.rung_scores[-1] if self.rung_scores else float("-inf")
+
+
+def rung_budgets(n_queries: int, eta: int = 3, min_queries: int = 5) -> list[int]:
+    """Growing query-subset sizes for early stopping, ending with the full validation set."""
+    budgets = [n_queries]
+    while True:
+        smaller = math.ceil(budgets[0] / eta)
+        if smaller < max(1, min_queries) or smaller >= budgets[0]:
+            return budgets
+        budgets.insert(0, smaller)
+
+
+def evaluate_trial(
+    objective,
+    trial: Trial,
+    qids: list[str],
+    budgets: list[int],
+    until_rung: int,
+    thresholds: list[float | None] | None = None,
+) -> Trial:
+    """Extend ``trial`` rung by rung up to ``until_rung``, pruning when a rung score falls below its threshold."""
+    done = len(trial.rung_scores)
+    total = trial.rung_scores[-1] * budgets[done - 1] if done else 0.0
+    for rung in range(done, until_rung + 1):
+        lo = budgets[rung - 1] if rung else 0
+        total += sum(objective.query_aps(trial.params, qids[lo : budgets[rung]]))
+        trial.rung_scores.append(total / budgets[rung])
+        if rung == len(budgets) - 1:
+            trial.status = "complete"
+            return trial
+        threshold = thresholds[rung] if thresholds else None
+        if threshold is not None and trial.rung_scores[-1] < threshold:
+            trial.status = "pruned"
+            return trial
+    return trial
+
+
+_WORKER_OBJECTIVE = None
+
+
+def _init_trial_worker(objective) -> None:
+    global _WORKER_OBJECTIVE
+    _WORKER_OBJECTIVE = objective
+
+
+def _evaluate_in_worker(trial: Trial, qids: list[str], budgets: list[int], until_rung: int, thresholds) -> Trial:
+    return evaluate_trial(_WORKER_OBJECTIVE, trial, qids, budgets, until_rung, thresholds)
+
+
+class HyperparameterSearch:
+    """Random, TPE-style or successive-halving search over a box-bounded ``space``.
+
+    Every strategy stops weak trials early on growing subsets of the validation
+    queries (``rung_budgets``): random and TPE trials are pruned when a rung
+    score is below the median of earlier trials at that rung, and successive
+    halving keeps the best ``1/eta`` of the trials per rung. Trials run on a
+    process pool when ``workers > 1``. Each evaluated trial is appended to the
+    JSONL ``log_path``, and a search restarted on the same log resumes from it.
+    """
+
+    def __init__(
+        self,
+        objective,
+        space: dict[str, tuple[float, float]],
+        qids: list[str],
+        strategy: str = "tpe",
+        n_trials: int = 50,
+        workers: int = 1,
+        seed: int = 13,
+        eta: int = 3,
+        min_queries: int = 5,
+        log_path: str | Path | None = None,
+        progress: ProgressFn | None = None,
+    ):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown search strategy: {strategy}")
+        self.objective = objective
+        self.space = dict(space)
+        self.strategy = strategy
+        self.n_trials = n_trials
+        self.workers = max(1, workers)
+        self.seed = seed
+        self.eta = max(2, eta)
+        self.qids = list(qids)
+        Random(seed).shuffle(self.qids)
+        self.budgets = rung_budgets(len(self.qids), self.eta, min_queries) if self.qids else []
+        self.log_path = Path(log_path) if log_path else None
+        self.progress = progress
+        self.trials: dict[int, Trial] = {}
+        self._executor: ProcessPoolExecutor | None = None
+
+    # Trial log -----------------------------------------------------------------
+
+    def _log_header(self) -> dict:
+        header = {
+            "strategy": self.strategy,
+            "space": {key: list(bounds) for key, bounds in self.space.items()},
+            "seed": self.seed,
+            "eta": self.eta,
+            "budgets": self.budgets,
+        }
+        if self.strategy == "halving":
+            # Halving rungs depend on the trial count; random/TPE logs may be resumed with more trials.
+            header["n_trials"] = self.n_trials
+        return header
+
+    def _load_log(self) -> None:
+        if not self.log_path or not self.log_path.exists():
+            return
+        with self.log_path.open("r", encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        if not lines:
+            return
+        if lines[0].get("header") != self._log_header():
+            raise ValueError(f"Trial log {self.log_path} was written by a different search; use a new --trial-log path")
+        for row in lines[1:]:
+            trial = Trial(**row)
+            self.trials[trial.trial] = trial
+
+    def _record(self, trials: list[Trial]) -> None:
+        for trial in trials:
+            self.trials[trial.trial] = trial
+        if not self.log_path:
+            return
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        new_log = not self.log_path.exists() or self.log_path.stat().st_size == 0
+        with self.log_path.open("a", encoding="utf-8") as f:
+            if new_log:
+                f.write(json.dumps({"header": self._log_header()}) + "\n")
+            for trial in trials:
+                f.write(json.dumps(asdict(trial)) + "\n")
+
+    # Sampling ------------------------------------------------------------------
+
+    def _sample_random(self, trial_id: int) -> dict[str, float]:
+        rng = np.random.default_rng([self.seed, trial_id])
+        return {key: float(rng.uniform(lo, hi)) for key, (lo, hi) in self.space.items()}
+
+    def _sample_tpe(self, trial_id: int, gamma: float = 0.25, n_candidates: int = 24) -> dict[str, float]:
+        """Draw candidates from a Parzen estimate of the best trials and keep the best good/bad density ratio."""
+        history = sorted(
+            self.trials.values(),
+            key=lambda t: (t.status == "complete", t.score if t.status == "complete" else -len(t.rung_scores)),
+            reverse=True,
+        )
+        n_startup = max(10, 2 * self.workers)
+        if len(history) < n_startup:
+            return self._sample_random(trial_id)
+        n_good = max(1, math.ceil(gamma * len(history)))
+        rng = np.random.default_rng([self.seed, trial_id])
+        keys = list(self.space)
+        lo = np.asarray([self.space[k][0] for k in keys], dtype=np.float64)
+        span = np.asarray([self.space[k][1] - self.space[k][0] for k in keys], dtype=np.float64)
+        span = np.where(span > 0, span, 1.0)
+        points = (np.asarray([[t.params[k] for k in keys] for t in history], dtype=np.float64) - lo) / span
+        good, bad = points[:n_good], points[n_good:]
+
+        def bandwidth(x: np.ndarray) -> np.ndarray:
+            return np.maximum(x.std(axis=0), 0.1) * len(x) ** (-1.0 / 5.0)
+
+        def log_density(x: np.ndarray, centers: np.ndarray, h: np.ndarray) -> np.ndarray:
+            # Per-dimension Gaussian mixture plus one uniform component as a prior on [0, 1].
+            z = (x[:, None, :] - centers[None, :, :]) / h
+            kernels = np.exp(-0.5 * z * z) / (h * math.sqrt(2.0 * math.pi))
+            return np.log((kernels.sum(axis=1) + 1.0) / (len(centers) + 1)).sum(axis=1)
+
+        h_good, h_bad = bandwidth(good), bandwidth(bad)
+        picks = rng.integers(0, len(good), size=(n_candidates, len(keys)))
+        cand = np.clip(good[picks, np.arange(len(keys))] + rng.normal(0.0, h_good, size=(n_candidates, len(keys))), 0.0, 1.0)
+        ratio = log_density(cand, good, h_good) - log_density(cand, bad, h_bad)
+        best = cand[int(np.argmax(ratio))]
+        return {k: float(lo[i] + best[i] * span[i]) for i, k in enumerate(keys)}
+
+    # Evaluation ----------------------------------------------------------------
+
+    def _evaluate(self, trials: list[Trial], until_rung: int, thresholds: list[float | None] | None = None) -> list[Trial]:
+        if self._executor is None:
+            return [evaluate_trial(self.objective, t, self.qids, self.budgets, until_rung, thresholds) for t in trials]
+        futures = [
+            self._executor.submit(_evaluate_in_worker, t, self.qids, self.budgets, until_rung, thresholds) for t in trials
+        ]
+        return [f.result() for f in futures]
+
+    def _median_thresholds(self, min_trials: int = 4) -> list[float | None]:
+        thresholds: list[float | None] = []
+        for rung in range(len(self.budgets) - 1):
+            scores = [t.rung_scores[rung] for t in self.trials.values() if len(t.rung_scores) > rung]
+            thresholds.append(float(np.median(scores)) if len(scores) >= min_trials else None)
+        return thresholds
+
+    def _report(self, message: str, frac: float) -> None:
+        if self.progress:
+            best = self.best()
+            suffix = f", best MAP={best[1]:.4f}" if best[0] else ""
+            self.progress(f"{message}{suffix}", 0.05 + 0.9 * min(1.0, frac))
+
+    def _run_sampled(self) -> None:
+        next_id = len(self.trials)
+        while next_id < self.n_trials:
+            ids = range(next_id, min(self.n_trials, next_id + self.workers))
+            sample = self._sample_tpe if self.strategy == "tpe" else self._sample_random
+            trials = [Trial(trial=i, params=sample(i)) for i in ids]
+            self._record(self._evaluate(trials, len(self.budgets) - 1, self._median_thresholds()))
+            next_id = len(self.trials)
+            self._report(f"Tuning ({self.strategy}): {next_id}/{self.n_trials} trials", next_id / max(1, self.n_trials))
+
+    def _run_halving(self) -> None:
+        for i in range(self.n_trials):
+            if i not in self.trials:
+                self.trials[i] = Trial(trial=i, params=self._sample_random(i))
+        active = sorted(self.trials)
+        for rung in range(len(self.budgets)):
+            if rung:
+                keep = max(1, math.ceil(len(active) / self.eta))
+                ranked = sorted(active, key=lambda i: (-self.trials[i].rung_scores[rung - 1], i))
+                active, dropped = ranked[:keep], ranked[keep:]
+                self._record(
+                    [
+                        Trial(t.trial, t.params, t.rung_scores, "pruned")
+                        for t in (self.trials[i] for i in dropped)
+                        if t.status != "pruned"
+                    ]
+                )
+            todo = [self.trials[i] for i in active if len(self.trials[i].rung_scores) <= rung]
+            for start in range(0, len(todo), self.workers):
+                self._record(self._evaluate(todo[start : start + self.workers], rung))
+            self._report(
+                f"Tuning (halving): rung {rung + 1}/{len(self.budgets)}, {len(active)} trials on {self.budgets[rung]} queries",
+                (rung + 1) / len(self.budgets),
+            )
+
+    def best(self) -> tuple[dict[str, float], float]:
+        done = [t for t in self.trials.values() if t.status == "complete"]
+        if not done:
+            return {}, 0.0
+        top = max(done, key=lambda t: (t.score, -t.trial))
+        return dict(top.params), top.score
+
+    def run(self) -> tuple[dict[str, float], float]:
+        self._load_log()
+        if not self.budgets:
+            return {}, 0.0
+        if self.workers > 1:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_trial_worker, initargs=(self.objective,)
+            )
+        try:
+            if self.strategy == "halving":
+                self._run_halving()
+            else:
+                self._run_sampled()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+        return self.best()
+
+
+def _validation_split(queries: list[dict], qrels: list[dict]) -> tuple[list[dict], dict[str, str], dict[str, set[str]]]:
+    train_qrels, valid_qrels = split_qrels_by_query(qrels)
+    query_text = {str(q["qid"]): str(q["query"]) for q in queries}
+    rel_by_qid = {qid: rel for qid, rel in to_qrel_map(valid_qrels).items() if rel}
+    return train_qrels, query_text, rel_by_qid
+
+
+def search_lexical_params(
+    docs: list[dict],
+    queries: list[dict],
+    qrels: list[dict],
+    strategy: str = "tpe",
+    n_trials: int = 50,
+    workers: int = 1,
+    top_k: int = 1000,
+    seed: int = 13,
+    eta: int = 3,
+    min_queries: int = 5,
+    log_path: str | Path | None = None,
+    progress: ProgressFn | None = None,
+) -> tuple[dict, float]:
+    """Search ``LEXICAL_SPACE`` on the ``split_qrels_by_query`` holdout; the index is fitted once on the rest."""
+    train_qrels, query_text, rel_by_qid = _validation_split(queries, qrels)
+    if progress:
+        progress("Fitting lexical index for tuning...", 0.02)
+    retriever = HybridTask1Retriever()
+    retriever.fit(docs=docs, qrels=train_qrels)
+    with tempfile.TemporaryDirectory(prefix="joker_tune_") as tmp:
+        retriever.save(tmp)
+        objective = LexicalObjective(tmp, query_text, rel_by_qid, top_k=top_k)
+        search = HyperparameterSearch(
+            objective,
+            LEXICAL_SPACE,
+            list(rel_by_qid),
+            strategy=strategy,
+            n_trials=n_trials,
+            workers=workers,
+            seed=seed,
+            eta=eta,
+            min_queries=min_queries,
+            log_path=log_path,
+            progress=progress,
+        )
+        return search.run()
+
+
+def holdout_candidates(
+    docs: list[dict],
+    queries: list[dict],
+    qrels: list[dict],
+    top_k: int = 1000,
+    hybrid_kwargs: dict | None = None,
+    progress: ProgressFn | None = None,
+) -> tuple[dict[str, CandidatePool], dict[str, set[str]]]:
+    """Unfused hybrid candidates of the holdout queries, with the lexical prior fitted on the training split."""
+    train_qrels, _, rel_by_qid = _validation_split(queries, qrels)
+    valid_queries = [q for q in queries if str(q["qid"]) in rel_by_qid]
+    candidates = {
+        str(row["qid"]): cands
+        for row, cands in iter_hybrid_candidates(
+            docs, valid_queries, train_qrels, top_k=top_k, progress=progress, **(hybrid_kwargs or {})
+        )
+    }
+    return candidates, rel_by_qid
+
+
+def search_fusion_weights(
+    docs: list[dict],
+    queries: list[dict],
+    qrels: list[dict],
+    strategy: str = "tpe",
+    n_trials: int = 50,
+    workers: int = 1,
+    top_k: int = 1000,
+    seed: int = 13,
+    eta: int = 3,
+    min_queries: int = 5,
+    log_path: str | Path | None = None,
+    fusion_config_path: str | None = None,
+    hybrid_kwargs: dict | None = None,
+    progress: ProgressFn | None = None,
+) -> tuple[dict, float]:
+    """Search the fusion weights over hybrid candidates of the holdout queries; returns a full fusion config."""
+    base = load_fusion_config(fusion_config_path)
+    candidates, rel_by_qid = holdout_candidates(docs, queries, qrels, top_k=top_k, hybrid_kwargs=hybrid_kwargs, progress=progress)
+    objective = FusionObjective(candidates, rel_by_qid, top_k=top_k, base_weights=base)
+    search = HyperparameterSearch(
+        objective,
+        fusion_space(base),
+        list(rel_by_qid),
+        strategy=strategy,
+        n_trials=n_trials,
+        workers=workers,
+        seed=seed,
+        eta=eta,
+        min_queries=min_queries,
+        log_path=log_path,
+        progress=progress,
+    )
+    params, score = search.run()
+    return fusion_weights_from_params(params, base), score
+
+
+@dataclass
+class FusionScoreTensor:
+    """Component scores of every holdout query's fusion candidates as one padded array.
+
+    ``scores[q, c]`` holds candidate ``c`` of query ``q`` in ``weighted_fuse``
+    input order, one column per ``columns`` entry (the four components, then
+    ``feature_weights.<name>``). ``evaluate`` replays ``weighted_fuse`` for a
+    whole matrix of weight vectors at once.
+    """
+
+    qids: list[str]
+    columns: list[str]
+    scores: np.ndarray
+    lengths: np.ndarray
+    relevant: np.ndarray
+    n_rel: np.ndarray
+
+    @classmethod
+    def from_candidates(
+        cls, candidates: dict[str, CandidatePool], rel_by_qid: dict[str, set[str]]
+    ) -> FusionScoreTensor:
+        qids = list(rel_by_qid)
+        pools = [candidates.get(qid, _NO_CANDIDATES) for qid in qids]
+        features: dict[str, None] = {}
+        for pool in pools:
+            features.update(dict.fromkeys(pool.feature_names))
+        columns = list(SIGNALS) + [f"feature_weights.{name}" for name in features]
+        lengths = np.asarray([len(pool) for pool in pools], dtype=np.int64)
+        width = int(lengths.max()) if len(lengths) else 0
+        scores = np.zeros((len(qids), width, len(columns)), dtype=np.float64)
+        relevant = np.zeros((len(qids), width), dtype=bool)
+        for q, (qid, pool) in enumerate(zip(qids, pools)):
+            n = len(pool)
+            for c, name in enumerate(list(SIGNALS) + list(features)):
+                if name in pool.columns:
+                    scores[q, :n, c] = pool.columns[name]
+            relevant[q, :n] = [docid in rel_by_qid[qid] for docid in pool.docids]
+        n_rel = np.asarray([len(rel_by_qid[qid]) for qid in qids], dtype=np.int64)
+        return cls(qids, columns, scores, lengths, relevant, n_rel)
+
+    def save(self, path: str | Path, settings: dict | None = None) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("wb") as f:
+            np.savez(
+                f,
+                qids=np.asarray(self.qids, dtype=str),
+                columns=np.asarray(self.columns, dtype=str),
+                scores=self.scores,
+                lengths=self.lengths,
+                relevant=self.relevant,
+                n_rel=self.n_rel,
+                settings=np.asarray(json.dumps(settings or {}, sort_keys=True)),
+            )
+
+    @classmethod
+    def load(cls, path: str | Path) -> tuple[FusionScoreTensor, dict]:
+        with np.load(path) as data:
+            tensor = cls(
+                [str(x) for x in data["qids"]],
+                [str(x) for x in data["columns"]],
+                data["scores"],
+                data["lengths"],
+                data["relevant"],
+                data["n_rel"],
+            )
+            settings = json.loads(str(data["settings"]))
+        return tensor, settings
+
+    def weight_vector(self, weights: dict) -> np.ndarray:
+        """Column-aligned weights of a ``load_fusion_config`` style dict."""
+        feature_weights = weights.get("feature_weights", {}) if isinstance(weights.get("feature_weights"), dict) else {}
+        out = []
+        for col in self.columns:
+            if col.startswith("feature_weights."):
+                out.append(float(feature_weights.get(col.split(".", 1)[1], 0.0)))
+            else:
+                out.append(float(weights.get(col, DEFAULT_SIGNAL_WEIGHTS[col])))
+        return np.asarray(out, dtype=np.float64)
+
+    def evaluate(self, weights: np.ndarray, top_k: int = 1000, chunk_size: int = 256) -> np.ndarray:
+        """MAP@k of each row of ``weights`` ([B, len(columns)]).
+
+        Scores are summed in ``weighted_fuse`` order and ties keep candidate
+        order, so each value is the MAP of the corresponding fused run.
+        """
+        weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+        total = np.zeros(len(weights), dtype=np.float64)
+        if not self.qids:
+            return total
+        n_main = len(SIGNALS)
+        for q in range(len(self.qids)):
+            n = int(self.lengths[q])
+            rel_idx = np.flatnonzero(self.relevant[q, :n])
+            if not len(rel_idx):
+                continue
+            x = self.scores[q, :n]
+            for start in range(0, len(weights), chunk_size):
+                w = weights[start : start + chunk_size]
+                s = x[:, 0, None] * w[None, :, 0]
+                for col in range(1, n_main):
+                    s = s + x[:, col, None] * w[None, :, col]
+                feat = np.zeros_like(s)
+                for col in range(n_main, len(self.columns)):
+                    feat = feat + x[:, col, None] * w[None, :, col]
+                s = s + feat
+                rel = s[rel_idx]
+                ahead = (s[None, :, :] > rel[:, None, :]).sum(axis=1)
+                ahead += ((s[None, :, :] == rel[:, None, :]) & (np.arange(n)[None, :, None] < rel_idx[:, None, None])).sum(axis=1)
+                ranks = np.sort(ahead + 1, axis=0)
+                precision = np.arange(1, len(rel_idx) + 1, dtype=np.float64)[:, None] / ranks
+                total[start : start + chunk_size] += np.where(ranks <= top_k, precision, 0.0).sum(axis=0) / self.n_rel[q]
+        return total / len(self.qids)
+
+
+def optimize_fusion_weights(
+    tensor: FusionScoreTensor,
+    base: dict | None = None,
+    top_k: int = 1000,
+    n_samples: int = 2048,
+    rounds: int = 8,
+    elite_frac: float = 0.05,
+    seed: int = 13,
+    progress: ProgressFn | None = None,
+) -> tuple[dict, float, float]:
+    """Cross-entropy search of the fusion weights on ``tensor``.
+
+    Starts from uniform samples over ``fusion_space(base)`` and refits a
+    Gaussian to the best ``elite_frac`` of each round. The base weights are
+    always a candidate. Returns the fusion config, its MAP and the base MAP.
+    """
+    base = base or load_fusion_config(None)
+    bounds = fusion_space(base)
+    lo = np.asarray([bounds.get(col, (0.0, 0.5))[0] for col in tensor.columns], dtype=np.float64)
+    hi = np.asarray([bounds.get(col, (0.0, 0.5))[1] for col in tensor.columns], dtype=np.float64)
+    rng = np.random.default_rng(seed)
+
+    best_w = tensor.weight_vector(base)
+    best_map = base_map = float(tensor.evaluate(best_w[None, :], top_k=top_k)[0])
+    mean, sigma = best_w, (hi - lo) / 4.0
+    n_elite = max(2, int(n_samples * elite_frac))
+    for r in range(1, rounds + 1):
+        if r == 1:
+            samples = rng.uniform(lo, hi, size=(n_samples, len(lo)))
+        else:
+            samples = np.clip(mean + sigma * rng.standard_normal((n_samples, len(lo))), lo, hi)
+        t0 = perf_counter()
+        maps = tensor.evaluate(samples, top_k=top_k)
+        rate = len(samples) / max(perf_counter() - t0, 1e-9)
+        order = np.argsort(-maps, kind="stable")
+        if maps[order[0]] > best_map:
+            best_map, best_w = float(maps[order[0]]), samples[order[0]]
+        elite = samples[order[:n_elite]]
+        mean, sigma = elite.mean(axis=0), np.maximum(elite.std(axis=0), 1e-3 * (hi - lo))
+        if progress:
+            progress(
+                f"Fusion tuning round {r}/{rounds}: best MAP={best_map:.6f} ({rate:,.0f} weight vectors/s)",
+                0.5 + 0.45 * r / rounds,
+            )
+    params = {col: float(v) for col, v in zip(tensor.columns, best_w)}
+    return fusion_weights_from_params(params, base), best_map, base_map
+
+
+def tune_fusion(
+    docs: list[dict],
+    queries: list[dict],
+    qrels: list[dict],
+    top_k: int = 1000,
+    fusion_config_path: str | None = None,
+    hybrid_kwargs: dict | None = None,
+    score_cache: str | Path | None = None,
+    n_samples: int = 2048,
+    rounds: int = 8,
+    seed: int = 13,
+    progress: ProgressFn | None = None,
+) -> tuple[dict, float, float]:
+    """Run the hybrid stages once over the holdout queries and optimize the fusion weights on their scores.
+
+    The candidate score tensor is stored in ``score_cache`` (``.npz``) and
+    reused while the pipeline settings, the corpus texts, the holdout queries
+    and their judgments, and the train qrels behind the humor prior are
+    unchanged.
+    """
+    train_qrels, query_text, rel_by_qid = _validation_split(queries, qrels)
+    settings = {
+        "top_k": top_k,
+        "corpus": corpus_fingerprint(docs),
+        "qids": list(rel_by_qid),
+        "queries": content_hash([query_text.get(qid, "") for qid in rel_by_qid]),
+        "relevance": content_hash({qid: sorted(rel) for qid, rel in rel_by_qid.items()}),
+        "train_qrels": qrels_fingerprint(train_qrels),
+        "hybrid": hybrid_kwargs or {},
+    }
+    settings = json.loads(json.dumps(settings, sort_keys=True, default=str))
+    tensor = None
+    if score_cache and Path(score_cache).exists():
+        cached, cached_settings = FusionScoreTensor.load(score_cache)
+        if cached_settings == settings:
+            tensor = cached
+            if progress:
+                progress(f"Loaded candidate scores from {score_cache}", 0.5)
+    if tensor is None:
+        candidates, rel_by_qid = holdout_candidates(
+            docs, queries, qrels, top_k=top_k, hybrid_kwargs=hybrid_kwargs, progress=progress
+        )
+        tensor = FusionScoreTensor.from_candidates(candidates, rel_by_qid)
+        if score_cache:
+            tensor.save(score_cache, settings)
+    base = load_fusion_config(fusion_config_path)
+    return optimize_fusion_weights(
+        tensor, base, top_k=top_k, n_samples=n_samples, rounds=rounds, seed=seed, progress=progress
+    )